@@ -1,15 +1,40 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from ..core.database import get_db
-from ..services import chat_service
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.database import get_async_db
+from ..services import chat_service, chat_log_writer
+from ..utils.pagination import InvalidCursorError
 from .. import schemas
-from typing import List
+from typing import List, Optional
 
 router = APIRouter()
 
 @router.get("/history/{workflow_id}", response_model=List[schemas.chat_schema.ChatLog])
-def get_chat_history(workflow_id: int, db: Session = Depends(get_db)):
+async def get_chat_history(workflow_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Retrieves the chat history for a specific workflow.
     """
-    return chat_service.get_chat_logs_by_workflow(db, workflow_id=workflow_id)
+    # Include messages still buffered by the write-behind logger
+    await run_in_threadpool(chat_log_writer.flush)
+    return await chat_service.get_chat_logs_by_workflow(db, workflow_id=workflow_id)
+
+@router.get("/history/{workflow_id}/page", response_model=schemas.chat_schema.ChatLogPage)
+async def get_chat_history_page(
+    workflow_id: int,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    order: str = Query("newest", pattern="^(newest|oldest)$"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Retrieves one page of a workflow's chat history. Pass the returned
+    next_cursor to fetch the following page; it is null on the last page.
+    """
+    await run_in_threadpool(chat_log_writer.flush)
+    try:
+        items, next_cursor = await chat_service.get_chat_log_page(
+            db, workflow_id=workflow_id, limit=limit, cursor=cursor, order=order
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
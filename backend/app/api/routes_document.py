@@ -1,39 +1,186 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from ..core.database import get_db
-from ..services import document_service
+from ..core.database import get_async_db, get_db
+from ..services import document_service, ingestion_service
+from ..services.ingestion_service import QueueFullError
 from ..schemas import document_schema
-import shutil
-from typing import List
+from ..core.config import settings
+from ..utils.pagination import InvalidCursorError
+from ..utils.uploads import UploadTooLargeError, store_upload
+import os
+import tempfile
+import zipfile
+from typing import List, Optional
 
 router = APIRouter()
 
-@router.post("/upload", response_model= document_schema.Document)
-def upload_document(file: UploadFile = File(...), db: Session = Depends(get_db)):
+@router.post("/upload", response_model=document_schema.IngestionJob, status_code=202)
+async def upload_document(file: UploadFile = File(...), db: AsyncSession = Depends(get_async_db)):
     """
-    Endpoint to upload a document, process it, and store it.
+    Endpoint to upload a document. The file is stored and queued for
+    background processing; poll /jobs/{job_id} for progress. Re-uploading a
+    file that is already stored returns a completed job for the existing document.
     """
-    temp_file_path = f"temp_{file.filename}"
+    temp_file_path = None
     try:
-        with open(temp_file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        temp_file_path, content_hash = await run_in_threadpool(store_upload, file.file)
 
-        document = document_service.create_document(db, temp_file_path, file.filename)
-        return document
+        existing = await document_service.get_document_by_hash(db, content_hash)
+        if existing is not None:
+            os.remove(temp_file_path)
+            return ingestion_service.record_duplicate(file.filename, existing.id).to_dict()
+
+        job = ingestion_service.submit(temp_file_path, file.filename, content_hash=content_hash)
+        return job.to_dict()
+    except QueueFullError as e:
+        if temp_file_path and os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
+        if temp_file_path and os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         if file:
-            file.file.close()
+            await file.close()
+
+def _is_zip(file: UploadFile) -> bool:
+    return (file.filename or "").lower().endswith(".zip") or file.content_type in (
+        "application/zip", "application/x-zip-compressed"
+    )
+
+@router.post("/upload/bulk", response_model=document_schema.BulkUploadResult)
+def upload_documents_bulk(files: List[UploadFile] = File(...), db: Session = Depends(get_db)):
+    """
+    Ingests many PDFs in one call. Accepts any number of PDF files and/or zip
+    archives of PDFs; returns a per-file manifest. Runs on the thread pool
+    with a sync session, since parsing and indexing are blocking work.
+    """
+    with tempfile.TemporaryDirectory(prefix="bulk_upload_") as workdir:
+        stored = []  # (file_path, filename, content_hash)
+        rejected = []
+
+        def check_capacity():
+            # Checked before each file is written, so oversized batches stop early
+            if len(stored) >= settings.BULK_MAX_FILES:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Too many files; the limit is {settings.BULK_MAX_FILES} per request",
+                )
+
+        try:
+            for file in files:
+                if _is_zip(file):
+                    with zipfile.ZipFile(file.file) as archive:
+                        for member in archive.infolist():
+                            if member.is_dir():
+                                continue
+                            if not member.filename.lower().endswith(".pdf"):
+                                rejected.append({"filename": member.filename, "status": "skipped", "error": "Not a PDF"})
+                                continue
+                            check_capacity()
+                            too_large = {
+                                "filename": member.filename,
+                                "status": "skipped",
+                                "error": f"Larger than {settings.BULK_MAX_MEMBER_BYTES} bytes uncompressed",
+                            }
+                            if member.file_size > settings.BULK_MAX_MEMBER_BYTES:
+                                rejected.append(too_large)
+                                continue
+                            # Generated temp names avoid collisions and path traversal;
+                            # the size is enforced while copying too, as headers can lie
+                            try:
+                                with archive.open(member) as src:
+                                    path, content_hash = store_upload(
+                                        src, directory=workdir, max_bytes=settings.BULK_MAX_MEMBER_BYTES
+                                    )
+                            except UploadTooLargeError:
+                                rejected.append(too_large)
+                                continue
+                            stored.append((path, member.filename, content_hash))
+                else:
+                    check_capacity()
+                    path, content_hash = store_upload(file.file, directory=workdir)
+                    stored.append((path, file.filename, content_hash))
+        except zipfile.BadZipFile as e:
+            raise HTTPException(status_code=400, detail=f"Invalid zip archive: {e}")
+        finally:
+            for file in files:
+                file.file.close()
+
+        items = rejected + document_service.create_documents_bulk(db, stored)
+
+    succeeded = sum(1 for item in items if item["status"] in ("created", "duplicate"))
+    return {
+        "total": len(items),
+        "succeeded": succeeded,
+        "failed": len(items) - succeeded,
+        "items": items,
+    }
+
+@router.get("/jobs/{job_id}", response_model=document_schema.IngestionJob)
+def read_ingestion_job(job_id: str):
+    """
+    Returns the stage, progress and error (if any) of an ingestion job.
+    """
+    job = ingestion_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@router.get("/page", response_model=document_schema.DocumentPage)
+async def read_document_page(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    order: str = Query("newest", pattern="^(newest|oldest)$"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Lists one page of document summaries. Pass the returned next_cursor to
+    fetch the following page; it is null on the last page.
+    """
+    try:
+        items, next_cursor = await document_service.get_document_page(
+            db, limit=limit, cursor=cursor, order=order
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
 
 @router.get("/{document_id}", response_model= document_schema.Document)
-def read_document(document_id: int, db: Session = Depends(get_db)):
-    db_document = document_service.get_document(db, document_id=document_id)
+async def read_document(document_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_document = await document_service.get_document(db, document_id=document_id)
+    if db_document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return db_document
+
+@router.delete("/{document_id}", response_model=document_schema.DocumentSummary)
+async def delete_document(document_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Deletes a document and removes its chunks from the knowledge base indexes.
+    """
+    db_document = await document_service.delete_document(db, document_id=document_id)
     if db_document is None:
         raise HTTPException(status_code=404, detail="Document not found")
     return db_document
 
-@router.get("/", response_model=List[ document_schema.Document])
-def read_documents(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    documents = document_service.get_documents(db, skip=skip, limit=limit)
+@router.get("/{document_id}/content", response_class=PlainTextResponse)
+async def read_document_content(document_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Returns only the extracted text of a document.
+    """
+    content = await document_service.get_document_content(db, document_id=document_id)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return content
+
+@router.get("/", response_model=List[ document_schema.DocumentSummary])
+async def read_documents(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    """
+    Lists documents without their content; fetch it via /{document_id}/content.
+    """
+    documents = await document_service.get_documents(db, skip=skip, limit=limit)
     return documents
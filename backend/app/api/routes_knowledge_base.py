@@ -1,23 +1,32 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from ..core.chroma import chroma_client
-from ..core.embeddings import embedding_client
+from typing import Optional
+from ..services import retrieval_service
 
 router = APIRouter()
 
 class KnowledgeQuery(BaseModel):
     query: str
     top_k: int = 3
+    mode: Optional[str] = None  # vector | lexical | hybrid; defaults to RETRIEVAL_MODE
 
 @router.post("/query")
-def query_knowledge_base(request: KnowledgeQuery):
+async def query_knowledge_base(request: KnowledgeQuery):
     """
-    Queries the knowledge base for relevant documents.
+    Queries the knowledge base for relevant documents. The response keeps the
+    ChromaDB layout (one list per query) with fused scores in place of distances.
     """
-    query_embedding = embedding_client.get_openai_embedding(request.query)
-    collection = chroma_client.get_or_create_collection(name="documents")
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=request.top_k
-    )
-    return results
+    try:
+        mode = retrieval_service.resolve_mode(request.mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    chunks = await run_in_threadpool(retrieval_service.search, request.query, request.top_k, mode)
+    return {
+        "mode": mode,
+        "ids": [[chunk.id for chunk in chunks]],
+        "documents": [[chunk.text for chunk in chunks]],
+        "metadatas": [[chunk.metadata for chunk in chunks]],
+        "scores": [[chunk.score for chunk in chunks]],
+        "sources": [[chunk.sources for chunk in chunks]],
+    }
@@ -10,6 +10,7 @@ from ..services import chat_service
 from .. import schemas
 from ..core.config import settings
 from ..core.llm_client import get_mistral_response
+from ..core.response_cache import response_cache
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -69,4 +70,11 @@ async def test_api_key(provider: str):
             )
 
 
-
+@router.get("/cache/stats")
+def get_cache_stats():
+    """
+    Hit/miss counters and size of the LLM response cache.
+    """
+    if response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **response_cache.stats()}
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from ..core.tracing import trace_store
+
+router = APIRouter()
+
+@router.get("/")
+def list_traces(limit: int = Query(50, ge=1, le=500)):
+    """
+    Lists the most recent traced requests, newest first.
+    """
+    return trace_store.recent(limit)
+
+@router.get("/{trace_id}")
+def get_trace(trace_id: str):
+    """
+    Returns the span tree of a traced request.
+    """
+    trace = trace_store.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace
+
+@router.get("/{trace_id}/profile", response_class=PlainTextResponse)
+def download_profile(trace_id: str):
+    """
+    Downloads the request's statistical profile as collapsed stacks, ready
+    for flamegraph.pl or speedscope.
+    """
+    profile = trace_store.get_profile(trace_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="No profile recorded for this trace")
+    return PlainTextResponse(
+        profile,
+        headers={"Content-Disposition": f'attachment; filename="{trace_id}.folded"'},
+    )
@@ -1,61 +1,84 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from ..core.database import get_db
-from ..services import workflow_service, chat_service
+from ..core.database import get_async_db
+from ..services import workflow_service, chat_log_writer
 from ..utils.workflow_executor import workflow_executor
+from ..utils.workflow_plan import WorkflowValidationError, plan_cache
 from .. import schemas
 from typing import List
+import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 @router.post("/", response_model=schemas.workflow_schema.Workflow)
-def create_workflow(workflow: schemas.workflow_schema.WorkflowCreate, db: Session = Depends(get_db)):
-    return workflow_service.create_workflow(db=db, workflow=workflow)
+async def create_workflow(workflow: schemas.workflow_schema.WorkflowCreate, db: AsyncSession = Depends(get_async_db)):
+    return await workflow_service.create_workflow(db=db, workflow=workflow)
 
 @router.get("/", response_model=List[schemas.workflow_schema.Workflow])
-def read_workflows(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    workflows = workflow_service.get_workflows(db, skip=skip, limit=limit)
+async def read_workflows(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    workflows = await workflow_service.get_workflows(db, skip=skip, limit=limit)
     return workflows
 
 @router.get("/{workflow_id}", response_model=schemas.workflow_schema.Workflow)
-def read_workflow(workflow_id: int, db: Session = Depends(get_db)):
-    db_workflow = workflow_service.get_workflow(db, workflow_id=workflow_id)
+async def read_workflow(workflow_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_workflow = await workflow_service.get_workflow(db, workflow_id=workflow_id)
     if db_workflow is None:
         raise HTTPException(status_code=404, detail="Workflow not found")
     return db_workflow
 
 @router.put("/{workflow_id}", response_model=schemas.workflow_schema.Workflow)
-def update_workflow(workflow_id: int, workflow: schemas.workflow_schema.WorkflowUpdate, db: Session = Depends(get_db)):
-    return workflow_service.update_workflow(db=db, workflow_id=workflow_id, workflow=workflow)
+async def update_workflow(workflow_id: int, workflow: schemas.workflow_schema.WorkflowUpdate, db: AsyncSession = Depends(get_async_db)):
+    return await workflow_service.update_workflow(db=db, workflow_id=workflow_id, workflow=workflow)
 
 @router.delete("/{workflow_id}", response_model=schemas.workflow_schema.Workflow)
-def delete_workflow(workflow_id: int, db: Session = Depends(get_db)):
-    return workflow_service.delete_workflow(db=db, workflow_id=workflow_id)
+async def delete_workflow(workflow_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await workflow_service.delete_workflow(db=db, workflow_id=workflow_id)
 
 class QueryRequest(BaseModel):
     query: str
 
+async def _load_plan(db: AsyncSession, workflow_id: int):
+    """
+    Returns the workflow's compiled plan, or 404 if it does not exist. Only
+    the definition's version is read when that version's plan is cached.
+    """
+    version = await workflow_service.get_definition_version(db, workflow_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+    plan = plan_cache.get(workflow_id, version)
+    if plan is not None:
+        return plan
+
+    loaded = await workflow_service.get_definition(db, workflow_id)
+    if loaded is None:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+    definition, version = loaded
+    try:
+        return plan_cache.get_plan(workflow_id, definition, version=version)
+    except WorkflowValidationError:
+        # The executor reports invalid definitions in its response
+        return definition
+
 @router.post("/{workflow_id}/execute")
-def execute_workflow(workflow_id: int, request: QueryRequest, db: Session = Depends(get_db)):
+async def execute_workflow(workflow_id: int, request: QueryRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Executes a defined workflow with a user query.
     """
-    db_workflow = workflow_service.get_workflow(db, workflow_id=workflow_id)
-    if db_workflow is None:
-        raise HTTPException(status_code=404, detail="Workflow not found")
+    plan = await _load_plan(db, workflow_id)
+    # Hand the connection back to the pool before the long-running LLM calls
+    await db.close()
 
-    # Log user query (ensure string)
+    # Log user query (ensure string); written behind the response
     user_msg = request.query if request.query is not None else ""
-    chat_service.create_chat_log(
-        db,
-        schemas.chat_schema.ChatLogCreate(
-            workflow_id=workflow_id, sender="user", message=str(user_msg)
-        ),
-    )
+    await chat_log_writer.alog(workflow_id, "user", str(user_msg))
 
-    # Execute the workflow
-    result = workflow_executor.execute(db_workflow.definition, request.query)
+    # Execute the workflow; the final LLM call is awaited rather than run on a thread
+    result = await workflow_executor.aexecute(plan, request.query, workflow_id=workflow_id)
 
     # Determine bot message safely (avoid passing None to pydantic)
     bot_msg = None
@@ -70,15 +93,47 @@ def execute_workflow(workflow_id: int, request: QueryRequest, db: Session = Depe
         bot_msg = str(result)
 
     # Log bot response (always log a string)
-    try:
-        chat_service.create_chat_log(
-            db,
-            schemas.chat_schema.ChatLogCreate(
-                workflow_id=workflow_id, sender="bot", message=str(bot_msg)
-            ),
-        )
-    except Exception:
-        # If logging fails, continue and return the result; avoid raising a 500 for logging issues
-        pass
+    await chat_log_writer.alog(workflow_id, "bot", str(bot_msg))
 
     return result
+
+
+def _format_sse(event: dict) -> str:
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+@router.post("/{workflow_id}/execute/stream")
+async def execute_workflow_stream(workflow_id: int, request: QueryRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Executes a workflow and streams the result as server-sent events
+    (retrieval, search, token, final/error). The complete bot message is
+    stored in the chat log once the stream ends.
+    """
+    plan = await _load_plan(db, workflow_id)
+    await db.close()
+
+    user_msg = request.query if request.query is not None else ""
+    await chat_log_writer.alog(workflow_id, "user", str(user_msg))
+
+    async def event_stream():
+        parts = []
+        bot_msg = None
+        try:
+            async for event in workflow_executor.stream(plan, request.query, workflow_id=workflow_id):
+                if event["event"] == "token":
+                    parts.append(event["data"]["delta"])
+                elif event["event"] == "final":
+                    bot_msg = event["data"]["response"]
+                elif event["event"] == "error":
+                    bot_msg = str(event["data"]["detail"])
+                yield _format_sse(event)
+        finally:
+            # Keep whatever was generated if the client went away mid-stream
+            if bot_msg is None:
+                bot_msg = "".join(parts)
+            await chat_log_writer.alog(workflow_id, "bot", bot_msg)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
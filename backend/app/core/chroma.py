@@ -1,21 +1,72 @@
-import chromadb
+import logging
 import os
+import threading
+from typing import Dict
+
+logger = logging.getLogger(__name__)
 
 persistent_directory = os.path.join(os.getcwd(), "chroma_data")
 
+
 class ChromaDBClient:
     """
     Client for interacting with a persistent, local ChromaDB instance.
+
+    The store is opened on first use rather than at import time, and
+    collection handles are cached so requests don't resolve the collection
+    again on every call.
     """
-    def __init__(self):
-        self.client = chromadb.PersistentClient(path=persistent_directory)
-        print(f"ChromaDB persistent client initialized at: {persistent_directory}")
 
+    def __init__(self, path: str = persistent_directory):
+        self.path = path
+        self._client = None
+        self._collections: Dict[str, object] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import chromadb  # slow to import; only needed once the store is used
+
+                    self._client = chromadb.PersistentClient(path=self.path)
+                    logger.info(f"ChromaDB persistent client initialized at: {self.path}")
+        return self._client
+
+    def collection(self, name: str):
+        """
+        Returns the cached handle of a collection, creating it if needed.
+        """
+        handle = self._collections.get(name)
+        if handle is None:
+            with self._lock:
+                handle = self._collections.get(name)
+                if handle is None:
+                    handle = self.client.get_or_create_collection(name=name)
+                    self._collections[name] = handle
+        return handle
 
     def get_or_create_collection(self, name: str):
         """
         Gets or creates a collection in ChromaDB.
         """
-        return self.client.get_or_create_collection(name=name)
+        return self.collection(name)
+
+    def is_connected(self) -> bool:
+        """
+        Returns True if the persistent store can be opened.
+        """
+        try:
+            return self.client is not None
+        except Exception as e:
+            logger.error(f"ChromaDB is not available: {e}")
+            return False
+
+    def warm_up(self, names=("documents",)):
+        """Opens the store and resolves the given collections ahead of first use."""
+        for name in names:
+            self.collection(name)
+
 
 chroma_client = ChromaDBClient()
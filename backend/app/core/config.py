@@ -15,11 +15,11 @@ class Settings(BaseSettings):
     POSTGRES_PORT: int
     POSTGRES_DB: str
 
-    # API Key Settings
-    OPENAI_API_KEY: str
-    GEMINI_API_KEY: str
-    MISTRAL_API_KEY: str
-    SERPAPI_API_KEY: str
+    # API Key Settings; optional, features fail per request when their key is missing
+    OPENAI_API_KEY: str = ""
+    GEMINI_API_KEY: str = ""
+    MISTRAL_API_KEY: str = ""
+    SERPAPI_API_KEY: str = ""
 
     @property
     def cleaned_openai_key(self) -> str:
@@ -46,11 +46,121 @@ class Settings(BaseSettings):
     def cleaned_mistral_key(self) -> str:
         return self.MISTRAL_API_KEY.strip() if self.MISTRAL_API_KEY else ""
 
+    # Mistral HTTP client settings
+    MISTRAL_BASE_URL: str = "https://api.mistral.ai"  # point at a local stand-in for benchmarks
+    MISTRAL_CONNECT_TIMEOUT: float = 5.0
+    MISTRAL_READ_TIMEOUT: float = 30.0
+    MISTRAL_POOL_TIMEOUT: float = 5.0  # max wait for a free pooled connection
+    MISTRAL_MAX_CONNECTIONS: int = 20
+    MISTRAL_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    MISTRAL_HTTP2: bool = True  # used only when the h2 package is installed
+
+    # LLM response cache settings
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_MAX_ENTRIES: int = 1024
+    LLM_CACHE_TTL_SECONDS: int = 3600  # 0 disables expiry
+    LLM_CACHE_PATH: str = ""  # SQLite file for a persistent tier; empty disables it
+
+    # Generation and prompt budget settings
+    LLM_MODEL: str = "mistral-small"
+    LLM_TEMPERATURE: float = 0.1  # low to minimise hallucinations
+    LLM_MAX_TOKENS: int = 256  # default answer budget; LLM nodes may set data.max_tokens
+    LLM_CONTEXT_WINDOW: int = 32_000  # fallback for models missing from MODEL_CONTEXT_WINDOWS
+    CONTEXT_MAX_TOKENS: int = 3000  # cap on retrieved context per prompt
+    TOKENIZER_MODEL: str = "gpt-3.5-turbo"  # tiktoken has no Mistral encoding; cl100k_base is close
+    TOKENIZER_THREADS: int = 4  # threads tiktoken uses for batch encoding
+    TOKEN_MEMO_SIZE: int = 8192  # memoised token counts of repeated strings
+    TOKEN_MEMO_MAX_CHARS: int = 2000  # longer strings are not memoised
+
+    # Metrics
+    METRICS_ENABLED: bool = True  # expose Prometheus metrics at /metrics
+
+    # Tracing and profiling (opt-in per request)
+    TRACE_HEADER: str = "X-Trace"  # "1" traces the request, "profile" also profiles it; echoes the trace id
+    TRACE_SAMPLE_RATE: float = 0.0  # fraction of requests traced without the header
+    PROFILE_SAMPLE_RATE: float = 0.0  # fraction of requests traced and profiled without the header
+    PROFILE_INTERVAL_SECONDS: float = 0.005  # stack sampling period
+    PROFILE_MAX_SECONDS: float = 60.0  # profiling stops after this long
+    TRACE_HISTORY: int = 200  # finished traces kept in memory
+    TRACE_DIR: str = ""  # also write traces and profiles here when set
+
+    # Workflow execution settings
+    WORKFLOW_MAX_WORKERS: int = 8  # threads per workflow execution
+    WORKFLOW_NODE_TIMEOUT_SECONDS: float = 60.0  # default; nodes may set data.timeout
+    WORKFLOW_PLAN_CACHE_SIZE: int = 256  # compiled workflow plans kept in memory
+
+    # Context retrieval settings
+    RETRIEVAL_BUDGET_SECONDS: float = 5.0  # default; LLM nodes may set data.retrieval_budget
+    RETRIEVAL_MAX_WORKERS: int = 16  # shared by all requests; abandoned stages stop at their next deadline check
+    RETRIEVAL_MODE: str = "hybrid"  # vector | lexical | hybrid; nodes may set data.retrieval_mode
+    RRF_K: int = 60  # reciprocal rank fusion constant
+    HYBRID_CANDIDATES: int = 20  # results taken from each retriever before fusion
+    LEXICAL_INDEX_PATH: str = "lexical_index/bm25.sqlite3"  # empty keeps the index in memory only
+    BM25_K1: float = 1.5
+    BM25_B: float = 0.75
+
+    # Web search settings
+    SERPAPI_BASE_URL: str = "https://serpapi.com"
+    SEARCH_TIMEOUT_SECONDS: float = 10.0  # per SerpAPI request; coalesced callers wait slightly longer
+    SEARCH_CACHE_TTL_SECONDS: int = 300
+    SEARCH_CACHE_MAX_ENTRIES: int = 1024
+
     # Frontend URL
-    FRONTEND_URL: str
+    FRONTEND_URL: str = "http://localhost:3000"
+
+    # Document ingestion settings
+    CHUNK_SIZE: int = 1000  # characters per chunk
+    CHUNK_OVERLAP: int = 200  # characters shared between consecutive chunks
+    EMBEDDING_BATCH_SIZE: int = 64  # chunks embedded per call
+    VECTOR_INSERT_BATCH_SIZE: int = 256  # records per collection.add call
+
+    PDF_PARSE_WORKERS: int = 0  # processes for large PDFs; 0 uses every core
+    PDF_PARALLEL_MIN_PAGES: int = 64  # smaller PDFs are parsed in-process
+    PDF_PAGES_PER_TASK: int = 32
+
+    BULK_COMMIT_BATCH_SIZE: int = 50  # documents per transaction in bulk uploads
+    BULK_MAX_FILES: int = 1000  # files (including archive members) per bulk request
+    BULK_MAX_MEMBER_BYTES: int = 200 * 1024 * 1024  # uncompressed size limit per archive member
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # bytes copied (and hashed) per read
+    UPLOAD_DIR: str = ""  # temp files for queued uploads; empty uses the system temp dir
+    DOCUMENT_COMPRESSION: bool = False  # zlib-compress extracted text of new documents
+    DOCUMENT_COMPRESSION_LEVEL: int = 6
+
+    # Background ingestion settings
+    INGESTION_WORKERS: int = 2
+    INGESTION_QUEUE_SIZE: int = 32  # uploads waiting beyond the busy workers
+    INGESTION_JOB_HISTORY: int = 1000  # job statuses kept in memory
+
+    # Database connection pools. Request handlers use the async pool; the sync
+    # pool only serves background workers (ingestion, chat log writer).
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0  # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 300  # seconds before a connection is replaced
+    DB_SYNC_POOL_SIZE: int = 5
+
+    # Startup settings
+    DB_CREATE_TABLES: bool = True  # create missing tables at startup
+    STARTUP_WARM_UP: bool = True  # open stores, indexes and encodings before serving
+    STARTUP_WARM_UP_TIMEOUT: float = 30.0  # serve anyway once this many seconds have passed
+
+    # Chat log write-behind settings
+    CHAT_LOG_SYNC: bool = False  # write each chat log in the request (e.g. for tests)
+    CHAT_LOG_BATCH_SIZE: int = 100  # rows per bulk insert
+    CHAT_LOG_FLUSH_INTERVAL: float = 0.5  # seconds a row may wait before being written
+    CHAT_LOG_QUEUE_SIZE: int = 10_000  # buffered rows before log() drops new ones
+    CHAT_LOG_FLUSH_TIMEOUT: float = 2.0  # longest a history read waits for buffered rows
+
+    # Local embedding settings
+    EMBEDDING_DIM: int = 384
+    EMBEDDING_CACHE_SIZE: int = 50_000  # in-memory LRU entries
+    EMBEDDING_CACHE_PATH: str = "embedding_cache/embeddings.sqlite3"  # empty disables the disk tier
 
-    # We no longer need CHROMA_HOST and CHROMA_PORT
-    # because we are using a local, persistent ChromaDB client.
+    # Vector store settings. We no longer need CHROMA_HOST and CHROMA_PORT
+    # because we are using a local, persistent ChromaDB client; "flat" swaps it
+    # for memory-mapped files shared by every worker process on the host.
+    VECTOR_STORE_BACKEND: str = "chroma"  # chroma | flat
+    FLAT_INDEX_DIR: str = "vector_index"
 
     class Config:
         env_file = ".env"
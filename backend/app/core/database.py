@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .config import settings
@@ -8,26 +9,52 @@ logger = logging.getLogger(__name__)
 
 # Construct the database URL from settings
 SQLALCHEMY_DATABASE_URL = f"postgresql://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}@{settings.POSTGRES_SERVER}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
+ASYNC_SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+_pool_options = dict(
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,  # Recycle connections periodically
+    pool_pre_ping=True,  # Enable connection health checks
+    echo=False,  # Set to True for SQL query logging
+)
 
 # Create the SQLAlchemy engine with connection retry logic
 try:
     engine = create_engine(
         SQLALCHEMY_DATABASE_URL,
-        pool_pre_ping=True,  # Enable connection health checks
-        pool_recycle=300,  # Recycle connections every 5 minutes
-        echo=False,  # Set to True for SQL query logging
+        pool_size=settings.DB_SYNC_POOL_SIZE,
+        **_pool_options,
     )
     logger.info("Database engine created successfully")
 except Exception as e:
     logger.error(f"Failed to create database engine: {e}")
     engine = None
 
+# Async engine (asyncpg) used by request handlers
+try:
+    async_engine = create_async_engine(
+        ASYNC_SQLALCHEMY_DATABASE_URL,
+        pool_size=settings.DB_POOL_SIZE,
+        **_pool_options,
+    )
+    logger.info("Async database engine created successfully")
+except Exception as e:
+    logger.error(f"Failed to create async database engine: {e}")
+    async_engine = None
+
 # Create a sessionmaker to generate new Session objects
 if engine:
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 else:
     SessionLocal = None
 
+if async_engine:
+    # Objects stay usable after commit, so handlers can return them directly
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+else:
+    AsyncSessionLocal = None
+
 # Base class for declarative class definitions
 Base = declarative_base()
 
@@ -48,6 +75,43 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """
+    Dependency to get an async database session.
+    Yields a session and ensures it's closed after the request.
+    """
+    if AsyncSessionLocal is None:
+        logger.error("Async database session factory not available")
+        raise Exception("Database connection not available")
+
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def dispose_engines():
+    """Closes pooled connections of both engines."""
+    if async_engine is not None:
+        await async_engine.dispose()
+    if engine is not None:
+        engine.dispose()
+
+
+def init_db() -> bool:
+    """
+    Creates missing tables (unless DB_CREATE_TABLES is off) and checks the
+    connection. Returns whether the database is reachable.
+    """
+    if engine is None:
+        logger.warning("Database engine not available")
+        return False
+    if settings.DB_CREATE_TABLES:
+        from .. import models  # noqa: F401  (registers every table on Base.metadata)
+
+        Base.metadata.create_all(bind=engine)
+        logger.info("Database tables created successfully")
+    return test_connection()
+
+
 def test_connection():
     """Test database connection"""
     if engine is None:
@@ -1,35 +1,206 @@
 from .config import settings
+from .cache import LRUCache, SQLiteStore
+from .metrics import registry, timed
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import hashlib
 import logging
+import math
+import re
+import threading
+import zlib
+
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingEmbedder:
+    """
+    CPU-only embedding model based on the hashing trick.
+
+    Each text is turned into word unigrams, word bigrams and character n-grams,
+    which are hashed (with a sign bit) into a fixed number of buckets, weighted
+    with sublinear term frequency and L2-normalised. No vocabulary or network
+    access is needed, so identical inputs always map to identical vectors.
+    """
+
+    def __init__(self, dim: int = 384, char_ngrams: Tuple[int, ...] = (3, 4)):
+        if dim <= 0:
+            raise ValueError("dim must be positive")
+        self.dim = dim
+        self.char_ngrams = char_ngrams
+        self.name = f"local-hash-v1-{dim}"
+        # Per-instance memo: token features repeat heavily across a corpus
+        self._token_features = lru_cache(maxsize=200_000)(self._compute_token_features)
+
+    def _bucket(self, feature: str) -> Tuple[int, float]:
+        h = zlib.crc32(feature.encode("utf-8"))
+        return h % self.dim, (1.0 if (h >> 31) & 1 else -1.0)
+
+    def _compute_token_features(self, token: str) -> Tuple[Tuple[int, float], ...]:
+        features = [self._bucket("w:" + token)]
+        padded = f"<{token}>"
+        for n in self.char_ngrams:
+            for i in range(len(padded) - n + 1):
+                bucket, sign = self._bucket("c:" + padded[i : i + n])
+                # Char n-grams are many and individually weak; down-weight them
+                features.append((bucket, sign * 0.5))
+        return tuple(features)
+
+    def _features(self, text: str) -> Dict[Tuple[int, float], int]:
+        tokens = _TOKEN_RE.findall(text.lower())
+        counts: Dict[Tuple[int, float], int] = {}
+        for token in tokens:
+            for feature in self._token_features(token):
+                counts[feature] = counts.get(feature, 0) + 1
+        for left, right in zip(tokens, tokens[1:]):
+            feature = self._bucket(f"b:{left} {right}")
+            counts[feature] = counts.get(feature, 0) + 1
+        return counts
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embeds a batch of texts into a (len(texts), dim) float32 matrix.
+        """
+        rows: List[int] = []
+        cols: List[int] = []
+        vals: List[float] = []
+        for row, text in enumerate(texts):
+            for (bucket, weight), count in self._features(text or "").items():
+                rows.append(row)
+                cols.append(bucket)
+                vals.append(weight * (1.0 + math.log(count)))
+
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if rows:
+            np.add.at(matrix, (np.asarray(rows), np.asarray(cols)), np.asarray(vals, dtype=np.float32))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+
+class EmbeddingCache:
+    """
+    Content-hash keyed embedding cache: an in-memory LRU in front of an
+    optional SQLite tier so vectors survive restarts.
+    """
+
+    def __init__(self, model_name: str, dim: int, max_entries: int, path: Optional[str] = None):
+        self.model_name = model_name
+        self.dim = dim
+        self.memory = LRUCache(max_entries=max_entries)
+        self.path = path
+        self._disk: Optional[SQLiteStore] = None
+        self._disk_opened = False
+        self._lock = threading.Lock()
+
+    @property
+    def disk(self) -> Optional[SQLiteStore]:
+        """The SQLite tier, opened on first use so importing the app creates no files."""
+        if not self._disk_opened:
+            with self._lock:
+                if not self._disk_opened:
+                    if self.path:
+                        try:
+                            self._disk = SQLiteStore(self.path, table="embeddings")
+                        except Exception as e:
+                            logger.warning(f"Embedding disk cache unavailable at {self.path}: {e}")
+                    self._disk_opened = True
+        return self._disk
+
+    def warm_up(self) -> bool:
+        """Opens the disk tier ahead of first use; False if it is configured but unavailable."""
+        return self.disk is not None or not self.path
+
+    def key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.model_name}:{digest}"
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        missing = []
+        for key in keys:
+            vector = self.memory.get(key)
+            if vector is None:
+                missing.append(key)
+            else:
+                found[key] = vector
+        if missing and self.disk is not None:
+            for key, blob in self.disk.get_many(missing).items():
+                vector = np.frombuffer(blob, dtype=np.float32)
+                if vector.shape[0] == self.dim:
+                    self.memory.set(key, vector)
+                    found[key] = vector
+        return found
+
+    def set_many(self, items: Dict[str, np.ndarray]) -> None:
+        for key, vector in items.items():
+            self.memory.set(key, vector)
+        if self.disk is not None:
+            try:
+                self.disk.set_many({k: v.astype(np.float32).tobytes() for k, v in items.items()})
+            except Exception as e:
+                logger.warning(f"Failed to persist embeddings to disk cache: {e}")
+
 
 class EmbeddingClient:
-    """Placeholder embedding client. Mistral embeddings are not implemented here.
-    Methods return None and log warnings. This prevents crashes while other LLM
-    logic was migrated to use Mistral for text generation.
+    """
+    Embedding client backed by the local hashing model, so it works on
+    air-gapped hosts. Results are cached by content hash.
     """
 
     def __init__(self):
-        logger.warning(
-            "EmbeddingClient initialized as placeholder — no embedding providers configured."
+        self.model = HashingEmbedder(dim=settings.EMBEDDING_DIM)
+        self.cache = EmbeddingCache(
+            model_name=self.model.name,
+            dim=self.model.dim,
+            max_entries=settings.EMBEDDING_CACHE_SIZE,
+            path=settings.EMBEDDING_CACHE_PATH or None,
         )
+        logger.info(f"EmbeddingClient initialized with local model {self.model.name}")
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds a batch of texts, computing only the ones missing from the cache.
+        """
+        with timed("embed"):
+            keys = [self.cache.key(text) for text in texts]
+            cached = self.cache.get_many(keys)
+
+            todo: Dict[str, str] = {}
+            for key, text in zip(keys, texts):
+                if key not in cached and key not in todo:
+                    todo[key] = text
+            if todo:
+                matrix = self.model.embed(list(todo.values()))
+                fresh = dict(zip(todo.keys(), matrix))
+                self.cache.set_many(fresh)
+                cached.update(fresh)
+
+        return [cached[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_batch([text])[0]
 
     def get_openai_embedding(self, text: str, model: str = "text-embedding-ada-002"):
-        logger.warning("OpenAI embeddings not available in this deployment.")
-        return None
+        # Kept for backwards compatibility; hosted providers are not used.
+        return self.embed_query(text)
 
     def get_gemini_embedding(self, text: str, model: str = "models/embedding-001"):
-        logger.warning("Gemini embeddings not available in this deployment.")
-        return None
+        # Kept for backwards compatibility; hosted providers are not used.
+        return self.embed_query(text)
 
     def is_available(self):
-        return False
+        return True
 
 
 # Create a global instance
 try:
     embedding_client = EmbeddingClient()
+    registry.register_cache("embedding", embedding_client.cache.memory.stats)
 except Exception as e:
     logger.error(f"Failed to initialize embedding client: {e}")
     embedding_client = None
@@ -0,0 +1,369 @@
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialised within a process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+# Segments are merged while the older neighbour holds at most this many times
+# the rows of the newer one, which keeps the segment count logarithmic
+MERGE_FACTOR = 2
+# A segment is rewritten without its deleted rows past this fraction
+COMPACT_RATIO = 0.5
+
+
+def _replace(path: str, write):
+    """Writes a file through a temp name and renames it into place."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class _Segment:
+    """
+    One immutable, memory-mapped segment:
+
+        <name>.vec.npy   float32 vectors (rows x dim)
+        <name>.norm.npy  float32 squared norms
+        <name>.doc.npy   int64 doc_id per row (-1 when absent)
+        <name>.rows      JSON lines of [id, document, metadata]
+        <name>.off.npy   int64 byte offsets into .rows (rows + 1)
+    """
+
+    def __init__(self, directory: str, name: str):
+        base = os.path.join(directory, name)
+        self.name = name
+        self.vectors = np.load(f"{base}.vec.npy", mmap_mode="r")
+        self.norms = np.load(f"{base}.norm.npy", mmap_mode="r")
+        self.doc_ids = np.load(f"{base}.doc.npy", mmap_mode="r")
+        self.offsets = np.load(f"{base}.off.npy", mmap_mode="r")
+        self.rows = np.memmap(f"{base}.rows", dtype=np.uint8, mode="r")
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def row(self, i: int):
+        return json.loads(bytes(self.rows[self.offsets[i] : self.offsets[i + 1]]))
+
+    def raw_rows(self, indices: Iterable[int]) -> List[bytes]:
+        return [bytes(self.rows[self.offsets[i] : self.offsets[i + 1]]) for i in indices]
+
+    @staticmethod
+    def write(directory: str, name: str, vectors: np.ndarray, doc_ids: np.ndarray, rows: Sequence[bytes]):
+        base = os.path.join(directory, name)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(row) for row in rows], out=offsets[1:])
+        _replace(f"{base}.vec.npy", lambda f: np.save(f, vectors))
+        _replace(f"{base}.norm.npy", lambda f: np.save(f, np.einsum("ij,ij->i", vectors, vectors)))
+        _replace(f"{base}.doc.npy", lambda f: np.save(f, np.asarray(doc_ids, dtype=np.int64)))
+        _replace(f"{base}.off.npy", lambda f: np.save(f, offsets))
+        _replace(f"{base}.rows", lambda f: f.writelines(rows))
+
+
+class _Snapshot:
+    """The segments and deletion masks named by one manifest version."""
+
+    def __init__(self, version: int, dim: Optional[int], segments: List[_Segment], deleted: List[Optional[np.ndarray]]):
+        self.version = version
+        self.dim = dim
+        self.segments = segments
+        self.deleted = deleted
+
+    def live(self):
+        """Yields (segment, live row indices)."""
+        for segment, deleted in zip(self.segments, self.deleted):
+            yield segment, (np.flatnonzero(~deleted) if deleted is not None else np.arange(len(segment)))
+
+
+class FlatVectorIndex:
+    """
+    Brute-force vector collection stored as memory-mapped NumPy segments,
+    exposing the subset of the ChromaDB collection API the services use
+    (add, query, get, delete, count) with squared L2 distances.
+
+    Every worker process maps the same files read-only, so the page cache
+    holds the index once per host. Writers take an exclusive file lock,
+    write new immutable segment files and publish them by atomically
+    replacing the manifest; readers notice the new manifest on their next
+    call and map only the segments they haven't seen. Deletes are recorded
+    as per-segment masks and segments are merged or compacted as they grow.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._manifest_path = os.path.join(directory, MANIFEST)
+        self._load_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._snapshot: Optional[_Snapshot] = None
+        self._stamp = None
+        self._segments: Dict[str, _Segment] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    # Reading
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(self._manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"version": 0, "dim": None, "next_segment": 0, "segments": []}
+
+    def _open(self, manifest: dict) -> _Snapshot:
+        segments, deleted = [], []
+        for entry in manifest["segments"]:
+            segment = self._segments.get(entry["name"])
+            if segment is None:
+                segment = _Segment(self.directory, entry["name"])
+            segments.append(segment)
+            mask = entry.get("deleted")
+            deleted.append(np.load(os.path.join(self.directory, mask)) if mask else None)
+        return _Snapshot(manifest["version"], manifest["dim"], segments, deleted)
+
+    def snapshot(self) -> _Snapshot:
+        """Returns the current snapshot, remapping only if the manifest changed."""
+        for _ in range(3):
+            try:
+                stat = os.stat(self._manifest_path)
+                stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                stamp = None
+            if self._snapshot is not None and stamp == self._stamp:
+                return self._snapshot
+            with self._load_lock:
+                if self._snapshot is not None and stamp == self._stamp:
+                    return self._snapshot
+                try:
+                    snapshot = self._open(self._read_manifest())
+                except FileNotFoundError:
+                    # A writer replaced the manifest and removed its old files meanwhile
+                    continue
+                # Segments are immutable, so mappings carry over between snapshots
+                self._segments = {segment.name: segment for segment in snapshot.segments}
+                self._snapshot, self._stamp = snapshot, stamp
+                return snapshot
+        raise RuntimeError(f"Flat vector index at {self.directory} kept changing while being opened")
+
+    def count(self) -> int:
+        return sum(len(rows) for _, rows in self.snapshot().live())
+
+    def query(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 10,
+        include: Sequence[str] = ("documents", "metadatas", "distances"),
+    ) -> dict:
+        snapshot = self.snapshot()
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for query in query_embeddings:
+            q = np.asarray(query, dtype=np.float32)
+            if snapshot.dim is not None and q.shape != (snapshot.dim,):
+                raise ValueError(f"Query has dimension {q.shape[-1]}, index has {snapshot.dim}")
+            candidates = []  # (distance, segment, row index)
+            for segment, deleted in zip(snapshot.segments, snapshot.deleted):
+                distances = segment.norms + np.float32(q @ q) - 2 * (segment.vectors @ q)
+                if deleted is not None:
+                    distances[deleted] = np.inf
+                k = min(n_results, len(distances))
+                top = np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(len(distances))
+                top = top[np.isfinite(distances[top])]
+                candidates.extend((float(distances[i]), segment, int(i)) for i in top)
+            candidates.sort(key=lambda c: c[0])
+            hits = [(distance, segment.row(i)) for distance, segment, i in candidates[:n_results]]
+            results["ids"].append([row[0] for _, row in hits])
+            results["documents"].append([row[1] for _, row in hits])
+            results["metadatas"].append([row[2] for _, row in hits])
+            results["distances"].append([distance for distance, _ in hits])
+        return {key: (value if key == "ids" or key in include else None) for key, value in results.items()}
+
+    def get(
+        self,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        include: Sequence[str] = ("documents", "metadatas"),
+    ) -> dict:
+        """Live rows in insertion order."""
+        ids, documents, metadatas = [], [], []
+        skip, remaining = offset, limit if limit is not None else float("inf")
+        for segment, rows in self.snapshot().live():
+            if remaining <= 0:
+                break
+            if skip >= len(rows):
+                skip -= len(rows)
+                continue
+            take = rows[skip : skip + remaining] if remaining != float("inf") else rows[skip:]
+            skip = 0
+            remaining -= len(take)
+            for i in take:
+                chunk_id, document, metadata = segment.row(i)
+                ids.append(chunk_id)
+                documents.append(document)
+                metadatas.append(metadata)
+        return {
+            "ids": ids,
+            "documents": documents if "documents" in include else None,
+            "metadatas": metadatas if "metadatas" in include else None,
+        }
+
+    # Writing
+
+    @contextmanager
+    def _writer(self):
+        """Exclusive across threads and (where fcntl exists) processes; yields the latest manifest."""
+        with self._write_lock, open(os.path.join(self.directory, ".lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield self._read_manifest()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _new_segment_name(self, manifest: dict) -> str:
+        name = f"seg-{manifest['next_segment']:06d}"
+        manifest["next_segment"] += 1
+        return name
+
+    def _publish(self, manifest: dict):
+        manifest["version"] += 1
+        _replace(self._manifest_path, lambda f: f.write(json.dumps(manifest).encode("utf-8")))
+        # Processes that already mapped removed files keep reading them (POSIX)
+        referenced = {MANIFEST, ".lock"}
+        for entry in manifest["segments"]:
+            referenced.update(
+                f"{entry['name']}{suffix}" for suffix in (".vec.npy", ".norm.npy", ".doc.npy", ".off.npy", ".rows")
+            )
+            if entry.get("deleted"):
+                referenced.add(entry["deleted"])
+        for filename in os.listdir(self.directory):
+            if filename not in referenced:
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass
+
+    def _rewrite(self, manifest: dict, entries: List[dict]) -> dict:
+        """Writes the live rows of the given segments into one new segment entry."""
+        vectors, doc_ids, rows = [], [], []
+        for entry in entries:
+            segment = _Segment(self.directory, entry["name"])
+            live = np.arange(len(segment))
+            if entry.get("deleted"):
+                live = np.flatnonzero(~np.load(os.path.join(self.directory, entry["deleted"])))
+            vectors.append(segment.vectors[live])
+            doc_ids.append(segment.doc_ids[live])
+            rows.extend(segment.raw_rows(live))
+        name = self._new_segment_name(manifest)
+        _Segment.write(self.directory, name, np.concatenate(vectors), np.concatenate(doc_ids), rows)
+        return {"name": name, "rows": len(rows), "live": len(rows), "deleted": None}
+
+    def add(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[dict]):
+        """Appends rows as a new segment. Ids are assumed to be new."""
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        doc_ids = np.array([int((m or {}).get("doc_id", -1)) for m in metadatas], dtype=np.int64)
+        rows = [
+            json.dumps([chunk_id, document, metadata or {}]).encode("utf-8") + b"\n"
+            for chunk_id, document, metadata in zip(ids, documents, metadatas)
+        ]
+        with self._writer() as manifest:
+            if manifest["dim"] is None:
+                manifest["dim"] = int(vectors.shape[1])
+            elif vectors.shape[1] != manifest["dim"]:
+                raise ValueError(f"Embeddings have dimension {vectors.shape[1]}, index has {manifest['dim']}")
+            name = self._new_segment_name(manifest)
+            _Segment.write(self.directory, name, vectors, doc_ids, rows)
+            segments = manifest["segments"]
+            segments.append({"name": name, "rows": len(rows), "live": len(rows), "deleted": None})
+            while len(segments) > 1 and segments[-2]["live"] <= MERGE_FACTOR * segments[-1]["live"]:
+                segments[-2:] = [self._rewrite(manifest, segments[-2:])]
+            self._publish(manifest)
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[dict] = None):
+        """Deletes rows by id and/or by `where={"doc_id": ...}`."""
+        if where and set(where) != {"doc_id"}:
+            raise ValueError("The flat vector index only filters on doc_id")
+        if not ids and not where:
+            return
+        wanted = set(ids or ())
+        with self._writer() as manifest:
+            snapshot = self._open(manifest)
+            changed = False
+            segments = []
+            for entry, segment, deleted in zip(manifest["segments"], snapshot.segments, snapshot.deleted):
+                match = np.zeros(len(segment), dtype=bool)
+                if where:
+                    match |= np.asarray(segment.doc_ids) == int(where["doc_id"])
+                if wanted:
+                    match |= np.array([segment.row(i)[0] in wanted for i in range(len(segment))])
+                if deleted is not None:
+                    match &= ~deleted
+                if not match.any():
+                    segments.append(entry)
+                    continue
+                changed = True
+                mask = match if deleted is None else (deleted | match)
+                entry = {**entry, "live": int(len(segment) - mask.sum())}
+                if entry["live"] == 0:
+                    continue
+                entry["deleted"] = f"{entry['name']}.del{manifest['version'] + 1}.npy"
+                _replace(os.path.join(self.directory, entry["deleted"]), lambda f: np.save(f, mask))
+                if entry["live"] < (1 - COMPACT_RATIO) * entry["rows"]:
+                    entry = self._rewrite(manifest, [entry])
+                segments.append(entry)
+            if changed:
+                manifest["segments"] = segments
+                self._publish(manifest)
+
+
+class FlatVectorStore:
+    """Collection registry for flat indexes under one directory, mirroring ChromaDBClient."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._collections: Dict[str, FlatVectorIndex] = {}
+        self._lock = threading.Lock()
+
+    def collection(self, name: str) -> FlatVectorIndex:
+        handle = self._collections.get(name)
+        if handle is None:
+            with self._lock:
+                handle = self._collections.get(name)
+                if handle is None:
+                    handle = FlatVectorIndex(os.path.join(self.directory, name))
+                    self._collections[name] = handle
+                    logger.info(f"Flat vector index opened at: {handle.directory}")
+        return handle
+
+    def get_or_create_collection(self, name: str) -> FlatVectorIndex:
+        return self.collection(name)
+
+    def is_connected(self) -> bool:
+        """
+        Returns True if the index directory exists or can be created.
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            return True
+        except OSError as e:
+            logger.error(f"Flat vector index directory is not available: {e}")
+            return False
+
+    def warm_up(self, names=("documents",)):
+        """Maps the current segments of the given collections ahead of first use."""
+        for name in names:
+            self.collection(name).snapshot()
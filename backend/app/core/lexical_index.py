@@ -0,0 +1,271 @@
+import heapq
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Keeps identifiers such as "AB-1234", "E_0x1F" or "v2.3.1" together
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./:][a-z0-9]+)*")
+_PART_RE = re.compile(r"[a-z0-9]+")
+# Meta key counting writes to the persisted index, across all processes
+GENERATION_KEY = "generation"
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased word tokens. Compound identifiers are emitted whole and also
+    split into their parts, so "ERR-042" matches both "err-042" and "042".
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(_PART_RE.findall(token))
+    return tokens
+
+
+class BM25Index:
+    """
+    In-process BM25 inverted index over knowledge base chunks.
+
+    Chunk text is persisted to a local SQLite file as it is added or removed;
+    the postings are rebuilt from it on first use. Every write bumps a
+    generation counter stored with the chunks, and each query first applies
+    the changes made since the generation this process last saw, so chunks
+    ingested by other worker processes are searchable everywhere.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._conn = None
+        self._generation: Optional[int] = None  # last persisted generation applied in memory
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._chunks: Dict[str, Tuple[int, str]] = {}  # chunk id -> (doc_id, text)
+        self._doc_chunks: Dict[int, Set[str]] = {}
+        self._total_length = 0
+        self._meta: Dict[str, str] = {}  # used when the index is not persisted
+
+    def _connect(self):
+        if self._conn is None and self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, doc_id INTEGER NOT NULL, "
+                "text TEXT NOT NULL, generation INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(chunks)")}
+            if "generation" not in columns:
+                # Index files written before generations were tracked
+                conn.execute("ALTER TABLE chunks ADD COLUMN generation INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_chunks_doc_id ON chunks (doc_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_chunks_generation ON chunks (generation)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS removed_documents (doc_id INTEGER NOT NULL, generation INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_removed_generation ON removed_documents (generation)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._conn = conn
+        return self._conn
+
+    def get_meta(self, key: str) -> Optional[str]:
+        """Reads a value stored alongside the index (e.g. migration markers)."""
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return self._meta.get(key)
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                self._meta[key] = value
+            else:
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    @staticmethod
+    def _read_generation(conn) -> int:
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (GENERATION_KEY,)).fetchone()
+        return int(row[0]) if row else 0
+
+    def _sync(self):
+        """
+        Loads the index on first use, then applies chunks added and documents
+        removed (by any process) since the last applied generation. Costs one
+        primary key lookup when nothing changed.
+        """
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                self._generation = 0
+                return
+            conn.execute("BEGIN")
+            try:
+                generation = self._read_generation(conn)
+                if generation == self._generation:
+                    return
+                if self._generation is None:
+                    for chunk_id, doc_id, text in conn.execute("SELECT id, doc_id, text FROM chunks"):
+                        self._index(chunk_id, doc_id, text)
+                    logger.info(f"Lexical index loaded with {len(self._chunks)} chunks from {self.path}")
+                else:
+                    # Removals first, so a document re-added afterwards keeps its new chunks
+                    removed = conn.execute(
+                        "SELECT doc_id FROM removed_documents WHERE generation > ? ORDER BY generation",
+                        (self._generation,),
+                    ).fetchall()
+                    for (doc_id,) in removed:
+                        self._unindex_document(doc_id)
+                    for chunk_id, doc_id, text in conn.execute(
+                        "SELECT id, doc_id, text FROM chunks WHERE generation > ?", (self._generation,)
+                    ):
+                        self._index(chunk_id, doc_id, text)
+                self._generation = generation
+            finally:
+                conn.execute("COMMIT")
+
+    def _write(self, apply, statements):
+        """
+        Runs `statements(conn, generation)` in a transaction that bumps the
+        generation, then `apply()` to update memory. If another process wrote
+        since our last sync, memory is left for the next _sync to catch up.
+        """
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                apply()
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                previous = self._read_generation(conn)
+                generation = previous + 1
+                statements(conn, generation)
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (GENERATION_KEY, str(generation))
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            if previous == self._generation:
+                apply()
+                self._generation = generation
+
+    def _index(self, chunk_id: str, doc_id: int, text: str):
+        if chunk_id in self._chunks:
+            self._unindex(chunk_id)
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[chunk_id] = tf
+        length = sum(counts.values())
+        self._lengths[chunk_id] = length
+        self._total_length += length
+        self._chunks[chunk_id] = (doc_id, text)
+        self._doc_chunks.setdefault(doc_id, set()).add(chunk_id)
+
+    def _unindex(self, chunk_id: str):
+        doc_id, text = self._chunks.pop(chunk_id)
+        for term in set(tokenize(text)):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(chunk_id)
+        chunk_ids = self._doc_chunks.get(doc_id)
+        if chunk_ids is not None:
+            chunk_ids.discard(chunk_id)
+            if not chunk_ids:
+                del self._doc_chunks[doc_id]
+
+    def _unindex_document(self, doc_id: int) -> int:
+        chunk_ids = list(self._doc_chunks.get(doc_id, ()))
+        for chunk_id in chunk_ids:
+            self._unindex(chunk_id)
+        return len(chunk_ids)
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[dict]):
+        """
+        Indexes chunks using the same ids, texts and metadatas (with doc_id)
+        passed to the vector collection.
+        """
+        self._sync()
+        rows = [(chunk_id, int(meta["doc_id"]), text) for chunk_id, text, meta in zip(ids, documents, metadatas)]
+
+        def statements(conn, generation):
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, doc_id, text, generation) VALUES (?, ?, ?, ?)",
+                [(*row, generation) for row in rows],
+            )
+
+        def apply():
+            for chunk_id, doc_id, text in rows:
+                self._index(chunk_id, doc_id, text)
+
+        self._write(apply, statements)
+
+    def remove_document(self, doc_id: int) -> int:
+        """Drops every chunk of a document; returns how many were removed."""
+        self._sync()
+        with self._lock:
+            removed = len(self._doc_chunks.get(doc_id, ()))
+
+            def statements(conn, generation):
+                conn.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+                conn.execute(
+                    "INSERT INTO removed_documents (doc_id, generation) VALUES (?, ?)", (doc_id, generation)
+                )
+
+            self._write(lambda: self._unindex_document(doc_id), statements)
+            return removed
+
+    def search(self, query: str, n_results: int = 10) -> List[Tuple[str, float, int, str]]:
+        """
+        Returns up to n_results (chunk_id, score, doc_id, text) by BM25 score.
+        """
+        self._sync()
+        terms = set(tokenize(query))
+        with self._lock:
+            total = len(self._chunks)
+            if not terms or not total:
+                return []
+            avg_length = self._total_length / total
+            scores: Dict[str, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[chunk_id] / avg_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+            best = heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+            return [(chunk_id, score, *self._chunks[chunk_id]) for chunk_id, score in best]
+
+    def __len__(self) -> int:
+        self._sync()
+        return len(self._chunks)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+lexical_index = BM25Index(settings.LEXICAL_INDEX_PATH, k1=settings.BM25_K1, b=settings.BM25_B)
@@ -1,14 +1,35 @@
-import requests
+import asyncio
+import json
+import threading
+import time
+from typing import AsyncIterator, Dict
+import httpx
 from .config import settings
+from .metrics import stage_seconds, timed, tracking
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 support in httpx)
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
 
 
 class MistralClient:
-    """Simple client for Mistral API using REST calls via requests."""
+    """Client for the Mistral API using pooled keep-alive connections via httpx.
 
-    BASE_URL = "https://api.mistral.ai"
+    `agenerate` is the async-native entry point for code running on the event
+    loop; `generate` is a synchronous facade for callers running in worker
+    threads. Both reuse long-lived connection pools instead of opening a new
+    connection per request.
+    """
 
     def __init__(self):
         self.api_key = settings.cleaned_mistral_key
+        self.base_url = settings.MISTRAL_BASE_URL.rstrip("/")
+        self._sync_client: httpx.Client | None = None
+        self._async_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        self._lock = threading.Lock()
 
     def _headers(self):
         if not self.api_key:
@@ -18,40 +39,65 @@ class MistralClient:
             "Content-Type": "application/json",
         }
 
-    def generate(
-        self,
-        user_prompt: str,
-        system_prompt: str | None = None,
-        model: str = "mistral-small",
-        temperature: float = 0.1,
-        max_tokens: int = 256,
-    ) -> str:
-        """Call Mistral chat completions endpoint and return assistant content.
+    def _client_options(self) -> dict:
+        return {
+            "base_url": self.base_url,
+            "http2": settings.MISTRAL_HTTP2 and HTTP2_AVAILABLE,
+            "timeout": httpx.Timeout(
+                connect=settings.MISTRAL_CONNECT_TIMEOUT,
+                read=settings.MISTRAL_READ_TIMEOUT,
+                write=settings.MISTRAL_CONNECT_TIMEOUT,
+                pool=settings.MISTRAL_POOL_TIMEOUT,
+            ),
+            "limits": httpx.Limits(
+                max_connections=settings.MISTRAL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.MISTRAL_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        }
 
-        Accepts an optional system_prompt to steer responses and uses conservative
-        defaults to reduce hallucination (low temperature, limited tokens).
-        """
-        # Use the correct Mistral AI chat completions endpoint
-        endpoint = "/v1/chat/completions"
+    def _get_sync_client(self) -> httpx.Client:
+        if self._sync_client is None:
+            with self._lock:
+                if self._sync_client is None:
+                    self._sync_client = httpx.Client(**self._client_options())
+        return self._sync_client
 
+    def _get_async_client(self) -> httpx.AsyncClient:
+        # Async connections are bound to the loop that opened them, so each loop gets its own pool
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            with self._lock:
+                for other in [l for l in self._async_clients if l.is_closed()]:
+                    # A closed loop can no longer close its connections gracefully
+                    del self._async_clients[other]
+                client = self._async_clients.get(loop)
+                if client is None:
+                    client = httpx.AsyncClient(**self._client_options())
+                    self._async_clients[loop] = client
+        return client
+
+    def _build_payload(
+        self,
+        user_prompt: str,
+        system_prompt: str | None,
+        model: str,
+        temperature: float,
+        max_tokens: int,
+    ) -> dict:
         messages = []
         if system_prompt:
             messages.append({"role": "system", "content": system_prompt})
         messages.append({"role": "user", "content": user_prompt})
 
-        payload = {
+        return {
             "model": model,
             "messages": messages,
             "temperature": temperature,
             "max_tokens": max_tokens,
         }
 
-        url = f"{self.BASE_URL}{endpoint}"
-        try:
-            resp = requests.post(url, json=payload, headers=self._headers(), timeout=30)
-        except Exception as e:
-            raise RuntimeError(f"Network error calling {url}: {e}")
-
+    def _parse_response(self, resp: httpx.Response, url: str) -> str:
         if resp.status_code != 200:
             raise RuntimeError(
                 f"Mistral API error {resp.status_code} at {url}: {resp.text}"
@@ -76,8 +122,132 @@ class MistralClient:
 
         return choice["message"]["content"]
 
-        # After trying all endpoints/payloads, raise last captured error
-        raise RuntimeError(last_error or "Unknown error calling Mistral API")
+    def generate(
+        self,
+        user_prompt: str,
+        system_prompt: str | None = None,
+        model: str = "mistral-small",
+        temperature: float = 0.1,
+        max_tokens: int = 256,
+    ) -> str:
+        """Call Mistral chat completions endpoint and return assistant content.
+
+        Accepts an optional system_prompt to steer responses and uses conservative
+        defaults to reduce hallucination (low temperature, limited tokens).
+        Blocking; use `agenerate` from async code.
+        """
+        # Use the correct Mistral AI chat completions endpoint
+        endpoint = "/v1/chat/completions"
+        url = f"{self.base_url}{endpoint}"
+        payload = self._build_payload(
+            user_prompt, system_prompt, model, temperature, max_tokens
+        )
+        try:
+            with tracking("llm"), timed("llm_call"):
+                resp = self._get_sync_client().post(
+                    endpoint, json=payload, headers=self._headers()
+                )
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"Network error calling {url}: {e}")
+
+        return self._parse_response(resp, url)
+
+    async def agenerate(
+        self,
+        user_prompt: str,
+        system_prompt: str | None = None,
+        model: str = "mistral-small",
+        temperature: float = 0.1,
+        max_tokens: int = 256,
+    ) -> str:
+        """Async variant of `generate` that does not block the event loop."""
+        endpoint = "/v1/chat/completions"
+        url = f"{self.base_url}{endpoint}"
+        payload = self._build_payload(
+            user_prompt, system_prompt, model, temperature, max_tokens
+        )
+        try:
+            with tracking("llm"), timed("llm_call"):
+                resp = await self._get_async_client().post(
+                    endpoint, json=payload, headers=self._headers()
+                )
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"Network error calling {url}: {e}")
+
+        return self._parse_response(resp, url)
+
+    async def astream(
+        self,
+        user_prompt: str,
+        system_prompt: str | None = None,
+        model: str = "mistral-small",
+        temperature: float = 0.1,
+        max_tokens: int = 256,
+    ) -> AsyncIterator[str]:
+        """Stream the completion, yielding content deltas as they arrive.
+
+        Uses the provider's streaming mode (`"stream": true`), which returns
+        server-sent events terminated by `data: [DONE]`.
+        """
+        endpoint = "/v1/chat/completions"
+        url = f"{self.base_url}{endpoint}"
+        payload = self._build_payload(
+            user_prompt, system_prompt, model, temperature, max_tokens
+        )
+        payload["stream"] = True
+        headers = {**self._headers(), "Accept": "text/event-stream"}
+        started = time.perf_counter()
+        first_token = True
+        try:
+            with tracking("llm"), timed("llm_call"):
+                async with self._get_async_client().stream(
+                    "POST", endpoint, json=payload, headers=headers
+                ) as resp:
+                    if resp.status_code != 200:
+                        body = (await resp.aread()).decode("utf-8", errors="replace")
+                        raise RuntimeError(
+                            f"Mistral API error {resp.status_code} at {url}: {body}"
+                        )
+                    async for line in resp.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        try:
+                            chunk = json.loads(data)
+                        except ValueError:
+                            raise RuntimeError(f"Invalid stream chunk from Mistral API: {data}")
+                        for choice in chunk.get("choices") or []:
+                            delta = (choice.get("delta") or {}).get("content")
+                            if delta:
+                                if first_token:
+                                    first_token = False
+                                    stage_seconds.labels("llm_first_token").observe(
+                                        time.perf_counter() - started
+                                    )
+                                yield delta
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"Network error calling {url}: {e}")
+
+    def close(self):
+        """Close the pooled sync connections."""
+        with self._lock:
+            if self._sync_client is not None:
+                self._sync_client.close()
+                self._sync_client = None
+
+    async def aclose(self):
+        """Close all connection pools; call on application shutdown."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients, self._async_clients = self._async_clients, {}
+        for owner, client in clients.items():
+            if owner is loop:
+                await client.aclose()
+            elif owner.is_running():
+                asyncio.run_coroutine_threadsafe(client.aclose(), owner)
+        self.close()
 
 
 mistral_client = MistralClient()
@@ -89,7 +259,7 @@ async def get_mistral_response(
     temperature: float = 0.1,
     max_tokens: int = 256,
 ) -> str:
-    return mistral_client.generate(
+    return await mistral_client.agenerate(
         user_prompt=prompt,
         system_prompt=None,
         model=model,
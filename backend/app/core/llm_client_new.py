@@ -1,5 +1,4 @@
-import google.generativeai as genai
-from openai import OpenAI
+import threading
 from .config import settings
 import logging
 
@@ -10,24 +9,51 @@ logger = logging.getLogger(__name__)
 
 class LLMClient:
     """
-    Client for interacting with Language Models (OpenAI and Gemini)
+    Client for interacting with Language Models (OpenAI and Gemini).
+
+    Provider SDKs are imported and configured on first use, so a missing or
+    invalid key only fails the requests that need that provider.
     """
 
     def __init__(self):
-        logger.info("Initializing LLM clients...")
-        self._init_openai()
-        self._init_gemini()
+        self._openai_client = None
+        self._gemini_configured = False
+        self._lock = threading.Lock()
+
+    @property
+    def openai_client(self):
+        if self._openai_client is None:
+            with self._lock:
+                if self._openai_client is None:
+                    self._openai_client = self._init_openai()
+        return self._openai_client
 
     def _init_openai(self):
         """Initialize OpenAI client"""
+        if not settings.cleaned_openai_key:
+            raise RuntimeError("OpenAI API key is not set")
         try:
-            self.openai_client = OpenAI(api_key=settings.cleaned_openai_key)
+            from openai import OpenAI
+
+            client = OpenAI(api_key=settings.cleaned_openai_key)
             logger.info("OpenAI client initialized successfully")
+            return client
         except Exception as e:
             logger.error(f"Failed to initialize OpenAI client: {e}")
-            self.openai_client = None
+            raise RuntimeError(f"OpenAI initialization failed: {str(e)}")
+
+    def _gemini(self):
+        """Returns the configured Gemini module"""
+        import google.generativeai as genai
+
+        if not self._gemini_configured:
+            with self._lock:
+                if not self._gemini_configured:
+                    self._init_gemini(genai)
+                    self._gemini_configured = True
+        return genai
 
-    def _init_gemini(self):
+    def _init_gemini(self, genai):
         """Initialize Gemini client"""
         try:
             # Configure Gemini with API key
@@ -46,11 +72,10 @@ class LLMClient:
 
     def get_openai_response(self, prompt: str, model="gpt-3.5-turbo", temperature=0.7):
         """Get response from OpenAI"""
-        if not self.openai_client:
-            raise RuntimeError("OpenAI client not initialized")
+        openai_client = self.openai_client
 
         try:
-            response = self.openai_client.chat.completions.create(
+            response = openai_client.chat.completions.create(
                 model=model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=temperature,
@@ -81,7 +106,7 @@ class LLMClient:
                 )
 
             # Create a new model instance for each request
-            gemini_model = genai.GenerativeModel(model)
+            gemini_model = self._gemini().GenerativeModel(model)
 
             # Simple request without extra config to minimize potential issues
             response = gemini_model.generate_content(prompt)
@@ -113,7 +138,7 @@ class LLMClient:
                 raise RuntimeError(f"Gemini error: {error_msg}")
 
 
-# Create a global instance
+# Create a global instance; cheap until a provider is first used
 llm_client = LLMClient()
 
 
@@ -0,0 +1,413 @@
+import logging
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets (seconds) covering cache hits through slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Timer:
+    """Context manager that observes its elapsed time on a histogram child."""
+
+    __slots__ = ("_child", "_start")
+
+    def __init__(self, child: "_HistogramChild"):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._start)
+        return False
+
+
+class _InFlight:
+    """Context manager that holds a gauge child up for its duration."""
+
+    __slots__ = ("_child",)
+
+    def __init__(self, child: "_GaugeChild"):
+        self._child = child
+
+    def __enter__(self):
+        self._child.inc()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.dec()
+        return False
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = float(value)
+
+    def track_inflight(self) -> _InFlight:
+        return _InFlight(self)
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class _Metric:
+    """
+    A named metric family. Label values are bound with labels(), which
+    returns a cached child; bind once and reuse the child on hot paths.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _items(self):
+        with self._lock:
+            return list(self._children.items())
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, key)} {_format_value(child.value)}"
+            for key, child in self._items()
+        ]
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, key)} {_format_value(child.value)}"
+            for key, child in self._items()
+        ]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets if b != math.inf))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, child in self._items():
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class CallbackGauge(_Metric):
+    """
+    Gauge read at scrape time from `collect`, which returns a mapping of
+    label value tuples to numbers. Used for state other components already
+    track (queue depths, cache counters), so the hot path does no extra work.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str],
+                 collect: Callable[[], Dict[Tuple[str, ...], float]], type: str = "gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+        self.type = type
+
+    def samples(self) -> List[str]:
+        try:
+            values = self.collect()
+        except Exception as e:
+            logger.warning(f"Could not collect metric {self.name}: {e}")
+            return []
+        return [
+            f"{self.name}{_labels(self.labelnames, tuple(str(v) for v in key))} {_format_value(float(value))}"
+            for key, value in values.items()
+        ]
+
+
+class MetricsRegistry:
+    """
+    Holds the process's metric families and renders them in the Prometheus
+    text exposition format (0.0.4). Caches register a stats() callable and
+    are reported as hit/miss counters plus a hit ratio.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._caches: Dict[str, Callable[[], dict]] = {}
+        self._lock = threading.Lock()
+        self.register(CallbackGauge(
+            "cache_requests_total", "Cache lookups by cache and result.",
+            ("cache", "result"), self._collect_cache_requests, type="counter",
+        ))
+        self.register(CallbackGauge(
+            "cache_hit_ratio", "Hits over lookups since process start.", ("cache",), self._collect_cache_ratios,
+        ))
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback_gauge(self, name: str, documentation: str, labelnames: Iterable[str], collect) -> CallbackGauge:
+        return self.register(CallbackGauge(name, documentation, labelnames, collect))
+
+    def register_cache(self, name: str, stats: Callable[[], dict]):
+        """Reports a cache whose stats() returns at least "hits" and "misses"."""
+        with self._lock:
+            self._caches[name] = stats
+
+    def _cache_stats(self) -> Dict[str, dict]:
+        with self._lock:
+            caches = list(self._caches.items())
+        collected = {}
+        for name, stats in caches:
+            try:
+                collected[name] = stats()
+            except Exception as e:
+                logger.warning(f"Could not read stats of cache {name}: {e}")
+        return collected
+
+    def _collect_cache_requests(self):
+        values = {}
+        for name, stats in self._cache_stats().items():
+            values[(name, "hit")] = stats.get("hits", 0)
+            values[(name, "miss")] = stats.get("misses", 0)
+        return values
+
+    def _collect_cache_ratios(self):
+        values = {}
+        for name, stats in self._cache_stats().items():
+            total = stats.get("hits", 0) + stats.get("misses", 0)
+            values[(name,)] = stats.get("hits", 0) / total if total else 0.0
+        return values
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "stage_duration_seconds",
+    "Latency of pipeline stages (pdf_parse, embed, vector_query, web_search, llm_call, db_commit, ...).",
+    ("stage",),
+)
+llm_prompt_tokens = registry.counter(
+    "llm_prompt_tokens_total", "Prompt tokens sent to the LLM (cache misses only).", ("workflow", "model")
+)
+llm_completion_tokens = registry.counter(
+    "llm_completion_tokens_total", "Completion tokens received from the LLM.", ("workflow", "model")
+)
+retrieval_abandoned = registry.counter(
+    "retrieval_abandoned_stages_total",
+    "Retrieval stages still running when the request's retrieval budget ran out.",
+    ("stage",),
+)
+in_flight = registry.gauge(
+    "in_flight", "Operations currently in progress, by kind (http, llm, ingestion).", ("kind",)
+)
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route", "status")
+)
+startup_seconds = registry.gauge(
+    "startup_duration_seconds", "Time spent importing the app, warming up each resource and starting up.", ("phase",)
+)
+
+
+def timed(stage: str) -> _Timer:
+    """
+    Times a block into stage_duration_seconds{stage}:
+
+        with timed("embed"):
+            ...
+    """
+    return stage_seconds.labels(stage).time()
+
+
+def tracking(kind: str) -> _InFlight:
+    """Counts a block in the in_flight{kind} gauge while it runs."""
+    return in_flight.labels(kind).track_inflight()
+
+
+def record_tokens(workflow_id: Optional[int], model: str, prompt_tokens: int, completion_tokens: int):
+    workflow = "none" if workflow_id is None else str(workflow_id)
+    llm_prompt_tokens.labels(workflow, model).inc(prompt_tokens)
+    llm_completion_tokens.labels(workflow, model).inc(completion_tokens)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording http_request_duration_seconds by route
+    template (so path parameters don't explode cardinality) and the number
+    of requests in flight. Streaming responses are timed until the last chunk.
+    """
+
+    def __init__(self, app, exclude: Iterable[str] = ("/metrics",)):
+        self.app = app
+        self.exclude = frozenset(exclude)
+        self._in_flight = in_flight.labels("http")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        self._in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self._in_flight.dec()
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            http_request_seconds.labels(scope.get("method", ""), template, status).observe(
+                time.perf_counter() - started
+            )
@@ -0,0 +1,112 @@
+from .config import settings
+from .cache import LRUCache, SQLiteStore
+from .metrics import registry
+from typing import Optional
+import hashlib
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Exact-match cache for LLM completions.
+
+    Keys are a hash of the normalised request (prompt, system prompt, model,
+    temperature, max_tokens). Entries live in a bounded in-memory LRU with a
+    TTL and, optionally, in a SQLite file that survives restarts.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = 3600, path: Optional[str] = None):
+        self.ttl_seconds = ttl_seconds
+        self.memory = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.disk = None
+        if path:
+            try:
+                self.disk = SQLiteStore(path, table="llm_responses")
+            except Exception as e:
+                logger.warning(f"LLM response disk cache unavailable at {path}: {e}")
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(text: Optional[str]) -> str:
+        # Whitespace differences never change the answer we'd get back
+        return " ".join((text or "").split())
+
+    def make_key(
+        self,
+        user_prompt: str,
+        system_prompt: Optional[str],
+        model: str,
+        temperature: float,
+        max_tokens: int,
+    ) -> str:
+        request = {
+            "prompt": self._normalize(user_prompt),
+            "system": self._normalize(system_prompt),
+            "model": model.strip().lower(),
+            "temperature": round(float(temperature), 3),
+            "max_tokens": int(max_tokens),
+        }
+        encoded = json.dumps(request, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        response = self.memory.get(key)
+        if response is None and self.disk is not None:
+            try:
+                blob = self.disk.get(key)
+            except Exception as e:
+                logger.warning(f"LLM response disk cache read failed: {e}")
+                blob = None
+            if blob is not None:
+                response = blob.decode("utf-8")
+                self.memory.set(key, response)
+        with self._lock:
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return response
+
+    def set(self, key: str, response: str) -> None:
+        self.memory.set(key, response)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, response.encode("utf-8"), ttl_seconds=self.ttl_seconds)
+            except Exception as e:
+                logger.warning(f"LLM response disk cache write failed: {e}")
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "size": len(self.memory),
+            "max_entries": self.memory.max_entries,
+            "persistent": self.disk is not None,
+        }
+
+
+# Create a global instance (None when caching is disabled)
+response_cache = (
+    ResponseCache(
+        max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+        ttl_seconds=settings.LLM_CACHE_TTL_SECONDS or None,
+        path=settings.LLM_CACHE_PATH or None,
+    )
+    if settings.LLM_CACHE_ENABLED
+    else None
+)
+if response_cache is not None:
+    registry.register_cache("llm_response", response_cache.stats)
@@ -1,24 +1,114 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, List
 from serpapi import GoogleSearch
+from .cache import LRUCache
 from .config import settings
+from .metrics import registry
 
 
 class SearchClient:
     """
     Client for performing web searches using SerpAPI.
+
+    Results are cached for a short TTL keyed on the normalised query and
+    parameters, and concurrent identical searches are coalesced into a single
+    upstream call (single-flight).
     """
 
     def __init__(self):
-        self.serpapi_api_key = settings.SERPAPI_API_KEY
+        self.serpapi_api_key = settings.cleaned_serpapi_key
+        self.base_url = settings.SERPAPI_BASE_URL.rstrip("/")
+        self.cache = LRUCache(
+            max_entries=settings.SEARCH_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.SEARCH_CACHE_TTL_SECONDS,
+        )
+        self.upstream_calls = 0
+        self.coalesced_calls = 0
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
 
-    def search_serpapi(self, query: str):
-        """
-        Performs a search using SerpAPI.
-        """
-        params = {"q": query, "api_key": self.serpapi_api_key}
+    def _cache_key(self, query: str, params: dict) -> str:
+        normalized = {"q": " ".join(query.lower().split()), **params}
+        return json.dumps(normalized, sort_keys=True, default=str)
+
+    def _fetch(self, query: str, params: dict) -> List[dict]:
+        if not self.serpapi_api_key:
+            raise RuntimeError("SerpAPI API key not configured in backend .env")
+        params = {**params, "q": query, "api_key": self.serpapi_api_key}
         # The correct class for this version is GoogleSearch
         client = GoogleSearch(params)
+        client.BACKEND = self.base_url
+        # Passed to requests as seconds; the library default is 60000
+        client.timeout = settings.SEARCH_TIMEOUT_SECONDS
         results = client.get_dict()
+        if results.get("error"):
+            # Don't let quota or key errors be cached as "no results"
+            raise RuntimeError(f"SerpAPI error: {results['error']}")
         return results.get("organic_results", [])
 
+    def search_serpapi(self, query: str, **params) -> List[dict]:
+        """
+        Performs a search using SerpAPI. Extra keyword arguments are passed
+        through as SerpAPI parameters (e.g. num, gl, hl).
+        """
+        key = self._cache_key(query, params)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return list(cached)
+        return self._search_uncached(key, query, params)
+
+    def _search_uncached(self, key: str, query: str, params: dict) -> List[dict]:
+        """Fetches after a cache miss, coalescing identical in-flight searches."""
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self.upstream_calls += 1
+            else:
+                self.coalesced_calls += 1
+
+        if not leader:
+            try:
+                # Slack on top of the leader's own request timeout
+                return list(future.result(timeout=settings.SEARCH_TIMEOUT_SECONDS + 1.0))
+            except FutureTimeoutError:
+                raise RuntimeError(f"SerpAPI search timed out after {settings.SEARCH_TIMEOUT_SECONDS:g}s")
+
+        try:
+            results = self._fetch(query, params)
+            self.cache.set(key, results)
+            future.set_result(results)
+            return list(results)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def asearch_serpapi(self, query: str, **params) -> List[dict]:
+        """
+        Async variant of search_serpapi. Shares the cache and in-flight
+        coalescing with synchronous callers.
+        """
+        key = self._cache_key(query, params)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return list(cached)
+        return await asyncio.to_thread(self._search_uncached, key, query, params)
+
+    def stats(self) -> dict:
+        return {
+            **self.cache.stats(),
+            "upstream_calls": self.upstream_calls,
+            "coalesced_calls": self.coalesced_calls,
+        }
+
 
 search_client = SearchClient()
+registry.register_cache("web_search", search_client.stats)
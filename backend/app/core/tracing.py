@@ -0,0 +1,446 @@
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .cache import LRUCache
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """
+    A timed operation in a trace. Children may be added from other threads
+    (list.append is atomic). Spans are plain picklable objects, so a process
+    pool worker can return the spans it recorded to the parent.
+    """
+
+    __slots__ = ("name", "attributes", "start", "end", "children", "error", "thread")
+
+    def __init__(self, name: str, attributes: Optional[dict] = None):
+        self.name = name
+        self.attributes = attributes or {}
+        self.start = time.perf_counter()  # CLOCK_MONOTONIC: comparable across processes on Linux
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+        self.error: Optional[str] = None
+        self.thread = threading.current_thread().name
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self, origin: float) -> dict:
+        end = self.end if self.end is not None else time.perf_counter()
+        data = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+            "thread": self.thread,
+        }
+        if self.attributes:
+            data["attributes"] = {k: _jsonable(v) for k, v in self.attributes.items()}
+        if self.error:
+            data["error"] = self.error
+        if self.end is None:
+            data["unfinished"] = True
+        if self.children:
+            data["children"] = [child.to_dict(origin) for child in sorted(self.children, key=lambda s: s.start)]
+        return data
+
+
+def _jsonable(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+class Trace:
+    """Span tree of one request, plus its statistical profile when profiling."""
+
+    def __init__(self, name: str, profile: bool = False, trace_id: Optional[str] = None):
+        self.id = trace_id or uuid.uuid4().hex
+        self.root = Span(name)
+        self.created_at = time.time()
+        self.profiler = Profiler(self) if profile else None
+        # Threads currently running work for this trace (ident -> nesting depth)
+        self.threads: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def enter_thread(self):
+        ident = threading.get_ident()
+        with self._lock:
+            self.threads[ident] = self.threads.get(ident, 0) + 1
+
+    def exit_thread(self):
+        ident = threading.get_ident()
+        with self._lock:
+            depth = self.threads.get(ident, 0) - 1
+            if depth > 0:
+                self.threads[ident] = depth
+            else:
+                self.threads.pop(ident, None)
+
+    def active_threads(self) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self.threads)
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.root.name,
+            "created_at": self.created_at,
+            "duration_ms": round(((self.root.end or time.perf_counter()) - self.root.start) * 1000, 3),
+            "status": self.root.attributes.get("status"),
+            "profiled": self.profiler is not None,
+        }
+
+    def to_dict(self) -> dict:
+        return {**self.summary(), "root": self.root.to_dict(self.root.start)}
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("span", default=None)
+
+
+class _SpanScope:
+    """Context manager that opens a child span of the current span."""
+
+    __slots__ = ("trace", "span", "_token")
+
+    def __init__(self, trace: Trace, name: str, attributes: dict):
+        self.trace = trace
+        self.span = Span(name, attributes)
+
+    def __enter__(self) -> Span:
+        parent = _current_span.get()
+        (parent or self.trace.root).children.append(self.span)
+        self._token = _current_span.set(self.span)
+        self.trace.enter_thread()
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.end = time.perf_counter()
+        if exc is not None:
+            self.span.error = f"{exc_type.__name__}: {exc}"
+        self.trace.exit_thread()
+        _current_span.reset(self._token)
+        return False
+
+
+class _NoopSpan:
+    """Returned by span() when the request is not traced; does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **attributes):
+    """
+    Records a child span of the current span when the request is traced:
+
+        with span("retrieval.vector", n_results=5) as s:
+            ...
+            s.set(chunks=len(results))
+
+    Untraced requests pay for one context variable lookup.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP
+    return _SpanScope(trace, name, attributes)
+
+
+def traced(name: Optional[str] = None):
+    """Decorator form of span() for sync and async functions."""
+
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def bind(fn: Callable) -> Callable:
+    """
+    Binds `fn` to a copy of the caller's context, so work submitted to a
+    thread pool records its spans under the submitting span. The worker
+    thread is also registered for profiling while `fn` runs.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return fn
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        trace.enter_thread()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            trace.exit_thread()
+
+    return functools.partial(context.run, run)
+
+
+def carrier() -> Optional[dict]:
+    """Trace context to hand to a process pool task (None when not tracing)."""
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    return {"trace_id": trace.id}
+
+
+def run_remote(trace_carrier: Optional[dict], fn: Callable, *args):
+    """
+    Process pool entry point: runs fn(*args) and returns (result, span), where
+    span holds the spans recorded in the worker (None when not tracing).
+    Pass the result to adopt() in the parent.
+    """
+    if trace_carrier is None:
+        return fn(*args), None
+    trace = Trace(getattr(fn, "__qualname__", "remote"), trace_id=trace_carrier["trace_id"])
+    trace.root.set(pid=os.getpid())
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(trace.root)
+    try:
+        return fn(*args), trace.root
+    finally:
+        trace.root.end = time.perf_counter()
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+
+
+def adopt(outcome: Tuple[Any, Optional[Span]]):
+    """Grafts the spans returned by run_remote under the current span and returns the result."""
+    result, remote = outcome
+    if remote is not None:
+        trace = _current_trace.get()
+        if trace is not None:
+            (_current_span.get() or trace.root).children.append(remote)
+    return result
+
+
+class Profiler:
+    """
+    Statistical profiler for one trace: a background thread samples the
+    stacks of the threads currently running the trace's spans every
+    PROFILE_INTERVAL_SECONDS and counts them as collapsed stacks (the input
+    format of flamegraph.pl / speedscope). The event loop thread is shared
+    by concurrent requests, so its samples may include other requests' work.
+    """
+
+    def __init__(self, trace: Trace, interval: Optional[float] = None, max_seconds: Optional[float] = None):
+        self.trace = trace
+        self.interval = interval or settings.PROFILE_INTERVAL_SECONDS
+        self.max_seconds = max_seconds or settings.PROFILE_MAX_SECONDS
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{self.trace.id[:8]}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        deadline = time.monotonic() + self.max_seconds
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            frames = sys._current_frames()
+            for ident in self.trace.active_threads():
+                frame = frames.get(ident)
+                if frame is not None and ident != own:
+                    self.samples[_collapse(frame)] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def _collapse(frame) -> str:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+class TraceStore:
+    """
+    Keeps the most recent finished traces in memory and, when TRACE_DIR is
+    set, writes each one (span tree JSON and collapsed-stack profile) to disk
+    so they can be downloaded after a restart.
+    """
+
+    def __init__(self, max_entries: int = 200, directory: Optional[str] = None):
+        self.memory = LRUCache(max_entries=max_entries)
+        self.directory = directory
+        self._index: List[str] = []
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def save(self, trace: Trace):
+        record = {"trace": trace.to_dict(), "profile": trace.profiler.collapsed() if trace.profiler else None}
+        self.memory.set(trace.id, record)
+        with self._lock:
+            self._index.append(trace.id)
+            del self._index[:-self.memory.max_entries]
+        if self.directory:
+            try:
+                with open(os.path.join(self.directory, f"{trace.id}.json"), "w") as f:
+                    json.dump(record["trace"], f)
+                if record["profile"] is not None:
+                    with open(os.path.join(self.directory, f"{trace.id}.folded"), "w") as f:
+                        f.write(record["profile"])
+            except OSError as e:
+                logger.warning(f"Could not write trace {trace.id} to {self.directory}: {e}")
+
+    def _load(self, trace_id: str) -> Optional[dict]:
+        record = self.memory.get(trace_id)
+        if record is not None or not self.directory or not trace_id.isalnum():
+            return record
+        path = os.path.join(self.directory, f"{trace_id}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            record = {"trace": json.load(f), "profile": None}
+        profile_path = os.path.join(self.directory, f"{trace_id}.folded")
+        if os.path.exists(profile_path):
+            with open(profile_path) as f:
+                record["profile"] = f.read()
+        return record
+
+    def get(self, trace_id: str) -> Optional[dict]:
+        record = self._load(trace_id)
+        return record["trace"] if record else None
+
+    def get_profile(self, trace_id: str) -> Optional[str]:
+        record = self._load(trace_id)
+        return record["profile"] if record else None
+
+    def recent(self, limit: int = 50) -> List[dict]:
+        with self._lock:
+            ids = list(reversed(self._index))
+        summaries = []
+        for trace_id in ids:
+            record = self.memory.get(trace_id)
+            if record is not None:
+                trace = record["trace"]
+                summaries.append({k: v for k, v in trace.items() if k != "root"})
+            if len(summaries) >= limit:
+                break
+        return summaries
+
+
+trace_store = TraceStore(max_entries=settings.TRACE_HISTORY, directory=settings.TRACE_DIR or None)
+
+
+def _opt_in(headers: Dict[str, str]) -> Tuple[bool, bool]:
+    """Returns (trace, profile) for a request from its header and the sample rates."""
+    value = headers.get(settings.TRACE_HEADER.lower(), "").strip().lower()
+    if value == "profile":
+        return True, True
+    if value in ("1", "true", "yes", "on"):
+        return True, False
+    if settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+        return True, True
+    if settings.TRACE_SAMPLE_RATE and random.random() < settings.TRACE_SAMPLE_RATE:
+        return True, False
+    return False, False
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware that traces opted-in requests: a request is traced when
+    it carries TRACE_HEADER ("1" for spans, "profile" for spans plus a
+    statistical profile) or is picked by TRACE_SAMPLE_RATE /
+    PROFILE_SAMPLE_RATE. The trace id is returned in the same header and the
+    finished trace is kept in trace_store.
+    """
+
+    def __init__(self, app, exclude_prefixes: Tuple[str, ...] = ("/metrics", "/api/v1/traces")):
+        self.app = app
+        self.exclude_prefixes = exclude_prefixes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path", "").startswith(self.exclude_prefixes):
+            await self.app(scope, receive, send)
+            return
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", ())}
+        enabled, profile = _opt_in(headers)
+        if not enabled:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(f"{scope.get('method')} {scope.get('path')}", profile=profile)
+        trace.root.set(method=scope.get("method"), path=scope.get("path"))
+        header = settings.TRACE_HEADER.lower().encode("latin-1")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                trace.root.set(status=message["status"])
+                message["headers"] = [*message.get("headers", []), (header, trace.id.encode("latin-1"))]
+            await send(message)
+
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(trace.root)
+        trace.enter_thread()
+        if trace.profiler is not None:
+            trace.profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            trace.root.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            trace.root.end = time.perf_counter()
+            trace.exit_thread()
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            if trace.profiler is not None:
+                trace.profiler.stop()
+            route = scope.get("route")
+            if route is not None:
+                trace.root.name = f"{scope.get('method')} {route.path}"
+                trace.root.set(route=route.path)
+            trace_store.save(trace)
@@ -0,0 +1,25 @@
+from .config import settings
+
+VECTOR_STORE_BACKENDS = ("chroma", "flat")
+
+
+def create_vector_store(backend: str = settings.VECTOR_STORE_BACKEND):
+    """
+    Returns the client for the configured vector store. Both expose
+    collection(name), is_connected() and warm_up().
+    """
+    backend = backend.lower()
+    if backend == "chroma":
+        from .chroma import chroma_client
+
+        return chroma_client
+    if backend == "flat":
+        from .flat_index import FlatVectorStore
+
+        return FlatVectorStore(settings.FLAT_INDEX_DIR)
+    raise ValueError(
+        f"Unknown VECTOR_STORE_BACKEND '{backend}'; use one of: {', '.join(VECTOR_STORE_BACKENDS)}"
+    )
+
+
+vector_store = create_vector_store()
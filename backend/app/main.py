@@ -1,8 +1,17 @@
-from fastapi import FastAPI
+import time
+
+_import_started = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import sys
 import os
 import logging
+from .core.config import settings
+from .core.metrics import CONTENT_TYPE, MetricsMiddleware, registry, startup_seconds
+from .core.tracing import TracingMiddleware
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -11,10 +20,87 @@ logger = logging.getLogger(__name__)
 # Add the parent directory to the path to allow imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+
+def _warm_up_tasks():
+    """Startup work, run in parallel threads; each name doubles as the metrics phase."""
+    from .core.database import init_db
+    from .core.embeddings import embedding_client
+    from .core.vector_store import vector_store
+    from .services import retrieval_service
+    from .utils.tokenizer import warm_up as warm_up_tokenizer
+
+    tasks = {"database": init_db}
+    if settings.STARTUP_WARM_UP:
+        tasks.update(
+            tokenizer=warm_up_tokenizer,
+            vector_store=vector_store.warm_up,
+            lexical_index=retrieval_service.warm_up,
+        )
+        if embedding_client is not None:
+            tasks["embedding_cache"] = embedding_client.cache.warm_up
+    return tasks
+
+
+async def _run_warm_up_task(name, fn):
+    started = time.perf_counter()
+    try:
+        result = await asyncio.to_thread(fn)
+    except Exception as e:
+        logger.warning(f"⚠ Warning: {name} warm-up failed: {e}")
+        if name == "database":
+            logger.info("   Make sure PostgreSQL is running and credentials are correct")
+        return
+    finally:
+        startup_seconds.labels(name).set(time.perf_counter() - started)
+    if result is False:
+        logger.warning(f"⚠ {name} is not available")
+    else:
+        logger.info(f"✓ {name} ready in {time.perf_counter() - started:.2f}s")
+
+
+async def _stop_services():
+    from .core.database import dispose_engines
+    from .core.llm_client import mistral_client
+    from .services import chat_log_writer, ingestion_service
+
+    # Release pooled upstream connections
+    await mistral_client.aclose()
+    # Let running ingestion jobs finish; drop queued ones
+    await asyncio.to_thread(ingestion_service.shutdown, True)
+    # Write chat logs still buffered by the write-behind logger
+    await asyncio.to_thread(chat_log_writer.shutdown)
+    # Close pooled database connections once buffered writes are done
+    await dispose_engines()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Opens the database, vector store, lexical index and tokenizer in parallel
+    before serving, instead of at import time. Warm-up that outlasts
+    STARTUP_WARM_UP_TIMEOUT carries on in the background.
+    """
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(_run_warm_up_task(name, fn)) for name, fn in _warm_up_tasks().items()]
+    _, pending = await asyncio.wait(tasks, timeout=settings.STARTUP_WARM_UP_TIMEOUT)
+    if pending:
+        logger.warning(f"⚠ Serving before warm-up finished ({len(pending)} task(s) still running)")
+    startup_seconds.labels("startup").set(time.perf_counter() - started)
+    logger.info(
+        f"✓ Startup finished in {time.perf_counter() - started:.2f}s "
+        f"(imports took {_import_seconds:.2f}s)"
+    )
+    try:
+        yield
+    finally:
+        await _stop_services()
+
+
 app = FastAPI(
     title="AI Planet API",
     description="No-Code/Low-Code Workflow API with AI capabilities",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS middleware
@@ -26,6 +112,10 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+
 # Include routers with error handling
 try:
     from .api.routes_document import router as document_router
@@ -62,24 +152,15 @@ try:
 except ImportError as e:
     logger.warning(f"⚠ Warning: Could not load workflow routes: {e}")
 
-# Database initialization with error handling
 try:
-    from .core.database import engine, Base, test_connection
-    if engine is not None:
-        # Create database tables
-        Base.metadata.create_all(bind=engine)
-        logger.info("✓ Database tables created successfully")
-        
-        # Test connection
-        if test_connection():
-            logger.info("✓ Database connection test successful")
-        else:
-            logger.warning("⚠ Database connection test failed")
-    else:
-        logger.warning("⚠ Database engine not available")
-except Exception as e:
-    logger.warning(f"⚠ Warning: Could not initialize database: {e}")
-    logger.info("   Make sure PostgreSQL is running and credentials are correct")
+    from .api.routes_traces import router as traces_router
+    app.include_router(traces_router, prefix="/api/v1/traces", tags=["traces"])
+    logger.info("✓ Trace routes loaded successfully")
+except ImportError as e:
+    logger.warning(f"⚠ Warning: Could not load trace routes: {e}")
+
+_import_seconds = time.perf_counter() - _import_started
+startup_seconds.labels("import").set(_import_seconds)
 
 @app.get("/")
 def read_root():
@@ -90,6 +171,13 @@ def read_root():
         "docs": "/docs"
     }
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint (text exposition format 0.0.4)."""
+    if not settings.METRICS_ENABLED:
+        return Response(status_code=404)
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
 @app.get("/health")
 def health_check():
     """Health check endpoint"""
@@ -97,7 +185,7 @@ def health_check():
         "status": "healthy",
         "message": "API is running",
         "database": "unknown",
-        "chromadb": "unknown"
+        "vector_store": "unknown"
     }
     
     # Check database status
@@ -110,15 +198,15 @@ def health_check():
     except:
         health_status["database"] = "error"
     
-    # Check ChromaDB status
+    # Check vector store status (ChromaDB or the flat index)
     try:
-        from .core.chroma import chroma_client
-        if chroma_client and chroma_client.is_connected():
-            health_status["chromadb"] = "connected"
+        from .core.vector_store import vector_store
+        if vector_store and vector_store.is_connected():
+            health_status["vector_store"] = "connected"
         else:
-            health_status["chromadb"] = "disconnected"
+            health_status["vector_store"] = "disconnected"
     except:
-        health_status["chromadb"] = "error"
+        health_status["vector_store"] = "error"
     
     return health_status
 
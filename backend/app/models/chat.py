@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from ..core.database import Base
@@ -16,3 +16,8 @@ class ChatLog(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     workflow = relationship("Workflow")
+
+    __table_args__ = (
+        # Serves history lookups and keyset pagination per workflow
+        Index("ix_chat_logs_workflow_created_id", "workflow_id", "created_at", "id"),
+    )
@@ -1,14 +1,48 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text
+import zlib
+from sqlalchemy import Column, Integer, String, DateTime, Text, LargeBinary, Index
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
+from ..core.config import settings
 from ..core.database import Base
 
 class Document(Base):
     """
     SQLAlchemy model for documents.
+    The extracted text is deferred so listings never load it; it is stored
+    either as plain text or zlib-compressed, and read through `content`.
     """
     __tablename__ = "documents"
 
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, index=True)
-    content = Column(Text)
+    content_text = deferred(Column("content", Text))
+    content_compressed = deferred(Column(LargeBinary))
+    content_hash = Column(String(64), index=True)  # sha256 of the uploaded file
+    size = Column(Integer)  # uploaded file size in bytes
+    page_count = Column(Integer)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_documents_created_id", "created_at", "id"),
+    )
+
+    @staticmethod
+    def decode_content(text, compressed):
+        if compressed is not None:
+            return zlib.decompress(compressed).decode("utf-8")
+        return text
+
+    @property
+    def content(self):
+        return self.decode_content(self.content_text, self.content_compressed)
+
+    @content.setter
+    def content(self, value):
+        if value is not None and settings.DOCUMENT_COMPRESSION:
+            self.content_compressed = zlib.compress(
+                value.encode("utf-8"), settings.DOCUMENT_COMPRESSION_LEVEL
+            )
+            self.content_text = None
+        else:
+            self.content_text = value
+            self.content_compressed = None
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing import List, Optional
 
 class ChatLogBase(BaseModel):
     workflow_id: int
@@ -15,3 +16,7 @@ class ChatLog(ChatLogBase):
 
     class Config:
         orm_mode = True
+
+class ChatLogPage(BaseModel):
+    items: List[ChatLog]
+    next_cursor: Optional[str] = None
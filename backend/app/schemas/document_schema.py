@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing import List, Optional
 
 class DocumentBase(BaseModel):
     filename: str
@@ -8,9 +9,47 @@ class DocumentBase(BaseModel):
 class DocumentCreate(DocumentBase):
     pass
 
-class Document(DocumentBase):
+class DocumentSummary(BaseModel):
     id: int
+    filename: str
+    size: Optional[int] = None
+    page_count: Optional[int] = None
     created_at: datetime
 
     class Config:
         orm_mode = True
+
+class Document(DocumentSummary):
+    content: str
+
+class DocumentPage(BaseModel):
+    items: List[DocumentSummary]
+    next_cursor: Optional[str] = None
+
+class IngestionJob(BaseModel):
+    id: str
+    filename: str
+    status: str
+    stage: str
+    total_pages: Optional[int] = None
+    pages_parsed: int = 0
+    chunks_embedded: int = 0
+    document_id: Optional[int] = None
+    deduplicated: bool = False
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+class BulkUploadItem(BaseModel):
+    filename: str
+    status: str
+    document_id: Optional[int] = None
+    pages: Optional[int] = None
+    chunks: Optional[int] = None
+    error: Optional[str] = None
+
+class BulkUploadResult(BaseModel):
+    total: int
+    succeeded: int
+    failed: int
+    items: List[BulkUploadItem]
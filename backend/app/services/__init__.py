@@ -9,12 +9,18 @@ instead of importing the module path directly.
 from .workflow_service import workflow_service
 from .chat_service import chat_service
 from .document_service import document_service
+from .retrieval_service import retrieval_service
 from .llm_service import llm_service
+from .ingestion_service import ingestion_service
+from .chat_log_writer import chat_log_writer
 
 __all__ = [
     "workflow_service",
     "chat_service",
     "document_service",
+    "retrieval_service",
     "llm_service",
+    "ingestion_service",
+    "chat_log_writer",
 ]
 
@@ -0,0 +1,180 @@
+from datetime import datetime, timezone
+import logging
+import queue
+import threading
+import time
+from fastapi.concurrency import run_in_threadpool
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..core.metrics import registry
+from .chat_service import chat_service
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class _FlushMarker:
+    """Queued by flush(); set once every row queued before it is written."""
+
+    __slots__ = ("done",)
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class ChatLogWriter:
+    """
+    Write-behind persistence for chat logs. log() only enqueues the row and
+    never blocks: when the queue is full the row is dropped and counted. A
+    background thread bulk-inserts queued rows once `batch_size` are waiting
+    or `flush_interval` seconds have passed. In sync mode rows are written
+    immediately; async callers use alog(), which does that write on the
+    threadpool.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 100,
+        flush_interval: float = 0.5,
+        max_queue: int = 10_000,
+        sync: bool = False,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sync = sync
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _record(self, workflow_id: int, sender: str, message: str) -> dict:
+        # Stamped here so batching does not change the order or time of messages
+        return {
+            "workflow_id": workflow_id,
+            "sender": sender,
+            "message": str(message),
+            "created_at": datetime.now(timezone.utc),
+        }
+
+    def log(self, workflow_id: int, sender: str, message: str):
+        record = self._record(workflow_id, sender, message)
+        if self.sync:
+            self._write([record])
+            return
+        self._enqueue(record)
+
+    async def alog(self, workflow_id: int, sender: str, message: str):
+        """Async variant of log() for use on the event loop."""
+        record = self._record(workflow_id, sender, message)
+        if self.sync:
+            await run_in_threadpool(self._write, [record])
+            return
+        self._enqueue(record)
+
+    def _enqueue(self, record: dict):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            # Callers run on the event loop; losing a log row beats stalling every request
+            chat_logs_dropped.inc()
+            logger.warning(f"Chat log queue full, dropping a row for workflow {record['workflow_id']}")
+
+    def flush(self, timeout: float = settings.CHAT_LOG_FLUSH_TIMEOUT) -> bool:
+        """
+        Blocks until every row logged before this call has been written (or
+        dropped), for at most `timeout` seconds. Rows logged concurrently don't
+        extend the wait. Returns False on timeout.
+        """
+        if self._thread is None:
+            return True
+        marker = _FlushMarker()
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.done.wait(max(0.0, deadline - time.monotonic()))
+
+    def pending(self) -> int:
+        """Rows (and control markers) waiting in the queue."""
+        return self._queue.qsize()
+
+    def shutdown(self):
+        """Writes all buffered rows and stops the background thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="chat-log-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        batch = []
+        deadline = None
+        stopping = False
+        while not stopping:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            forced = False
+            marker = None
+            try:
+                item = self._queue.get(timeout=timeout)
+                if item is _STOP or isinstance(item, _FlushMarker):
+                    self._queue.task_done()
+                    stopping = item is _STOP
+                    marker = item if not stopping else None
+                    forced = True
+                else:
+                    batch.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+            except queue.Empty:
+                pass
+
+            if batch and (forced or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._write(batch)
+                for _ in batch:
+                    self._queue.task_done()
+                batch = []
+                deadline = None
+            if marker is not None:
+                marker.done.set()
+
+    def _write(self, records):
+        if SessionLocal is None:
+            logger.error(f"Database not available, dropping {len(records)} chat log(s)")
+            return
+        db = SessionLocal()
+        try:
+            chat_service.create_chat_logs(db, records)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to write {len(records)} chat log(s): {e}")
+        finally:
+            db.close()
+
+
+chat_log_writer = ChatLogWriter(
+    batch_size=settings.CHAT_LOG_BATCH_SIZE,
+    flush_interval=settings.CHAT_LOG_FLUSH_INTERVAL,
+    max_queue=settings.CHAT_LOG_QUEUE_SIZE,
+    sync=settings.CHAT_LOG_SYNC,
+)
+chat_logs_dropped = registry.counter(
+    "chat_logs_dropped_total", "Chat log rows dropped because the write-behind queue was full."
+)
+registry.callback_gauge(
+    "chat_log_queue_depth",
+    "Chat log rows waiting for the write-behind thread.",
+    (),
+    lambda: {(): chat_log_writer.pending()},
+)
@@ -1,19 +1,60 @@
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from .. import models
+from ..core.metrics import timed
 from ..schemas import chat_schema
+from ..utils.pagination import NEWEST_FIRST, keyset_result, keyset_select
+from typing import List, Optional
 
 class ChatService:
     """
     Service for handling chat log operations.
     """
-    def get_chat_logs_by_workflow(self, db: Session, workflow_id: int, skip: int = 0, limit: int = 100):
-        return db.query(models.chat.ChatLog).filter(models.chat.ChatLog.workflow_id == workflow_id).offset(skip).limit(limit).all()
+    async def get_chat_logs_by_workflow(self, db: AsyncSession, workflow_id: int, skip: int = 0, limit: int = 100):
+        result = await db.execute(
+            select(models.chat.ChatLog).where(models.chat.ChatLog.workflow_id == workflow_id).offset(skip).limit(limit)
+        )
+        return result.scalars().all()
 
-    def create_chat_log(self, db: Session, chat_log: chat_schema.ChatLogCreate): # Corrected usage
+    async def get_chat_log_page(
+        self,
+        db: AsyncSession,
+        workflow_id: int,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        order: str = NEWEST_FIRST,
+    ):
+        """
+        Returns (chat_logs, next_cursor) for one page of a workflow's history,
+        seeking on (workflow_id, created_at, id) instead of skipping rows.
+        """
+        ChatLog = models.chat.ChatLog
+        stmt = keyset_select(
+            select(ChatLog).where(ChatLog.workflow_id == workflow_id),
+            ChatLog.created_at, ChatLog.id, limit, cursor, order,
+        )
+        result = await db.execute(stmt)
+        return keyset_result(result.scalars(), ChatLog.created_at, ChatLog.id, limit)
+
+    async def create_chat_log(self, db: AsyncSession, chat_log: chat_schema.ChatLogCreate): # Corrected usage
         db_chat_log = models.chat.ChatLog(**chat_log.dict())
         db.add(db_chat_log)
-        db.commit()
-        db.refresh(db_chat_log)
+        with timed("db_commit"):
+            await db.commit()
+        await db.refresh(db_chat_log)
         return db_chat_log
 
+    def create_chat_logs(self, db: Session, records: List[dict]):
+        """
+        Inserts many chat log rows (workflow_id, sender, message, created_at)
+        in one statement and commits once. Runs on the write-behind thread,
+        hence the sync session.
+        """
+        if not records:
+            return
+        with timed("db_commit"):
+            db.execute(insert(models.chat.ChatLog), records)
+            db.commit()
+
 chat_service = ChatService()
@@ -1,59 +1,198 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, load_only, undefer
 from .. import models, schemas
+from ..core.config import settings
 from ..core.embeddings import embedding_client
-from ..core.chroma import chroma_client
-from ..utils.pdf_parser import parse_pdf
+from ..core.vector_store import vector_store
+from ..core.lexical_index import lexical_index
+from ..core.metrics import timed
+from ..core.tracing import span, traced
+from ..utils.pagination import NEWEST_FIRST, keyset_result, keyset_select
+from ..utils.pdf_parser import page_count, parse_pdfs, stream_pages
+from ..utils.text_chunker import batched, chunk_pages
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import asyncio
 import os
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def _no_progress(**fields):
+    pass
+
+
 class DocumentService:
     """
     Service for handling document-related operations.
+    Lookups used by request handlers are async; ingestion runs on worker
+    threads and uses sync sessions.
     """
-    def get_document(self, db: Session, document_id: int):
-        return db.query(models.document.Document).filter(models.document.Document.id == document_id).first()
+    async def get_document(self, db: AsyncSession, document_id: int, include_content: bool = True):
+        Document = models.document.Document
+        stmt = select(Document).where(Document.id == document_id)
+        if include_content:
+            stmt = stmt.options(undefer(Document.content_text), undefer(Document.content_compressed))
+        result = await db.execute(stmt)
+        return result.scalars().first()
+
+    async def get_document_content(self, db: AsyncSession, document_id: int) -> Optional[str]:
+        """
+        Returns only the extracted text of a document, or None if it does not exist.
+        """
+        Document = models.document.Document
+        result = await db.execute(
+            select(Document.content_text, Document.content_compressed).where(Document.id == document_id)
+        )
+        row = result.first()
+        if row is None:
+            return None
+        return Document.decode_content(*row) or ""
+
+    async def get_documents(self, db: AsyncSession, skip: int = 0, limit: int = 100):
+        """
+        Lists document summaries; the content columns are never loaded.
+        """
+        Document = models.document.Document
+        result = await db.execute(
+            select(Document).options(load_only(*self._summary_columns())).offset(skip).limit(limit)
+        )
+        return result.scalars().all()
+
+    async def get_document_page(
+        self,
+        db: AsyncSession,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        order: str = NEWEST_FIRST,
+    ):
+        """
+        Returns (document summaries, next_cursor) for one page, seeking on
+        (created_at, id) instead of skipping rows.
+        """
+        Document = models.document.Document
+        stmt = keyset_select(
+            select(Document).options(load_only(*self._summary_columns())),
+            Document.created_at, Document.id, limit, cursor, order,
+        )
+        result = await db.execute(stmt)
+        return keyset_result(result.scalars(), Document.created_at, Document.id, limit)
+
+    def _summary_columns(self):
+        Document = models.document.Document
+        return (Document.id, Document.filename, Document.size, Document.page_count, Document.created_at)
+
+    async def get_document_by_hash(self, db: AsyncSession, content_hash: str):
+        Document = models.document.Document
+        result = await db.execute(
+            select(Document)
+            .options(load_only(*self._summary_columns()))
+            .where(Document.content_hash == content_hash)
+            .order_by(Document.id)
+            .limit(1)
+        )
+        return result.scalars().first()
 
-    def get_documents(self, db: Session, skip: int = 0, limit: int = 100):
-        return db.query(models.document.Document).offset(skip).limit(limit).all()
+    async def delete_document(self, db: AsyncSession, document_id: int):
+        """
+        Deletes a document row and its chunks from the vector store and the
+        lexical index. Returns the deleted document, or None if it did not exist.
+        """
+        db_document = await self.get_document(db, document_id, include_content=False)
+        if db_document is None:
+            return None
+        await db.delete(db_document)
+        with timed("db_commit"):
+            await db.commit()
+        await asyncio.to_thread(self.remove_from_indexes, document_id)
+        return db_document
+
+    def remove_from_indexes(self, document_id: int):
+        try:
+            lexical_index.remove_document(document_id)
+        except Exception as e:
+            logger.error(f"Error removing document {document_id} from the lexical index: {e}")
+        try:
+            if vector_store and vector_store.is_connected():
+                collection = vector_store.collection("documents")
+                collection.delete(where={"doc_id": document_id})
+        except Exception as e:
+            logger.error(f"Error removing document {document_id} from the vector store: {e}")
 
-    def create_document(self, db: Session, file_path: str, filename: str):
+    def get_document_ids_by_hash(self, db: Session, content_hashes: Iterable[str]) -> Dict[str, int]:
+        """
+        Maps each already-ingested hash among `content_hashes` to its document id.
+        """
+        hashes = {h for h in content_hashes if h}
+        if not hashes:
+            return {}
+        Document = models.document.Document
+        rows = (
+            db.query(Document.content_hash, Document.id)
+            .filter(Document.content_hash.in_(hashes))
+            .order_by(Document.id.desc())
+            .all()
+        )
+        # Descending order leaves the oldest id per hash in the dict
+        return {content_hash: doc_id for content_hash, doc_id in rows}
+
+    @traced("document.create")
+    def create_document(
+        self,
+        db: Session,
+        file_path: str,
+        filename: str,
+        progress: Optional[Callable[..., None]] = None,
+        content_hash: Optional[str] = None,
+    ):
         """
         Processes a document, stores its content and embeddings.
+        `progress`, if given, is called with keyword updates (stage, total_pages,
+        pages_parsed, chunks_embedded) as ingestion advances. If a document with
+        the same `content_hash` already exists it is returned instead.
         """
+        report = progress or _no_progress
         try:
-            # 1. Parse the PDF
-            content = parse_pdf(file_path)
+            if content_hash:
+                # An identical upload may have been ingested while this one was queued
+                existing_id = self.get_document_ids_by_hash(db, [content_hash]).get(content_hash)
+                if existing_id is not None:
+                    logger.info(f"Document {filename} duplicates document {existing_id}, skipping ingestion")
+                    report(deduplicated=True)
+                    if os.path.exists(file_path):
+                        os.remove(file_path)
+                    return db.get(models.document.Document, existing_id)
+
+            # 1. Parse the PDF page by page
+            report(stage="parsing", total_pages=page_count(file_path))
+            pages = []
+            with span("document.parse", filename=filename) as parse_span, timed("pdf_parse"):
+                for page in stream_pages(file_path):
+                    pages.append(page.text)
+                    report(pages_parsed=page.page_number)
+                parse_span.set(pages=len(pages))
+            content = "".join(pages)
 
             # 2. Store document metadata in PostgreSQL
-            db_document = models.document.Document(filename=filename, content=content)
+            report(stage="storing")
+            db_document = models.document.Document(
+                filename=filename,
+                content=content,
+                content_hash=content_hash,
+                size=os.path.getsize(file_path),
+                page_count=len(pages),
+            )
             db.add(db_document)
-            db.commit()
+            with timed("db_commit"):
+                db.commit()
             db.refresh(db_document)
 
-            # 3. Generate embeddings (only if embedding client is available)
+            # 3. Chunk, embed and store in the vector store (only if available)
             try:
-                if embedding_client:
-                    openai_embedding = embedding_client.get_openai_embedding(content)
-                    
-                    # 4. Store in ChromaDB (only if available)
-                    if chroma_client and chroma_client.is_connected():
-                        collection = chroma_client.get_or_create_collection(name="documents")
-                        if collection:
-                            collection.add(
-                                embeddings=[openai_embedding],
-                                documents=[content],
-                                metadatas=[{"filename": filename, "source": "openai", "doc_id": db_document.id}],
-                                ids=[str(db_document.id)]
-                            )
-                            logger.info(f"Document {filename} stored in ChromaDB successfully")
-                        else:
-                            logger.warning("ChromaDB collection not available, skipping vector storage")
-                    else:
-                        logger.warning("ChromaDB not available, skipping vector storage")
-                else:
-                    logger.warning("Embedding client not available, skipping vector storage")
+                report(stage="embedding")
+                stored = self.index_document(db_document.id, filename, pages, progress=report)
+                logger.info(f"Document {filename} stored in the vector store as {stored} chunks")
             except Exception as e:
                 logger.error(f"Error processing embeddings or vector storage: {e}")
                 # Continue without vector storage - document is still saved in PostgreSQL
@@ -71,4 +210,200 @@ class DocumentService:
                 os.remove(file_path)
             raise e
 
+    def index_document(
+        self,
+        doc_id: int,
+        filename: str,
+        pages: List[str],
+        progress: Optional[Callable[..., None]] = None,
+    ) -> int:
+        """
+        Splits the pages into overlapping chunks, embeds them in batches and adds
+        them to the vector store in bounded batches. Returns the number of chunks stored.
+        """
+        return self.index_documents([(doc_id, filename, pages)], progress=progress).get(doc_id, 0)
+
+    @traced("document.index")
+    def index_documents(
+        self,
+        documents: Iterable[Tuple[int, str, List[str]]],
+        progress: Optional[Callable[..., None]] = None,
+    ) -> Dict[int, int]:
+        """
+        Indexes several (doc_id, filename, pages) documents, sharing embedding and
+        collection.add batches across document boundaries. Returns the number of
+        chunks stored per doc_id.
+        """
+        report = progress or _no_progress
+        if not embedding_client:
+            logger.warning("Embedding client not available, skipping vector storage")
+            return {}
+        if not (vector_store and vector_store.is_connected()):
+            logger.warning("Vector store not available, skipping vector storage")
+            return {}
+        collection = vector_store.collection("documents")
+        if not collection:
+            logger.warning("Vector store collection not available, skipping vector storage")
+            return {}
+
+        chunks = (
+            (doc_id, filename, chunk)
+            for doc_id, filename, pages in documents
+            for chunk in chunk_pages(pages, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+        )
+        pending = {"ids": [], "embeddings": [], "documents": [], "metadatas": []}
+        stored: Dict[int, int] = {}
+        embedded = 0
+
+        for batch in batched(chunks, settings.EMBEDDING_BATCH_SIZE):
+            embeddings = embedding_client.embed_batch([chunk.text for _, _, chunk in batch])
+            if embeddings is None:
+                logger.warning("Embeddings unavailable, stopping vector storage")
+                break
+            embedded += len(batch)
+            report(chunks_embedded=embedded)
+
+            for (doc_id, filename, chunk), embedding in zip(batch, embeddings):
+                pending["ids"].append(f"{doc_id}:{chunk.index}")
+                pending["embeddings"].append(embedding)
+                pending["documents"].append(chunk.text)
+                pending["metadatas"].append({
+                    "doc_id": doc_id,
+                    "filename": filename,
+                    "chunk_index": chunk.index,
+                    "page_start": chunk.page_start,
+                    "page_end": chunk.page_end,
+                    "char_start": chunk.char_start,
+                    "char_end": chunk.char_end,
+                })
+
+            while len(pending["ids"]) >= settings.VECTOR_INSERT_BATCH_SIZE:
+                self._flush_vectors(collection, pending, settings.VECTOR_INSERT_BATCH_SIZE, stored)
+
+        while pending["ids"]:
+            self._flush_vectors(collection, pending, settings.VECTOR_INSERT_BATCH_SIZE, stored)
+        return stored
+
+    @traced("document.create_bulk")
+    def create_documents_bulk(self, db: Session, files: List[Tuple[str, str, str]]) -> List[dict]:
+        """
+        Ingests many (file_path, filename, content_hash) uploads. Files whose hash
+        is already stored (or repeated within the request) are reported as
+        duplicates without being parsed. The rest are parsed in parallel,
+        Document rows are committed once per BULK_COMMIT_BATCH_SIZE files and
+        vectors are inserted in shared batches. Returns one manifest entry per file.
+        The caller owns (and removes) the files.
+        """
+        manifest = []
+        seen: Dict[str, Optional[int]] = {}  # hash -> document id, None while pending
+        waiting: Dict[str, List[dict]] = {}  # manifest entries for repeats of a pending hash
+        for batch in batched(files, settings.BULK_COMMIT_BATCH_SIZE):
+            seen.update(self.get_document_ids_by_hash(db, (h for _, _, h in batch if h not in seen)))
+
+            fresh = []
+            for file_path, filename, content_hash in batch:
+                if content_hash in seen:
+                    entry = {"filename": filename, "status": "duplicate", "document_id": seen[content_hash]}
+                    if entry["document_id"] is None:
+                        waiting.setdefault(content_hash, []).append(entry)
+                    manifest.append(entry)
+                    continue
+                seen[content_hash] = None
+                fresh.append((file_path, filename, content_hash))
+            if not fresh:
+                continue
+
+            with span("document.parse_batch", files=len(fresh)), timed("pdf_parse_batch"):
+                parsed = parse_pdfs([file_path for file_path, _, _ in fresh])
+
+            rows = []
+            for (file_path, filename, content_hash), result in zip(fresh, parsed):
+                if isinstance(result, Exception):
+                    self._resolve_duplicates(seen, waiting, content_hash, None, str(result))
+                    manifest.append({"filename": filename, "status": "failed", "error": str(result)})
+                    continue
+                db_document = models.document.Document(
+                    filename=filename,
+                    content="".join(result),
+                    content_hash=content_hash,
+                    size=os.path.getsize(file_path),
+                    page_count=len(result),
+                )
+                rows.append((db_document, filename, result))
+
+            if not rows:
+                continue
+            try:
+                db.add_all([db_document for db_document, _, _ in rows])
+                db.flush()
+                doc_ids = [db_document.id for db_document, _, _ in rows]
+                with timed("db_commit"):
+                    db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Error storing bulk batch: {e}")
+                for db_document, _, _ in rows:
+                    self._resolve_duplicates(seen, waiting, db_document.content_hash, None, str(e))
+                manifest.extend(
+                    {"filename": filename, "status": "failed", "error": str(e)}
+                    for _, filename, _ in rows
+                )
+                continue
+
+            try:
+                chunk_counts = self.index_documents(
+                    (doc_id, filename, pages)
+                    for doc_id, (_, filename, pages) in zip(doc_ids, rows)
+                )
+            except Exception as e:
+                logger.error(f"Error processing embeddings or vector storage: {e}")
+                chunk_counts = {}
+
+            for doc_id, (db_document, filename, pages) in zip(doc_ids, rows):
+                self._resolve_duplicates(seen, waiting, db_document.content_hash, doc_id)
+                manifest.append({
+                    "filename": filename,
+                    "status": "created",
+                    "document_id": doc_id,
+                    "pages": len(pages),
+                    "chunks": chunk_counts.get(doc_id, 0),
+                })
+        return manifest
+
+    def _resolve_duplicates(
+        self,
+        seen: Dict[str, Optional[int]],
+        waiting: Dict[str, List[dict]],
+        content_hash: str,
+        doc_id: Optional[int],
+        error: Optional[str] = None,
+    ):
+        """
+        Settles a pending hash in a bulk upload: repeats of it get the stored
+        document id, or fail along with the original.
+        """
+        if doc_id is None:
+            seen.pop(content_hash, None)
+        else:
+            seen[content_hash] = doc_id
+        for entry in waiting.pop(content_hash, []):
+            if doc_id is None:
+                entry.update(status="failed", document_id=None, error=error)
+            else:
+                entry["document_id"] = doc_id
+
+    def _flush_vectors(self, collection, pending: dict, limit: int, stored: Dict[int, int]):
+        """
+        Adds up to `limit` pending records to the collection and the lexical
+        index, drops them from `pending` and counts them per doc_id in `stored`.
+        """
+        count = min(limit, len(pending["ids"]))
+        with span("document.vector_insert", chunks=count), timed("vector_insert"):
+            collection.add(**{key: values[:count] for key, values in pending.items()})
+        lexical_index.add(pending["ids"][:count], pending["documents"][:count], pending["metadatas"][:count])
+        for metadata in pending["metadatas"][:count]:
+            stored[metadata["doc_id"]] = stored.get(metadata["doc_id"], 0) + 1
+        for values in pending.values():
+            del values[:count]
+
 document_service = DocumentService()
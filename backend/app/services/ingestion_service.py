@@ -0,0 +1,166 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Optional
+import logging
+import os
+import threading
+import uuid
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..core.metrics import registry, tracking
+from .document_service import document_service
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the ingestion queue has no free slots."""
+
+
+class IngestionJob:
+    """
+    In-memory status of a background document ingestion.
+    """
+
+    def __init__(self, filename: str):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.status = "queued"  # queued | running | completed | failed
+        self.stage = "queued"  # queued | parsing | storing | embedding | done
+        self.total_pages = None
+        self.pages_parsed = 0
+        self.chunks_embedded = 0
+        self.document_id = None
+        self.deduplicated = False  # True when an identical upload was already stored
+        self.error = None
+        self.created_at = datetime.now(timezone.utc)
+        self.updated_at = self.created_at
+        self._lock = threading.Lock()
+
+    def update(self, **fields):
+        with self._lock:
+            for key, value in fields.items():
+                setattr(self, key, value)
+            self.updated_at = datetime.now(timezone.utc)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "id": self.id,
+                "filename": self.filename,
+                "status": self.status,
+                "stage": self.stage,
+                "total_pages": self.total_pages,
+                "pages_parsed": self.pages_parsed,
+                "chunks_embedded": self.chunks_embedded,
+                "document_id": self.document_id,
+                "deduplicated": self.deduplicated,
+                "error": self.error,
+                "created_at": self.created_at,
+                "updated_at": self.updated_at,
+            }
+
+
+class IngestionService:
+    """
+    Runs document ingestion on a bounded worker pool so uploads can return
+    immediately. Submissions beyond the worker count plus queue size are
+    rejected with QueueFullError instead of piling up.
+    """
+
+    def __init__(self, max_workers: int = 2, max_queue: int = 32, history: int = 1000):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ingestion"
+        )
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._history = history
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, file_path: str, filename: str, content_hash: Optional[str] = None) -> IngestionJob:
+        """
+        Queues a stored upload for ingestion. The worker removes the file when done.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise QueueFullError("Ingestion queue is full, retry later")
+
+        job = self._track(IngestionJob(filename))
+        try:
+            self._executor.submit(self._run, job, file_path, content_hash)
+        except Exception:
+            self._slots.release()
+            job.update(status="failed", error="Ingestion service is shutting down")
+            raise
+        return job
+
+    def record_duplicate(self, filename: str, document_id: int) -> IngestionJob:
+        """
+        Records an upload that matched an existing document as an already
+        completed job, so clients can poll it like any other.
+        """
+        job = IngestionJob(filename)
+        job.update(status="completed", stage="done", document_id=document_id, deduplicated=True)
+        return self._track(job)
+
+    def _track(self, job: IngestionJob) -> IngestionJob:
+        with self._lock:
+            self._jobs[job.id] = job
+            # Forget the oldest finished jobs once history is full
+            while len(self._jobs) > self._history:
+                oldest_id, oldest = next(iter(self._jobs.items()))
+                if oldest.status in ("queued", "running"):
+                    break
+                del self._jobs[oldest_id]
+        return job
+
+    def _run(self, job: IngestionJob, file_path: str, content_hash: Optional[str] = None):
+        job.update(status="running")
+        db = None
+        try:
+            if SessionLocal is None:
+                raise RuntimeError("Database connection not available")
+            db = SessionLocal()
+            with tracking("ingestion"):
+                document = document_service.create_document(
+                    db, file_path, job.filename, progress=job.update, content_hash=content_hash
+                )
+            job.update(status="completed", stage="done", document_id=document.id)
+        except Exception as e:
+            logger.error(f"Ingestion job {job.id} for {job.filename} failed: {e}")
+            job.update(status="failed", error=str(e))
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        finally:
+            if db is not None:
+                db.close()
+            self._slots.release()
+
+    def job_counts(self) -> dict:
+        """Number of tracked jobs per status."""
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        counts = dict.fromkeys(("queued", "running", "completed", "failed"), 0)
+        for status in statuses:
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def get_job(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+ingestion_service = IngestionService(
+    max_workers=settings.INGESTION_WORKERS,
+    max_queue=settings.INGESTION_QUEUE_SIZE,
+    history=settings.INGESTION_JOB_HISTORY,
+)
+registry.callback_gauge(
+    "ingestion_jobs",
+    "Tracked ingestion jobs by status.",
+    ("status",),
+    lambda: {(status,): count for status, count in ingestion_service.job_counts().items()},
+)
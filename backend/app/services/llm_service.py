@@ -1,7 +1,46 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import AsyncIterator, List, Optional, Tuple
+from ..core.config import settings
 from ..core.llm_client import mistral_client, get_mistral_response
+from ..core.metrics import record_tokens, retrieval_abandoned, timed
+from ..core.tracing import bind, span
 from ..core.search_client import search_client
-from ..core.chroma import chroma_client
-from ..core.embeddings import embedding_client
+from ..core.response_cache import response_cache
+from ..utils.context_packer import context_window, pack_context
+from ..utils.tokenizer import count_tokens
+from .retrieval_service import check_deadline, retrieval_service
+
+SUPPORTED_PROVIDERS = ("mistral", "openai", "gemini")
+
+# Use a short system prompt to reduce hallucination and encourage concise answers
+SYSTEM_PROMPT = (
+    "You are a helpful assistant. Answer concisely and only with information "
+    "that is supported by the provided context. If unsure, say 'I don't know'."
+)
+
+INVALID_PROVIDER_MESSAGE = "Invalid LLM provider selected. Use 'mistral'."
+
+logger = logging.getLogger(__name__)
+
+# Shared by all requests; retrieval stages are I/O bound. Stages check their
+# deadline between steps, so work abandoned at the budget holds a worker for at
+# most one step (one vector/lexical query or one SerpAPI call) past it.
+_retrieval_pool = ThreadPoolExecutor(
+    max_workers=settings.RETRIEVAL_MAX_WORKERS, thread_name_prefix="retrieval"
+)
+
+
+@dataclass
+class RetrievalResult:
+    """Context gathered for a query, plus the stages that missed their budget or failed."""
+
+    documents: List[str] = field(default_factory=list)
+    search_results: List[dict] = field(default_factory=list)
+    degraded: List[str] = field(default_factory=list)
 
 
 class LLMService:
@@ -9,60 +48,377 @@ class LLMService:
     Service for orchestrating LLM interactions, including context retrieval and web search.
     """
 
-    def generate_response(
+    def __init__(self, cache=response_cache):
+        # Exact-match completion cache; set to None to disable caching entirely
+        self.response_cache = cache
+
+    def _cache_key(self, prompt: str, **params):
+        if self.response_cache is None:
+            return None
+        return self.response_cache.make_key(
+            user_prompt=prompt, system_prompt=SYSTEM_PROMPT, **params
+        )
+
+    def complete(
+        self,
+        prompt: str,
+        use_cache: bool = True,
+        workflow_id: Optional[int] = None,
+        prompt_tokens: Optional[int] = None,
+        **params,
+    ) -> str:
+        """
+        Calls the LLM with the shared system prompt, serving repeats from the cache.
+        Tokens of uncached calls are counted against `workflow_id`;
+        `prompt_tokens` saves recounting when the caller already knows it.
+        """
+        with span("llm.complete", model=params.get("model"), prompt_tokens=prompt_tokens) as llm_span:
+            key = self._cache_key(prompt, **params) if use_cache else None
+            if key is not None:
+                cached = self.response_cache.get(key)
+                if cached is not None:
+                    llm_span.set(cached=True)
+                    return cached
+
+            response = mistral_client.generate(
+                user_prompt=prompt, system_prompt=SYSTEM_PROMPT, **params
+            )
+            llm_span.set(cached=False)
+            self._record_tokens(workflow_id, params.get("model"), prompt, prompt_tokens, response)
+            if key is not None:
+                self.response_cache.set(key, response)
+            return response
+
+    async def acomplete(
+        self,
+        prompt: str,
+        use_cache: bool = True,
+        workflow_id: Optional[int] = None,
+        prompt_tokens: Optional[int] = None,
+        **params,
+    ) -> str:
+        """Async variant of `complete` that awaits the LLM without holding a thread."""
+        with span("llm.complete", model=params.get("model"), prompt_tokens=prompt_tokens) as llm_span:
+            key = self._cache_key(prompt, **params) if use_cache else None
+            if key is not None:
+                cached = self.response_cache.get(key)
+                if cached is not None:
+                    llm_span.set(cached=True)
+                    return cached
+
+            response = await mistral_client.agenerate(
+                user_prompt=prompt, system_prompt=SYSTEM_PROMPT, **params
+            )
+            llm_span.set(cached=False)
+            self._record_tokens(workflow_id, params.get("model"), prompt, prompt_tokens, response)
+            if key is not None:
+                self.response_cache.set(key, response)
+            return response
+
+    def _record_tokens(
+        self,
+        workflow_id: Optional[int],
+        model: Optional[str],
+        prompt: str,
+        prompt_tokens: Optional[int],
+        response: str,
+    ):
+        if prompt_tokens is None:
+            prompt_tokens = count_tokens(SYSTEM_PROMPT, settings.TOKENIZER_MODEL) + count_tokens(
+                prompt, settings.TOKENIZER_MODEL
+            )
+        record_tokens(
+            workflow_id,
+            model or settings.LLM_MODEL,
+            prompt_tokens,
+            count_tokens(response, settings.TOKENIZER_MODEL),
+        )
+
+    def query_knowledge_base(
+        self, query: str, n_results: int = 2, mode: Optional[str] = None, deadline: Optional[float] = None
+    ) -> List[str]:
+        """
+        Returns the text of the knowledge base chunks most relevant to the query,
+        retrieved by vector, lexical or hybrid search (see RetrievalService).
+        """
+        with span("llm.query_knowledge_base", n_results=n_results, mode=mode) as kb_span:
+            chunks = retrieval_service.search(query, n_results, mode, deadline=deadline)
+            kb_span.set(chunks=len(chunks))
+        return [chunk.text for chunk in chunks]
+
+    def search_web(self, query: str, n_results: int = 3, deadline: Optional[float] = None) -> List[dict]:
+        """
+        Returns the top web search results for the query.
+        """
+        # A stage that waited in the pool past its deadline gives its worker straight back
+        check_deadline(deadline, "web search")
+        with span("llm.search_web", n_results=n_results) as search_span, timed("web_search"):
+            search_results = search_client.search_serpapi(query)
+            search_span.set(results=len(search_results or []))
+        return list(search_results[:n_results]) if search_results else []
+
+    def retrieve_context(
         self,
         query: str,
-        llm_provider: str = "openai",
         use_knowledge_base: bool = False,
         use_search: bool = False,
-    ):
+        budget_seconds: Optional[float] = None,
+        retrieval_mode: Optional[str] = None,
+    ) -> RetrievalResult:
         """
-        Generates a response by orchestrating different components.
+        Runs knowledge base retrieval and web search concurrently under one
+        latency budget. A stage that misses the deadline or fails is skipped and
+        recorded in `degraded` so the answer can proceed with what arrived.
         """
-        context = ""
-        prompt = query
+        budget = settings.RETRIEVAL_BUDGET_SECONDS if budget_seconds is None else budget_seconds
+        result = RetrievalResult()
 
-        # 1. Retrieve context from KnowledgeBase if enabled
+        deadline = time.monotonic() + max(0.0, budget)
+        stages = {}
         if use_knowledge_base:
-            query_embedding = embedding_client.get_openai_embedding(query)
-            collection = chroma_client.get_or_create_collection(name="documents")
-            results = collection.query(query_embeddings=[query_embedding], n_results=2)
-            if results and results["documents"]:
-                context += "\n\n--- Knowledge Base Context ---\n"
-                for doc in results["documents"][0]:
-                    context += doc + "\n"
-
-        # 2. Perform web search if enabled
+            stages["knowledge_base"] = _retrieval_pool.submit(
+                bind(self.query_knowledge_base), query, mode=retrieval_mode, deadline=deadline
+            )
         if use_search:
-            search_results = search_client.search_serpapi(query)
-            if search_results:
-                context += "\n\n--- Web Search Results ---\n"
-                for result in search_results[:3]:  # Use top 3 results
-                    context += f"Title: {result.get('title')}\nSnippet: {result.get('snippet')}\n\n"
+            stages["web_search"] = _retrieval_pool.submit(bind(self.search_web), query, deadline=deadline)
+        if not stages:
+            return result
+
+        wait(list(stages.values()), timeout=max(0.0, budget))
+        for name, future in stages.items():
+            if not future.done():
+                # A running stage stops at its next deadline check; its late result is discarded
+                if not future.cancel():
+                    retrieval_abandoned.labels(name).inc()
+                result.degraded.append(f"{name} missed the {budget:.2f}s retrieval budget")
+                continue
+            try:
+                value = future.result()
+            except Exception as e:
+                result.degraded.append(f"{name} failed: {e}")
+                continue
+            if name == "knowledge_base":
+                result.documents = value
+            else:
+                result.search_results = value
 
-        # 3. Construct the final prompt
+        if result.degraded:
+            logger.warning(f"Retrieval degraded for query: {'; '.join(result.degraded)}")
+        return result
+
+    def build_prompt(self, query: str, context: str) -> str:
         if context:
-            prompt = f"Based on the following context, please answer the query.\n\nContext:{context}\n\nQuery: {query}"
-
-        # 4. Get response from the selected LLM (Mistral is the default and only supported provider now)
-        if llm_provider in ("mistral", "openai", "gemini"):
-            # Use a short system prompt to reduce hallucination and encourage concise answers
-            system_prompt = (
-                "You are a helpful assistant. Answer concisely and only with information "
-                "that is supported by the provided context. If unsure, say 'I don't know'."
-            )
-            # Lower temperature and cap tokens to minimize hallucinations
-            response = mistral_client.generate(
-                user_prompt=prompt,
-                system_prompt=system_prompt,
-                model="mistral-small",
-                temperature=0.1,
-                max_tokens=256,
+            return f"Based on the following context, please answer the query.\n\nContext:{context}\n\nQuery: {query}"
+        return query
+
+    def prepare_prompt(
+        self,
+        query: str,
+        documents: List[str],
+        search_results: List[dict],
+        max_tokens: Optional[int] = None,
+    ) -> Tuple[str, dict, dict]:
+        """
+        Packs the retrieved context into the model's token budget and builds
+        the prompt. The budget is the context window minus the system prompt,
+        the query and the tokens reserved for the answer, capped at
+        CONTEXT_MAX_TOKENS. Returns (prompt, generation params, token usage).
+        """
+        params = {
+            "model": settings.LLM_MODEL,
+            "temperature": settings.LLM_TEMPERATURE,
+            "max_tokens": int(max_tokens or settings.LLM_MAX_TOKENS),
+        }
+        fixed = count_tokens(SYSTEM_PROMPT, settings.TOKENIZER_MODEL) + count_tokens(
+            self.build_prompt(query, " "), settings.TOKENIZER_MODEL
+        )
+        window = context_window(params["model"]) - params["max_tokens"] - fixed
+        packed = pack_context(documents, search_results, min(settings.CONTEXT_MAX_TOKENS, window))
+
+        prompt = self.build_prompt(query, packed.text)
+        prompt_tokens = count_tokens(SYSTEM_PROMPT, settings.TOKENIZER_MODEL) + count_tokens(
+            prompt, settings.TOKENIZER_MODEL
+        )
+        usage = packed.usage(prompt_tokens, params["max_tokens"])
+        if packed.truncated or packed.dropped:
+            logger.info(
+                f"Context packed into {packed.context_tokens}/{packed.budget} tokens "
+                f"({packed.truncated} truncated, {packed.dropped} dropped)"
             )
-        else:
-            return "Invalid LLM provider selected. Use 'mistral'."
+        return prompt, params, usage
+
+    def generate_response(
+        self,
+        query: str,
+        llm_provider: str = "openai",
+        use_knowledge_base: bool = False,
+        use_search: bool = False,
+        use_cache: bool = True,
+        retrieval_budget: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ):
+        """
+        Generates a response by orchestrating different components.
+        """
+        if llm_provider not in SUPPORTED_PROVIDERS:
+            return INVALID_PROVIDER_MESSAGE
+
+        # 1./2. Retrieve knowledge base context and web results concurrently
+        retrieved = self.retrieve_context(
+            query, use_knowledge_base, use_search, budget_seconds=retrieval_budget
+        )
+
+        # 3. Construct the final prompt and get the response
+        return self.answer(
+            query, retrieved.documents, retrieved.search_results, llm_provider, use_cache, max_tokens
+        )
+
+    def answer(
+        self,
+        query: str,
+        documents: List[str],
+        search_results: List[dict],
+        llm_provider: str = "openai",
+        use_cache: bool = True,
+        max_tokens: Optional[int] = None,
+        workflow_id: Optional[int] = None,
+    ) -> str:
+        """
+        Answers the query from already retrieved context.
+        """
+        return self.answer_with_usage(
+            query, documents, search_results, llm_provider, use_cache, max_tokens, workflow_id
+        )[0]
+
+    def answer_with_usage(
+        self,
+        query: str,
+        documents: List[str],
+        search_results: List[dict],
+        llm_provider: str = "openai",
+        use_cache: bool = True,
+        max_tokens: Optional[int] = None,
+        workflow_id: Optional[int] = None,
+    ) -> Tuple[str, Optional[dict]]:
+        """
+        Like answer, but also returns the prompt's token usage (None when the
+        provider is invalid).
+        """
+        if llm_provider not in SUPPORTED_PROVIDERS:
+            return INVALID_PROVIDER_MESSAGE, None
+
+        with span("llm.prepare_prompt", provider=llm_provider) as prompt_span:
+            prompt, params, usage = self.prepare_prompt(query, documents, search_results, max_tokens)
+            prompt_span.set(**usage)
+
+        # Get response from the selected LLM (Mistral is the default and only supported provider now)
+        response = self.complete(
+            prompt,
+            use_cache=use_cache,
+            workflow_id=workflow_id,
+            prompt_tokens=usage["prompt_tokens"],
+            **params,
+        )
+        return response, usage
+
+    async def aanswer_with_usage(
+        self,
+        query: str,
+        documents: List[str],
+        search_results: List[dict],
+        llm_provider: str = "openai",
+        use_cache: bool = True,
+        max_tokens: Optional[int] = None,
+        workflow_id: Optional[int] = None,
+    ) -> Tuple[str, Optional[dict]]:
+        """Async variant of `answer_with_usage`."""
+        if llm_provider not in SUPPORTED_PROVIDERS:
+            return INVALID_PROVIDER_MESSAGE, None
+
+        with span("llm.prepare_prompt", provider=llm_provider) as prompt_span:
+            prompt, params, usage = self.prepare_prompt(query, documents, search_results, max_tokens)
+            prompt_span.set(**usage)
+
+        response = await self.acomplete(
+            prompt,
+            use_cache=use_cache,
+            workflow_id=workflow_id,
+            prompt_tokens=usage["prompt_tokens"],
+            **params,
+        )
+        return response, usage
+
+    async def stream_response(
+        self,
+        query: str,
+        llm_provider: str = "openai",
+        use_knowledge_base: bool = False,
+        use_search: bool = False,
+        use_cache: bool = True,
+        documents: Optional[List[str]] = None,
+        search_results: Optional[List[dict]] = None,
+        retrieval_budget: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        workflow_id: Optional[int] = None,
+    ) -> AsyncIterator[dict]:
+        """
+        Streaming variant of generate_response. Yields events as dicts with
+        "event" and "data" keys: "retrieval" and "search" when those stages
+        finish, "token" for every content delta and "final" with the full
+        response and the prompt's token usage (or "error" if generation
+        failed). A cached answer is sent as a single token event. Context
+        already retrieved by the caller can be passed in via `documents` /
+        `search_results`, skipping those stages.
+        """
+        if llm_provider not in SUPPORTED_PROVIDERS:
+            yield {"event": "error", "data": {"detail": INVALID_PROVIDER_MESSAGE}}
+            return
+
+        try:
+            use_knowledge_base = use_knowledge_base and documents is None
+            use_search = use_search and search_results is None
+            if use_knowledge_base or use_search:
+                # Retrieval and search are blocking; keep them off the event loop
+                retrieved = await asyncio.to_thread(
+                    self.retrieve_context, query, use_knowledge_base, use_search, retrieval_budget
+                )
+                if use_knowledge_base:
+                    documents = retrieved.documents
+                    yield {"event": "retrieval", "data": {"documents": len(documents)}}
+                if use_search:
+                    search_results = retrieved.search_results
+                    yield {"event": "search", "data": {"results": len(search_results)}}
+                if retrieved.degraded:
+                    yield {"event": "degraded", "data": {"errors": retrieved.degraded}}
+            documents = documents or []
+            search_results = search_results or []
+
+            with span("llm.prepare_prompt", provider=llm_provider) as prompt_span:
+                prompt, params, usage = self.prepare_prompt(query, documents, search_results, max_tokens)
+                prompt_span.set(**usage)
+
+            key = self._cache_key(prompt, **params) if use_cache else None
+            cached = self.response_cache.get(key) if key is not None else None
+            if cached is not None:
+                yield {"event": "token", "data": {"delta": cached}}
+                yield {"event": "final", "data": {"response": cached, "cached": True, "usage": usage}}
+                return
+
+            parts = []
+            async for delta in mistral_client.astream(
+                user_prompt=prompt, system_prompt=SYSTEM_PROMPT, **params
+            ):
+                parts.append(delta)
+                yield {"event": "token", "data": {"delta": delta}}
+        except Exception as e:
+            yield {"event": "error", "data": {"detail": str(e)}}
+            return
 
-        return response
+        response = "".join(parts)
+        self._record_tokens(workflow_id, params["model"], prompt, usage["prompt_tokens"], response)
+        if key is not None:
+            self.response_cache.set(key, response)
+        yield {"event": "final", "data": {"response": response, "cached": False, "usage": usage}}
 
 
 llm_service = LLMService()
@@ -0,0 +1,191 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import logging
+import threading
+import time
+from ..core.config import settings
+from ..core.vector_store import vector_store
+from ..core.embeddings import embedding_client
+from ..core.lexical_index import lexical_index
+from ..core.metrics import timed
+from ..core.tracing import bind, span
+
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+# Lexical index meta key set once chunks from the vector store were copied in
+BACKFILL_MARKER = "vector_store_backfilled"
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised by a retrieval stage that reaches its caller's deadline."""
+
+
+def check_deadline(deadline: Optional[float], stage: str) -> None:
+    """Raises DeadlineExceeded once the time.monotonic() deadline has passed."""
+    if deadline is not None and time.monotonic() >= deadline:
+        raise DeadlineExceeded(f"{stage} reached its deadline")
+
+
+@dataclass
+class RetrievedChunk:
+    """A knowledge base chunk with its fused score and the retrievers that found it."""
+
+    id: str
+    text: str
+    metadata: dict = field(default_factory=dict)
+    score: float = 0.0
+    sources: List[str] = field(default_factory=list)
+
+
+class RetrievalService:
+    """
+    Knowledge base retrieval over dense vectors (the configured vector
+    store), a BM25 lexical index, or both fused with reciprocal rank fusion. Lexical matching
+    catches exact identifiers such as part numbers and error codes that
+    embeddings blur together.
+    """
+
+    def __init__(self, rrf_k: int = 60, candidates: int = 20):
+        self.rrf_k = rrf_k
+        self.candidates = candidates
+        # Runs the vector leg alongside the lexical one in hybrid mode
+        self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid")
+        self._backfill_lock = threading.Lock()
+        self._backfilled = False
+
+    def resolve_mode(self, mode: Optional[str]) -> str:
+        mode = (mode or settings.RETRIEVAL_MODE).lower()
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{mode}'; use one of: {', '.join(RETRIEVAL_MODES)}")
+        return mode
+
+    def vector_search(self, query: str, n_results: int, deadline: Optional[float] = None) -> List[RetrievedChunk]:
+        check_deadline(deadline, "vector search")
+        query_embedding = embedding_client.embed_query(query)
+        check_deadline(deadline, "vector search")
+        collection = vector_store.collection("documents")
+        with span("retrieval.vector", n_results=n_results) as vector_span, timed("vector_query"):
+            results = collection.query(
+                query_embeddings=[query_embedding],
+                n_results=n_results,
+                include=["documents", "metadatas", "distances"],
+            )
+            vector_span.set(chunks=len(results["ids"][0]) if results and results["ids"] else 0)
+        if not results or not results["ids"]:
+            return []
+        metadatas = (results.get("metadatas") or [[]])[0] or [{}] * len(results["ids"][0])
+        distances = (results.get("distances") or [[]])[0] or [0.0] * len(results["ids"][0])
+        return [
+            RetrievedChunk(id=chunk_id, text=text, metadata=metadata or {}, score=-distance, sources=["vector"])
+            for chunk_id, text, metadata, distance in zip(
+                results["ids"][0], results["documents"][0], metadatas, distances
+            )
+        ]
+
+    def backfill_lexical_index(self, page_size: int = 1000) -> int:
+        """
+        Copies chunks stored in the vector store before the lexical index
+        existed into it. Completion is recorded in the lexical index itself, so
+        this runs once per index even if new documents were indexed first.
+        Returns the number of chunks added.
+        """
+        with self._backfill_lock:
+            if self._backfilled:
+                return 0
+            if lexical_index.get_meta(BACKFILL_MARKER):
+                self._backfilled = True
+                return 0
+            collection = vector_store.collection("documents")
+            total = collection.count()
+            added = 0
+            for offset in range(0, total, page_size):
+                page = collection.get(limit=page_size, offset=offset, include=["documents", "metadatas"])
+                rows = [
+                    (chunk_id, text, metadata)
+                    for chunk_id, text, metadata in zip(page["ids"], page["documents"], page["metadatas"])
+                    if metadata and "doc_id" in metadata
+                ]
+                if rows:
+                    lexical_index.add(*map(list, zip(*rows)))
+                    added += len(rows)
+            lexical_index.set_meta(BACKFILL_MARKER, "1")
+            self._backfilled = True
+            if added:
+                logger.info(f"Backfilled the lexical index with {added} chunks from the vector store")
+            return added
+
+    def warm_up(self):
+        """Loads the lexical index, backfilling it if needed, ahead of the first query."""
+        self.backfill_lexical_index()
+
+    def lexical_search(self, query: str, n_results: int, deadline: Optional[float] = None) -> List[RetrievedChunk]:
+        if not self._backfilled:
+            try:
+                self.backfill_lexical_index()
+            except Exception as e:
+                logger.error(f"Lexical index backfill failed: {e}")
+        check_deadline(deadline, "lexical search")
+        with span("retrieval.lexical", n_results=n_results) as lexical_span, timed("lexical_query"):
+            hits = lexical_index.search(query, n_results)
+            lexical_span.set(chunks=len(hits))
+        return [
+            RetrievedChunk(id=chunk_id, text=text, metadata={"doc_id": doc_id}, score=score, sources=["lexical"])
+            for chunk_id, score, doc_id, text in hits
+        ]
+
+    def fuse(self, rankings: List[List[RetrievedChunk]], n_results: int) -> List[RetrievedChunk]:
+        """
+        Reciprocal rank fusion: each list contributes 1 / (rrf_k + rank) per chunk.
+        """
+        fused: Dict[str, RetrievedChunk] = {}
+        for ranking in rankings:
+            for rank, chunk in enumerate(ranking, start=1):
+                entry = fused.get(chunk.id)
+                if entry is None:
+                    entry = fused[chunk.id] = RetrievedChunk(id=chunk.id, text=chunk.text, metadata=dict(chunk.metadata))
+                else:
+                    # Vector results carry the full chunk metadata
+                    entry.metadata = {**chunk.metadata, **entry.metadata}
+                entry.score += 1.0 / (self.rrf_k + rank)
+                entry.sources.extend(s for s in chunk.sources if s not in entry.sources)
+        return sorted(fused.values(), key=lambda c: c.score, reverse=True)[:n_results]
+
+    def search(
+        self, query: str, n_results: int = 3, mode: Optional[str] = None, deadline: Optional[float] = None
+    ) -> List[RetrievedChunk]:
+        """
+        Returns the n_results best chunks for the query under the given mode
+        (defaults to RETRIEVAL_MODE). With a time.monotonic() `deadline`, the
+        search stops between steps once it has passed (raising
+        DeadlineExceeded) instead of finishing work nobody waits for.
+        """
+        mode = self.resolve_mode(mode)
+        if mode == "vector":
+            return self.vector_search(query, n_results, deadline)
+        if mode == "lexical":
+            return self.lexical_search(query, n_results, deadline)
+
+        depth = max(n_results, self.candidates)
+        vector_future = self._pool.submit(bind(self.vector_search), query, depth, deadline)
+        rankings = []
+        try:
+            rankings.append(self.lexical_search(query, depth, deadline))
+        except DeadlineExceeded:
+            vector_future.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"Lexical retrieval failed, using vector results only: {e}")
+        try:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            rankings.append(vector_future.result(timeout=timeout))
+        except Exception as e:
+            if not rankings:
+                raise
+            logger.error(f"Vector retrieval failed, using lexical results only: {e!r}")
+        with span("retrieval.fuse", rankings=len(rankings)):
+            return self.fuse(rankings, n_results)
+
+
+retrieval_service = RetrievalService(rrf_k=settings.RRF_K, candidates=settings.HYBRID_CANDIDATES)
@@ -1,6 +1,11 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import Text, cast, func, select
+from typing import Any, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
 from .. import models
+from ..core.metrics import timed
+from ..core.tracing import traced
 from ..schemas import workflow_schema
+from ..utils.workflow_plan import plan_cache
 
 
 class WorkflowService:
@@ -8,18 +13,47 @@ class WorkflowService:
     Service for handling workflow-related operations.
     """
 
-    def get_workflow(self, db: Session, workflow_id: int):
-        return (
-            db.query(models.workflow.Workflow)
-            .filter(models.workflow.Workflow.id == workflow_id)
-            .first()
+    @traced("workflow_service.get_workflow")
+    async def get_workflow(self, db: AsyncSession, workflow_id: int):
+        return await db.get(models.workflow.Workflow, workflow_id)
+
+    @staticmethod
+    def _definition_version():
+        # Hashed by Postgres so checking the version doesn't ship the JSONB definition
+        return func.coalesce(func.md5(cast(models.workflow.Workflow.definition, Text)), "")
+
+    @traced("workflow_service.get_definition_version")
+    async def get_definition_version(self, db: AsyncSession, workflow_id: int) -> Optional[str]:
+        """
+        Returns a hash of the workflow's stored definition, or None if the
+        workflow does not exist.
+        """
+        result = await db.execute(
+            select(self._definition_version()).where(models.workflow.Workflow.id == workflow_id)
         )
+        return result.scalar_one_or_none()
 
-    def get_workflows(self, db: Session, skip: int = 0, limit: int = 100):
-        return db.query(models.workflow.Workflow).offset(skip).limit(limit).all()
+    @traced("workflow_service.get_definition")
+    async def get_definition(self, db: AsyncSession, workflow_id: int) -> Optional[Tuple[Any, str]]:
+        """
+        Returns the workflow's (definition, version), read together so the
+        version always matches the definition, or None if it does not exist.
+        """
+        result = await db.execute(
+            select(models.workflow.Workflow.definition, self._definition_version())
+            .where(models.workflow.Workflow.id == workflow_id)
+        )
+        row = result.first()
+        return None if row is None else (row[0], row[1])
+
+    async def get_workflows(self, db: AsyncSession, skip: int = 0, limit: int = 100):
+        result = await db.execute(
+            select(models.workflow.Workflow).offset(skip).limit(limit)
+        )
+        return result.scalars().all()
 
-    def create_workflow(
-        self, db: Session, workflow: workflow_schema.WorkflowCreate
+    async def create_workflow(
+        self, db: AsyncSession, workflow: workflow_schema.WorkflowCreate
     ):  # Corrected usage
         # workflow.definition may be a plain dict (from frontend JSON) or a Pydantic object.
         definition_value = workflow.definition
@@ -38,27 +72,32 @@ class WorkflowService:
             name=workflow.name, definition=definition_value
         )
         db.add(db_workflow)
-        db.commit()
-        db.refresh(db_workflow)
+        with timed("db_commit"):
+            await db.commit()
+        await db.refresh(db_workflow)
         return db_workflow
 
-    def update_workflow(
-        self, db: Session, workflow_id: int, workflow: workflow_schema.WorkflowUpdate
+    async def update_workflow(
+        self, db: AsyncSession, workflow_id: int, workflow: workflow_schema.WorkflowUpdate
     ):
-        db_workflow = self.get_workflow(db, workflow_id)
+        db_workflow = await self.get_workflow(db, workflow_id)
         if db_workflow:
             update_data = workflow.model_dump(exclude_unset=True)
             for key, value in update_data.items():
                 setattr(db_workflow, key, value)
-            db.commit()
-            db.refresh(db_workflow)
+            with timed("db_commit"):
+                await db.commit()
+            await db.refresh(db_workflow)
+            plan_cache.invalidate(workflow_id)
         return db_workflow
 
-    def delete_workflow(self, db: Session, workflow_id: int):
-        db_workflow = self.get_workflow(db, workflow_id)
+    async def delete_workflow(self, db: AsyncSession, workflow_id: int):
+        db_workflow = await self.get_workflow(db, workflow_id)
         if db_workflow:
-            db.delete(db_workflow)
-            db.commit()
+            await db.delete(db_workflow)
+            with timed("db_commit"):
+                await db.commit()
+            plan_cache.invalidate(workflow_id)
         return db_workflow
 
 
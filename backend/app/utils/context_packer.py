@@ -0,0 +1,158 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from ..core.config import settings
+from .tokenizer import count_tokens, count_tokens_batch
+
+# Context windows (tokens) of the models we send prompts to
+MODEL_CONTEXT_WINDOWS: Dict[str, int] = {
+    "mistral-tiny": 32_000,
+    "mistral-small": 32_000,
+    "mistral-small-latest": 32_000,
+    "mistral-medium": 32_000,
+    "mistral-large-latest": 128_000,
+    "open-mistral-7b": 32_000,
+    "open-mixtral-8x7b": 32_000,
+}
+
+KB_HEADER = "\n\n--- Knowledge Base Context ---\n"
+SEARCH_HEADER = "\n\n--- Web Search Results ---\n"
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def context_window(model: str) -> int:
+    return MODEL_CONTEXT_WINDOWS.get(model, settings.LLM_CONTEXT_WINDOW)
+
+
+def _tokens(text: str) -> int:
+    return count_tokens(text, settings.TOKENIZER_MODEL) if text else 0
+
+
+def _tokens_batch(texts: List[str]) -> List[int]:
+    return count_tokens_batch(texts, settings.TOKENIZER_MODEL) if texts else []
+
+
+def format_search_result(result: dict) -> str:
+    return f"Title: {result.get('title')}\nSnippet: {result.get('snippet')}\n\n"
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cuts text to at most max_tokens, ending on a sentence boundary when at
+    least one whole sentence fits, otherwise on a word boundary.
+    """
+    if max_tokens <= 0:
+        return ""
+    if _tokens(text) <= max_tokens:
+        return text
+
+    sentences = _SENTENCE_END.split(text)
+    kept, used = [], 0
+    for sentence, cost in zip(sentences, _tokens_batch([s + " " for s in sentences])):
+        if used + cost > max_tokens:
+            break
+        kept.append(sentence)
+        used += cost
+    if kept:
+        return " ".join(kept)
+
+    # First sentence alone is too long: binary search on whole words
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if _tokens(" ".join(words[:mid])) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return " ".join(words[:low])
+
+
+@dataclass
+class PackedContext:
+    """Context selected to fit a prompt budget, with its token accounting."""
+
+    documents: List[str] = field(default_factory=list)
+    search_results: List[dict] = field(default_factory=list)
+    text: str = ""
+    budget: int = 0
+    context_tokens: int = 0
+    truncated: int = 0  # items shortened to fit
+    dropped: int = 0  # items left out entirely
+
+    def usage(self, prompt_tokens: int, max_answer_tokens: int) -> dict:
+        return {
+            "prompt_tokens": prompt_tokens,
+            "context_tokens": self.context_tokens,
+            "context_budget": self.budget,
+            "reserved_answer_tokens": max_answer_tokens,
+            "documents_used": len(self.documents),
+            "search_results_used": len(self.search_results),
+            "truncated": self.truncated,
+            "dropped": self.dropped,
+        }
+
+
+def pack_context(
+    documents: List[str],
+    search_results: List[dict],
+    budget: int,
+    min_chunk_tokens: int = 32,
+) -> PackedContext:
+    """
+    Fills `budget` tokens with retrieved context in relevance order. Both
+    lists arrive ranked, so items are taken alternately by rank (knowledge
+    base first on ties). An item that does not fit is cut at a sentence
+    boundary if at least `min_chunk_tokens` remain, otherwise skipped.
+    Sections are rendered in the same layout as before packing.
+    """
+    packed = PackedContext(budget=max(0, budget))
+    ranked = []
+    for rank in range(max(len(documents), len(search_results))):
+        if rank < len(documents):
+            ranked.append(("document", documents[rank]))
+        if rank < len(search_results):
+            ranked.append(("search", search_results[rank]))
+
+    bodies = [item + "\n" if kind == "document" else format_search_result(item) for kind, item in ranked]
+    remaining = packed.budget
+    for (kind, item), body, body_cost in zip(ranked, bodies, _tokens_batch(bodies)):
+        header = ""
+        if kind == "document" and not packed.documents:
+            header = KB_HEADER
+        elif kind == "search" and not packed.search_results:
+            header = SEARCH_HEADER
+        header_cost = _tokens(header)
+
+        cost = header_cost + body_cost
+        if cost > remaining:
+            room = remaining - header_cost
+            if room < min_chunk_tokens:
+                packed.dropped += 1
+                continue
+            if kind == "document":
+                item = truncate_to_tokens(item, room - 1)
+                body = item + "\n"
+            else:
+                snippet = truncate_to_tokens(str(item.get("snippet") or ""), room - _tokens(format_search_result({**item, "snippet": ""})))
+                item = {**item, "snippet": snippet}
+                body = format_search_result(item)
+            cost = header_cost + _tokens(body)
+            if cost > remaining or not body.strip():
+                packed.dropped += 1
+                continue
+            packed.truncated += 1
+
+        if kind == "document":
+            packed.documents.append(item)
+        else:
+            packed.search_results.append(item)
+        remaining -= cost
+
+    if packed.documents:
+        packed.text += KB_HEADER + "".join(doc + "\n" for doc in packed.documents)
+    if packed.search_results:
+        packed.text += SEARCH_HEADER + "".join(format_search_result(r) for r in packed.search_results)
+    packed.context_tokens = _tokens(packed.text)
+    return packed
@@ -0,0 +1,66 @@
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+from sqlalchemy import literal, tuple_
+
+NEWEST_FIRST = "newest"
+OLDEST_FIRST = "oldest"
+ORDERS = (NEWEST_FIRST, OLDEST_FIRST)
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """
+    Encodes the (created_at, id) position of the last row on a page as an
+    opaque, URL-safe token.
+    """
+    payload = json.dumps({"t": created_at.isoformat(), "i": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(payload["t"]), int(payload["i"])
+    except Exception as e:
+        raise InvalidCursorError("Invalid pagination cursor") from e
+
+
+def keyset_select(stmt, created_col, id_col, limit: int, cursor: str = None, order: str = NEWEST_FIRST):
+    """
+    Applies keyset pagination on (created_at, id) to a select that is already
+    filtered down to one index prefix. Fetches one extra row so keyset_result
+    can tell whether another page follows.
+    """
+    if order not in ORDERS:
+        raise ValueError(f"order must be one of: {', '.join(ORDERS)}")
+    newest = order == NEWEST_FIRST
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        # Row-value comparison lets the planner seek straight into the composite index
+        position = tuple_(created_col, id_col)
+        after = tuple_(literal(created_at), literal(row_id))
+        stmt = stmt.where(position < after if newest else position > after)
+    if newest:
+        stmt = stmt.order_by(created_col.desc(), id_col.desc())
+    else:
+        stmt = stmt.order_by(created_col.asc(), id_col.asc())
+    return stmt.limit(limit + 1)
+
+
+def keyset_result(rows, created_col, id_col, limit: int):
+    """
+    Trims the rows fetched by a keyset_select statement to the page and
+    returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, created_col.key), getattr(last, id_col.key))
@@ -1,15 +1,152 @@
 import fitz  # PyMuPDF
+import functools
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Union
+from ..core.config import settings
+from ..core import tracing
+
+
+class PDFParseError(RuntimeError):
+    """Raised when a PDF cannot be opened or a page cannot be extracted."""
+
+
+@dataclass
+class PageRecord:
+    """Text of a single PDF page; page_number is 1-based."""
+
+    page_number: int
+    text: str
+
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+
+def _worker_count() -> int:
+    return settings.PDF_PARSE_WORKERS or os.cpu_count() or 1
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        with _process_pool_lock:
+            if _process_pool is None:
+                _process_pool = ProcessPoolExecutor(max_workers=_worker_count())
+    return _process_pool
+
+
+def _open(file_path: str):
+    try:
+        return fitz.open(file_path)
+    except Exception as e:
+        raise PDFParseError(f"Could not open PDF {file_path}: {e}") from e
+
+
+def page_count(file_path: str) -> int:
+    """
+    Returns the number of pages in a PDF.
+    """
+    with _open(file_path) as doc:
+        return doc.page_count
+
+
+def iter_pages(file_path: str, start: int = 0, end: Optional[int] = None) -> Iterator[PageRecord]:
+    """
+    Yields pages [start, end) one at a time, keeping only the current page in memory.
+    """
+    with _open(file_path) as doc:
+        end = doc.page_count if end is None else min(end, doc.page_count)
+        for index in range(start, end):
+            try:
+                text = doc.load_page(index).get_text()
+            except Exception as e:
+                raise PDFParseError(f"Failed to extract page {index + 1} of {file_path}: {e}") from e
+            yield PageRecord(page_number=index + 1, text=text)
+
+
+def _extract_range(file_path: str, start: int, end: int) -> List[str]:
+    # Runs in a worker process; each worker opens its own document handle
+    with tracing.span("pdf.extract_range", start=start, end=end):
+        return [page.text for page in iter_pages(file_path, start, end)]
+
+
+def iter_pages_parallel(file_path: str, workers: Optional[int] = None) -> Iterator[PageRecord]:
+    """
+    Splits the PDF into page ranges extracted by a process pool and yields the
+    pages in order. At most two ranges per worker are in flight, which bounds
+    memory on very large documents.
+    """
+    workers = workers or _worker_count()
+    total = page_count(file_path)
+    step = max(1, settings.PDF_PAGES_PER_TASK)
+    ranges = deque((start, min(start + step, total)) for start in range(0, total, step))
+
+    pool = _get_process_pool()
+    trace_carrier = tracing.carrier()
+    pending = deque()
+    while ranges or pending:
+        while ranges and len(pending) < workers * 2:
+            start, end = ranges.popleft()
+            pending.append((start, pool.submit(tracing.run_remote, trace_carrier, _extract_range, file_path, start, end)))
+        start, future = pending.popleft()
+        try:
+            texts = tracing.adopt(future.result())
+        except PDFParseError:
+            raise
+        except Exception as e:
+            raise PDFParseError(f"Failed to extract pages of {file_path}: {e}") from e
+        for offset, text in enumerate(texts):
+            yield PageRecord(page_number=start + offset + 1, text=text)
+
+
+def stream_pages(file_path: str) -> Iterator[PageRecord]:
+    """
+    Yields the pages of a PDF, using the process pool for large documents.
+    """
+    workers = _worker_count()
+    if workers > 1 and page_count(file_path) >= settings.PDF_PARALLEL_MIN_PAGES:
+        return iter_pages_parallel(file_path, workers)
+    return iter_pages(file_path)
+
+
+def parse_pdf_pages(file_path: str) -> List[str]:
+    """
+    Parses a PDF file and returns the text of each page, in order.
+    Raises PDFParseError if the file cannot be read.
+    """
+    return [page.text for page in stream_pages(file_path)]
+
 
 def parse_pdf(file_path: str) -> str:
     """
     Parses a PDF file and extracts text content.
+    Raises PDFParseError if the file cannot be read.
     """
+    return "".join(parse_pdf_pages(file_path))
+
+
+def _parse_document(file_path: str):
+    # Runs in a worker process; errors are returned so one bad file doesn't sink the batch
     try:
-        doc = fitz.open(file_path)
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        return text
+        with tracing.span("pdf.parse_document", file=os.path.basename(file_path)) as parse_span:
+            pages = [page.text for page in iter_pages(file_path)]
+            parse_span.set(pages=len(pages))
+            return pages
     except Exception as e:
-        print(f"Error parsing PDF {file_path}: {e}")
-        return ""
+        return PDFParseError(str(e))
+
+
+def parse_pdfs(file_paths: List[str]) -> List[Union[List[str], PDFParseError]]:
+    """
+    Parses several PDFs in parallel (one file per task) and returns, in order,
+    each file's page texts or the PDFParseError it raised.
+    """
+    if len(file_paths) < 2 or _worker_count() < 2:
+        return [_parse_document(file_path) for file_path in file_paths]
+    # Worker spans come back with each result and are grafted into the caller's trace
+    task = functools.partial(tracing.run_remote, tracing.carrier(), _parse_document)
+    return [tracing.adopt(outcome) for outcome in _get_process_pool().map(task, file_paths)]
@@ -0,0 +1,95 @@
+from bisect import bisect_right
+from dataclasses import dataclass
+from itertools import islice
+from typing import Iterable, Iterator, List
+
+
+@dataclass
+class TextChunk:
+    """A slice of a parsed document along with its position in the source."""
+
+    index: int
+    text: str
+    page_start: int
+    page_end: int
+    char_start: int
+    char_end: int
+
+
+def _find_break(text: str, start: int, end: int, page_offsets: List[int]) -> int:
+    """
+    Picks a natural split point inside text[start:end], preferring page
+    boundaries, then paragraph breaks, then any whitespace. Only the second half
+    of the window is considered so chunks never shrink below half the size.
+    """
+    floor = start + (end - start) // 2
+
+    # Last page boundary inside the window
+    idx = bisect_right(page_offsets, end) - 1
+    if idx >= 0 and floor < page_offsets[idx] < end:
+        return page_offsets[idx]
+
+    for sep in ("\n\n", "\n", " "):
+        pos = text.rfind(sep, floor, end)
+        if pos != -1:
+            return pos + len(sep)
+    return end
+
+
+def chunk_pages(
+    pages: List[str], chunk_size: int = 1000, chunk_overlap: int = 200
+) -> Iterator[TextChunk]:
+    """
+    Splits per-page text into overlapping chunks.
+
+    Offsets refer to the document text obtained by joining `pages`, and page
+    numbers are 1-based. Yields chunks lazily so callers can embed and store
+    them in batches.
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    if not 0 <= chunk_overlap < chunk_size:
+        raise ValueError("chunk_overlap must be in [0, chunk_size)")
+
+    page_offsets = []
+    offset = 0
+    for page in pages:
+        page_offsets.append(offset)
+        offset += len(page)
+    text = "".join(pages)
+    length = len(text)
+
+    index = 0
+    start = 0
+    while start < length:
+        end = min(start + chunk_size, length)
+        if end < length:
+            end = _find_break(text, start, end, page_offsets)
+
+        chunk_text = text[start:end]
+        if chunk_text.strip():
+            yield TextChunk(
+                index=index,
+                text=chunk_text,
+                page_start=bisect_right(page_offsets, start),
+                page_end=bisect_right(page_offsets, end - 1),
+                char_start=start,
+                char_end=end,
+            )
+            index += 1
+
+        if end >= length:
+            break
+        start = max(end - chunk_overlap, start + 1)
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    """Yields lists of at most `size` items from `iterable`."""
+    if size <= 0:
+        raise ValueError("size must be positive")
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
@@ -1,13 +1,127 @@
+import logging
+import re
+import threading
+from typing import Dict, Iterable, List, Optional
 import tiktoken
+from ..core.cache import LRUCache
+from ..core.config import settings
+from ..core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENCODING = "cl100k_base"
+
+
+class _ApproximateEncoding:
+    """
+    Stand-in used when a tiktoken encoding cannot be loaded (e.g. offline
+    with no cached BPE file): one token per word or punctuation mark, which
+    is close to cl100k_base for English text.
+    """
+
+    name = "approximate"
+    _pattern = re.compile(r"\w+|[^\w\s]")
+
+    def encode_ordinary(self, text: str) -> List[str]:
+        return self._pattern.findall(text)
+
+    def encode_ordinary_batch(self, texts: List[str], num_threads: int = 8) -> List[List[str]]:
+        return [self.encode_ordinary(text) for text in texts]
+
+
+class EncoderRegistry:
+    """
+    Process-wide cache of tiktoken encodings keyed by model name, so each
+    encoding is resolved and loaded once. Unknown models fall back to
+    cl100k_base with a single warning per model.
+    """
+
+    def __init__(self):
+        self._by_model: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model: str):
+        encoding = self._by_model.get(model)
+        if encoding is None:
+            with self._lock:
+                encoding = self._by_model.get(model)
+                if encoding is None:
+                    encoding = self._by_model[model] = self._load(model)
+        return encoding
+
+    def _load(self, model: str):
+        try:
+            try:
+                return tiktoken.encoding_for_model(model)
+            except KeyError:
+                logger.warning(f"No tiktoken encoding for model '{model}', using {DEFAULT_ENCODING}")
+                return tiktoken.get_encoding(DEFAULT_ENCODING)
+        except Exception as e:
+            logger.warning(f"Could not load tiktoken encoding for '{model}' ({e}); counting tokens approximately")
+            return _ApproximateEncoding()
+
+    def warm_up(self, models: Optional[Iterable[str]] = None):
+        """Loads the encodings for `models` (default: TOKENIZER_MODEL) ahead of first use."""
+        for model in models or (settings.TOKENIZER_MODEL,):
+            self.get(model)
+
+
+encoders = EncoderRegistry()
+
+# Token counts of recently seen short strings, keyed by encoding and text
+_memo = LRUCache(max_entries=settings.TOKEN_MEMO_SIZE)
+registry.register_cache("token_count", _memo.stats)
+
+
+def _memo_key(encoding, text: str) -> Optional[str]:
+    if len(text) > settings.TOKEN_MEMO_MAX_CHARS:
+        return None
+    return f"{encoding.name}\x00{text}"
+
 
 def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
     """
     Counts the number of tokens in a text string for a given model.
     """
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        print("Warning: model not found. Using cl100k_base encoding.")
-        encoding = tiktoken.get_encoding("cl100k_base")
-    
-    return len(encoding.encode(text))
+    encoding = encoders.get(model)
+    key = _memo_key(encoding, text)
+    if key is not None:
+        cached = _memo.get(key)
+        if cached is not None:
+            return cached
+    count = len(encoding.encode_ordinary(text))
+    if key is not None:
+        _memo.set(key, count)
+    return count
+
+
+def count_tokens_batch(texts: List[str], model: str = "gpt-3.5-turbo") -> List[int]:
+    """
+    Counts tokens for many strings at once. Memoised strings are served from
+    the memo; the rest are encoded in one threaded tiktoken batch call.
+    """
+    encoding = encoders.get(model)
+    counts: List[Optional[int]] = [None] * len(texts)
+    pending: List[int] = []
+    for i, text in enumerate(texts):
+        key = _memo_key(encoding, text)
+        cached = _memo.get(key) if key is not None else None
+        if cached is None:
+            pending.append(i)
+        else:
+            counts[i] = cached
+
+    if pending:
+        encoded = encoding.encode_ordinary_batch(
+            [texts[i] for i in pending], num_threads=settings.TOKENIZER_THREADS
+        )
+        for i, tokens in zip(pending, encoded):
+            counts[i] = len(tokens)
+            key = _memo_key(encoding, texts[i])
+            if key is not None:
+                _memo.set(key, counts[i])
+    return counts
+
+
+def warm_up(models: Optional[Iterable[str]] = None):
+    encoders.warm_up(models)
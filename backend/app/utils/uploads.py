@@ -0,0 +1,44 @@
+import hashlib
+import os
+import tempfile
+from typing import BinaryIO, Optional, Tuple
+from ..core.config import settings
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds the size it was allowed."""
+
+
+def store_upload(
+    source: BinaryIO,
+    directory: Optional[str] = None,
+    suffix: str = ".pdf",
+    max_bytes: Optional[int] = None,
+) -> Tuple[str, str]:
+    """
+    Copies an uploaded file object to a uniquely named temp file in chunks,
+    computing its sha256 in the same pass. Returns (file_path, hex digest);
+    the caller owns the file. Stops with UploadTooLargeError once more than
+    `max_bytes` have been read.
+    """
+    directory = directory or settings.UPLOAD_DIR or None
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(prefix="upload_", suffix=suffix, dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as dst:
+            while True:
+                chunk = source.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise UploadTooLargeError(f"File exceeds the {max_bytes} byte limit")
+                digest.update(chunk)
+                dst.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
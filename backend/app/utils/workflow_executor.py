@@ -1,4 +1,48 @@
+import asyncio
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, FrozenSet, List, Mapping, Optional, Set
+from ..core.config import settings
+from ..core.tracing import bind, span
 from ..services.llm_service import llm_service
+from .workflow_plan import (
+    KNOWLEDGE_BASE_NODE_TYPES,
+    LLM_NODE_TYPES,
+    SEARCH_NODE_TYPES,
+    ExecutionPlan,
+    PlanNode,
+    WorkflowValidationError,
+    compile_plan,
+    plan_cache,
+)
+
+
+@dataclass
+class NodeOutput:
+    """Context accumulated along a path of the workflow graph."""
+
+    documents: List[str] = field(default_factory=list)
+    search_results: List[dict] = field(default_factory=list)
+    responses: List[str] = field(default_factory=list)
+    sources: Set[str] = field(default_factory=set)
+    errors: List[str] = field(default_factory=list)
+    usage: Optional[dict] = None  # token usage of the LLM node that produced `responses`
+
+    @classmethod
+    def merge(cls, outputs: List["NodeOutput"]) -> "NodeOutput":
+        merged = cls()
+        for output in outputs:
+            for doc in output.documents:
+                if doc not in merged.documents:
+                    merged.documents.append(doc)
+            for result in output.search_results:
+                if result not in merged.search_results:
+                    merged.search_results.append(result)
+            merged.responses.extend(output.responses)
+            merged.sources |= output.sources
+            merged.errors.extend(e for e in output.errors if e not in merged.errors)
+        return merged
 
 
 class WorkflowExecutor:
@@ -6,70 +50,332 @@ class WorkflowExecutor:
     Executes a workflow based on its definition.
     Accepts either a pydantic WorkflowDefinition (with .nodes/.edges) or a plain dict
     coming from the JSONB column stored in the database.
+
+    Definitions are compiled into an ExecutionPlan (cached per workflow) and
+    scheduled on a thread pool: a node starts as soon as all of its parents have
+    finished, so independent branches (e.g. knowledge base and web search
+    feeding one LLM node) run concurrently. Each node has a timeout; a failed
+    or timed-out node passes its inputs through and is reported as degraded.
     """
 
-    def _get_attr(self, node, key, default=None):
-        if isinstance(node, dict):
-            return node.get(key, default)
-        return getattr(node, key, default)
-
-    def _get_data_dict(self, node):
-        data = self._get_attr(node, "data", {})
-        if data is None:
-            return {}
-        if isinstance(data, dict):
-            return data
-        # pydantic BaseModel or object -> try to convert to dict-like
+    def __init__(self, max_workers: int = settings.WORKFLOW_MAX_WORKERS):
+        # Each run gets its own pool of up to max_workers threads, so a slow
+        # or stuck workflow cannot starve the nodes of other requests
+        self.max_workers = max_workers
+
+    def get_plan(self, workflow_definition, workflow_id: Optional[int] = None) -> ExecutionPlan:
+        """
+        Returns the compiled plan, served from the plan cache when the workflow
+        id is known. An already compiled plan is returned as is.
+        """
+        if isinstance(workflow_definition, ExecutionPlan):
+            return workflow_definition
+        if workflow_id is None:
+            return compile_plan(workflow_definition)
+        return plan_cache.get_plan(workflow_id, workflow_definition)
+
+    def _retrieve_for_llm(self, data: Mapping, output: NodeOutput, query: str, deadline: float):
+        """
+        Applies the LLM node's own use_knowledge_base / use_search flags, so they
+        keep working for workflows without separate retrieval nodes. Both stages
+        share whatever remains of the request's retrieval budget.
+        """
+        use_knowledge_base = data.get("use_knowledge_base", False) and "knowledge_base" not in output.sources
+        use_search = data.get("use_search", False) and "web_search" not in output.sources
+        if not (use_knowledge_base or use_search):
+            return
+
+        with span("workflow.retrieve_for_llm", knowledge_base=use_knowledge_base, web_search=use_search):
+            retrieved = llm_service.retrieve_context(
+                query,
+                use_knowledge_base,
+                use_search,
+                budget_seconds=max(0.0, deadline - time.monotonic()),
+                retrieval_mode=data.get("retrieval_mode"),
+            )
+        if use_knowledge_base:
+            output.documents.extend(d for d in retrieved.documents if d not in output.documents)
+            output.sources.add("knowledge_base")
+        if use_search:
+            output.search_results.extend(retrieved.search_results)
+            output.sources.add("web_search")
+        output.errors.extend(retrieved.degraded)
+
+    def _run_node(
+        self,
+        node: PlanNode,
+        inputs: NodeOutput,
+        query: str,
+        deadline: float,
+        workflow_id: Optional[int] = None,
+    ) -> NodeOutput:
+        """
+        Runs a single node against the merged outputs of its parents.
+        `deadline` is the end of the request's retrieval budget; LLM token
+        usage is attributed to `workflow_id`.
+        """
+        with span("workflow.node", node_id=node.id, node_type=node.type) as node_span:
+            output = self._run_node_body(node, inputs, query, deadline, workflow_id)
+            node_span.set(
+                documents=len(output.documents),
+                search_results=len(output.search_results),
+                errors=len(output.errors),
+            )
+            return output
+
+    def _run_node_body(
+        self,
+        node: PlanNode,
+        inputs: NodeOutput,
+        query: str,
+        deadline: float,
+        workflow_id: Optional[int],
+    ) -> NodeOutput:
+        ntype = node.type
+        data = node.data
+        output = NodeOutput.merge([inputs])
+
+        if ntype in KNOWLEDGE_BASE_NODE_TYPES:
+            documents = llm_service.query_knowledge_base(
+                query, n_results=data.get("top_k", 2), mode=data.get("retrieval_mode")
+            )
+            for doc in documents:
+                if doc not in output.documents:
+                    output.documents.append(doc)
+            output.sources.add("knowledge_base")
+
+        elif ntype in SEARCH_NODE_TYPES:
+            output.search_results.extend(llm_service.search_web(query, n_results=data.get("top_k", 3)))
+            output.sources.add("web_search")
+
+        elif ntype in LLM_NODE_TYPES:
+            self._retrieve_for_llm(data, output, query, deadline)
+            # Answers from upstream LLM nodes become context for this one
+            documents = output.documents + output.responses
+            response, usage = llm_service.answer_with_usage(
+                query,
+                documents,
+                output.search_results,
+                llm_provider=data.get("llm_provider", "openai"),
+                use_cache=data.get("use_cache", True),
+                max_tokens=data.get("max_tokens"),
+                workflow_id=workflow_id,
+            )
+            output.responses = [response]
+            output.usage = usage
+
+        # userQuery, output and unknown node types pass their inputs through
+        return output
+
+    def run_plan(
+        self,
+        plan: ExecutionPlan,
+        query: str,
+        node_ids: FrozenSet[str],
+        workflow_id: Optional[int] = None,
+    ) -> Dict[str, NodeOutput]:
+        """
+        Runs the given subset of nodes, starting each one as soon as its parents
+        (within the subset) are done. Retrieval nodes must also finish within the
+        plan's shared retrieval budget. Returns the output of every node.
+        """
+        nodes = plan.nodes
+        budget_deadline = time.monotonic() + plan.retrieval_budget
+        waiting = {n: {p for p in nodes[n].parents if p in node_ids} for n in node_ids}
+        inputs: Dict[str, NodeOutput] = {}
+        outputs: Dict[str, NodeOutput] = {}
+        running = {}  # future -> node_id
+        started: Dict[str, float] = {}  # node_id -> time the node began executing
+        pool = ThreadPoolExecutor(
+            max_workers=max(1, min(self.max_workers, len(node_ids))), thread_name_prefix="workflow"
+        )
+
+        def run(node, node_inputs):
+            started[node.id] = time.monotonic()
+            return self._run_node(node, node_inputs, query, budget_deadline, workflow_id)
+
+        def deadline_of(node_id) -> Optional[float]:
+            # A node's timeout counts from when it starts, not from when it was queued
+            start = started.get(node_id)
+            if start is None:
+                return None
+            node = nodes[node_id]
+            deadline = start + node.timeout
+            if node.type in KNOWLEDGE_BASE_NODE_TYPES or node.type in SEARCH_NODE_TYPES:
+                deadline = min(deadline, budget_deadline)
+            return deadline
+
+        def submit(node_id):
+            node = nodes[node_id]
+            inputs[node_id] = NodeOutput.merge(
+                [outputs[p] for p in node.parents if p in outputs]
+            )
+            running[pool.submit(bind(run), node, inputs[node_id])] = node_id
+
+        def finish(node_id, output):
+            outputs[node_id] = output
+            for child in nodes[node_id].children:
+                if child in waiting:
+                    waiting[child].discard(node_id)
+                    if not waiting[child] and child not in inputs:
+                        submit(child)
+
+        def fail(node_id, reason):
+            output = NodeOutput.merge([inputs[node_id]])
+            output.errors.append(f"Node '{node_id}' {reason}")
+            finish(node_id, output)
+
         try:
-            return data.dict()
-        except Exception:
-            try:
-                return data.__dict__
-            except Exception:
-                return {}
-
-    def execute(self, workflow_definition, query: str):
-        # Support both pydantic objects and plain dicts
-        if hasattr(workflow_definition, "nodes"):
-            nodes_list = list(getattr(workflow_definition, "nodes") or [])
-            edges = getattr(workflow_definition, "edges", []) or []
-        elif isinstance(workflow_definition, dict):
-            nodes_list = workflow_definition.get("nodes", []) or []
-            edges = workflow_definition.get("edges", []) or []
-        else:
-            return {"error": "Unsupported workflow definition format"}
-
-        # Build quick lookup (id -> node)
-        nodes = {}
-        for n in nodes_list:
-            node_id = self._get_attr(n, "id")
-            if node_id is not None:
-                nodes[node_id] = n
-
-        # Find LLM engine node (type may be 'llmEngine' or 'llm')
-        llm_engine_node = None
-        for n in nodes_list:
-            ntype = self._get_attr(n, "type")
-            if ntype in ("llmEngine", "llm"):
-                llm_engine_node = n
-                break
-
-        if not llm_engine_node:
+            for node_id in plan.order:
+                if node_id in waiting and not waiting[node_id]:
+                    submit(node_id)
+
+            while running:
+                deadlines = [d for d in map(deadline_of, running.values()) if d is not None]
+                timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                if len(deadlines) < len(running):
+                    # Queued nodes get their deadline once they start; look again shortly
+                    timeout = min(timeout, 0.05) if timeout is not None else 0.05
+                done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node_id = running.pop(future)
+                    try:
+                        finish(node_id, future.result())
+                    except Exception as e:
+                        fail(node_id, f"failed: {e}")
+
+                now = time.monotonic()
+                for future, node_id in list(running.items()):
+                    deadline = deadline_of(node_id)
+                    if deadline is not None and deadline <= now:
+                        # The worker thread cannot be interrupted; its result is ignored
+                        running.pop(future)
+                        fail(node_id, "timed out")
+        finally:
+            # Timed-out workers finish in the background without holding up the response
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        return outputs
+
+    def execute(self, workflow_definition, query: str, workflow_id: Optional[int] = None):
+        try:
+            plan = self.get_plan(workflow_definition, workflow_id)
+        except WorkflowValidationError as e:
+            return {"error": str(e)}
+
+        if plan.final_node is None:
             return {"error": "LLM Engine node not found in workflow."}
 
-        data = self._get_data_dict(llm_engine_node)
-        use_knowledge_base = data.get("use_knowledge_base", False)
-        use_search = data.get("use_search", False)
-        llm_provider = data.get("llm_provider", "openai")
+        with span("workflow.run_plan", workflow_id=workflow_id, nodes=len(plan.run_nodes)):
+            outputs = self.run_plan(plan, query, plan.run_nodes, workflow_id)
 
-        final_response = llm_service.generate_response(
-            query=query,
-            llm_provider=llm_provider,
-            use_knowledge_base=use_knowledge_base,
-            use_search=use_search,
-        )
+        result = outputs[plan.final_node]
+        if not result.responses:
+            return {"error": "; ".join(result.errors) or "LLM Engine produced no response."}
+
+        response = {"response": result.responses[-1]}
+        if result.usage:
+            response["usage"] = result.usage
+        if result.errors:
+            response["degraded"] = result.errors
+        return response
+
+    def _run_upstream(self, plan: ExecutionPlan, query: str, workflow_id: Optional[int]) -> NodeOutput:
+        """
+        Runs everything upstream of the final LLM node plus that node's own
+        retrieval flags; returns the final node's merged inputs.
+        """
+        final_node = plan.nodes[plan.final_node]
+        with span("workflow.run_plan", workflow_id=workflow_id, nodes=len(plan.upstream_of_final)):
+            deadline = time.monotonic() + plan.retrieval_budget
+            outputs = self.run_plan(plan, query, plan.upstream_of_final, workflow_id)
+            inputs = NodeOutput.merge([outputs[p] for p in final_node.parents])
+            self._retrieve_for_llm(final_node.data, inputs, query, deadline)
+            return inputs
+
+    async def aexecute(self, workflow_definition, query: str, workflow_id: Optional[int] = None):
+        """
+        Async variant of execute. Upstream nodes still run on threads, but the
+        final LLM call is awaited, so no thread is held while waiting for it.
+        """
+        try:
+            plan = self.get_plan(workflow_definition, workflow_id)
+        except WorkflowValidationError as e:
+            return {"error": str(e)}
+
+        if plan.final_node is None:
+            return {"error": "LLM Engine node not found in workflow."}
+
+        final_node = plan.nodes[plan.final_node]
+        data = final_node.data
+        inputs = await asyncio.to_thread(self._run_upstream, plan, query, workflow_id)
+
+        with span("workflow.node", node_id=final_node.id, node_type=final_node.type):
+            try:
+                response, usage = await asyncio.wait_for(
+                    llm_service.aanswer_with_usage(
+                        query,
+                        inputs.documents + inputs.responses,
+                        inputs.search_results,
+                        llm_provider=data.get("llm_provider", "openai"),
+                        use_cache=data.get("use_cache", True),
+                        max_tokens=data.get("max_tokens"),
+                        workflow_id=workflow_id,
+                    ),
+                    timeout=final_node.timeout,
+                )
+            except asyncio.TimeoutError:
+                return {"error": "; ".join(inputs.errors + [f"Node '{final_node.id}' timed out"])}
+            except Exception as e:
+                return {"error": "; ".join(inputs.errors + [f"Node '{final_node.id}' failed: {e}"])}
+
+        result = {"response": response}
+        if usage:
+            result["usage"] = usage
+        if inputs.errors:
+            result["degraded"] = inputs.errors
+        return result
+
+    async def stream(
+        self, workflow_definition, query: str, workflow_id: Optional[int] = None
+    ) -> AsyncIterator[dict]:
+        """
+        Streaming variant of execute: runs everything upstream of the final LLM
+        node on the thread pool, then streams that node's answer via
+        LLMService.stream_response.
+        """
+        try:
+            plan = self.get_plan(workflow_definition, workflow_id)
+        except WorkflowValidationError as e:
+            yield {"event": "error", "data": {"detail": str(e)}}
+            return
+
+        if plan.final_node is None:
+            yield {"event": "error", "data": {"detail": "LLM Engine node not found in workflow."}}
+            return
+
+        final_node = plan.nodes[plan.final_node]
+        data = final_node.data
 
-        return {"response": final_response}
+        inputs = await asyncio.to_thread(self._run_upstream, plan, query, workflow_id)
+
+        if "knowledge_base" in inputs.sources:
+            yield {"event": "retrieval", "data": {"documents": len(inputs.documents)}}
+        if "web_search" in inputs.sources:
+            yield {"event": "search", "data": {"results": len(inputs.search_results)}}
+        if inputs.errors:
+            yield {"event": "degraded", "data": {"errors": inputs.errors}}
+
+        async for event in llm_service.stream_response(
+            query=query,
+            llm_provider=data.get("llm_provider", "openai"),
+            use_cache=data.get("use_cache", True),
+            documents=inputs.documents + inputs.responses,
+            search_results=inputs.search_results,
+            max_tokens=data.get("max_tokens"),
+            workflow_id=workflow_id,
+        ):
+            yield event
 
 
 workflow_executor = WorkflowExecutor()
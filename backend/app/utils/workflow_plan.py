@@ -0,0 +1,239 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Mapping, Optional, Tuple
+from ..core.config import settings
+
+LLM_NODE_TYPES = ("llmEngine", "llm")
+KNOWLEDGE_BASE_NODE_TYPES = ("knowledgeBase",)
+SEARCH_NODE_TYPES = ("webSearch", "search")
+
+
+class WorkflowValidationError(ValueError):
+    """Raised when a workflow definition does not form a valid DAG."""
+
+
+class _Frozen:
+    """Base for plan objects: attributes are set once in __init__."""
+
+    __slots__ = ()
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def _init(self, **values):
+        for key, value in values.items():
+            object.__setattr__(self, key, value)
+
+
+class PlanNode(_Frozen):
+    """A compiled workflow node with its resolved data and adjacency."""
+
+    __slots__ = ("id", "type", "data", "parents", "children", "timeout")
+
+    def __init__(self, id: str, type: Optional[str], data: Mapping, parents: Tuple[str, ...],
+                 children: Tuple[str, ...], timeout: float):
+        self._init(id=id, type=type, data=data, parents=parents, children=children, timeout=timeout)
+
+
+class ExecutionPlan(_Frozen):
+    """
+    Immutable, pre-validated form of a workflow definition: nodes in
+    topological order, plus the node sets the executor needs for a run.
+    """
+
+    __slots__ = (
+        "nodes", "order", "llm_nodes", "final_node", "run_nodes", "upstream_of_final",
+        "retrieval_budget",
+    )
+
+    def __init__(self, nodes: Dict[str, PlanNode], order: Tuple[str, ...]):
+        llm_nodes = tuple(n for n in order if nodes[n].type in LLM_NODE_TYPES)
+        final_node = llm_nodes[-1] if llm_nodes else None
+        # Only nodes that feed an LLM node need to run; downstream nodes just pass through
+        run_nodes = frozenset(_ancestors(nodes, llm_nodes)) | frozenset(llm_nodes)
+        upstream = frozenset(_ancestors(nodes, (final_node,))) if final_node else frozenset()
+        budget_data = nodes[final_node].data if final_node else {}
+        self._init(
+            nodes=MappingProxyType(nodes),
+            order=order,
+            llm_nodes=llm_nodes,
+            final_node=final_node,
+            run_nodes=run_nodes,
+            upstream_of_final=upstream,
+            retrieval_budget=_seconds(budget_data.get("retrieval_budget"), settings.RETRIEVAL_BUDGET_SECONDS),
+        )
+
+
+def _ancestors(nodes: Mapping[str, PlanNode], node_ids) -> FrozenSet[str]:
+    seen = set()
+    stack = list(node_ids)
+    while stack:
+        for parent in nodes[stack.pop()].parents:
+            if parent not in seen:
+                seen.add(parent)
+                stack.append(parent)
+    return frozenset(seen)
+
+
+def _get_attr(obj, key, default=None):
+    if isinstance(obj, dict):
+        return obj.get(key, default)
+    return getattr(obj, key, default)
+
+
+def _get_data_dict(node) -> dict:
+    data = _get_attr(node, "data", {})
+    if data is None:
+        return {}
+    if isinstance(data, dict):
+        return data
+    # pydantic BaseModel or object -> try to convert to dict-like
+    try:
+        return data.dict()
+    except Exception:
+        try:
+            return data.__dict__
+        except Exception:
+            return {}
+
+
+def _seconds(value, default: float) -> float:
+    try:
+        return float(value) if value else default
+    except (TypeError, ValueError):
+        return default
+
+
+def compile_plan(workflow_definition) -> ExecutionPlan:
+    """
+    Validates a workflow definition (pydantic WorkflowDefinition or the plain
+    dict stored in the JSONB column) and compiles it into an ExecutionPlan.
+    Raises WorkflowValidationError on duplicate node ids, edges pointing at
+    unknown nodes, or cycles.
+    """
+    # Support both pydantic objects and plain dicts
+    if hasattr(workflow_definition, "nodes"):
+        nodes_list = list(getattr(workflow_definition, "nodes") or [])
+        edges = getattr(workflow_definition, "edges", []) or []
+    elif isinstance(workflow_definition, dict):
+        nodes_list = workflow_definition.get("nodes", []) or []
+        edges = workflow_definition.get("edges", []) or []
+    else:
+        raise WorkflowValidationError("Unsupported workflow definition format")
+
+    # Build quick lookup (id -> node)
+    raw_nodes = {}
+    for n in nodes_list:
+        node_id = _get_attr(n, "id")
+        if node_id is None:
+            continue
+        if node_id in raw_nodes:
+            raise WorkflowValidationError(f"Duplicate node id '{node_id}'.")
+        raw_nodes[node_id] = n
+
+    parents = {node_id: [] for node_id in raw_nodes}
+    children = {node_id: [] for node_id in raw_nodes}
+    for edge in edges:
+        source = _get_attr(edge, "source")
+        target = _get_attr(edge, "target")
+        if source not in raw_nodes or target not in raw_nodes:
+            edge_id = _get_attr(edge, "id", f"{source}->{target}")
+            raise WorkflowValidationError(
+                f"Edge '{edge_id}' references a node that does not exist."
+            )
+        if target not in children[source]:
+            children[source].append(target)
+            parents[target].append(source)
+
+    # Kahn's algorithm; keeps the definition order among ready nodes
+    in_degree = {node_id: len(parents[node_id]) for node_id in raw_nodes}
+    ready = [node_id for node_id in raw_nodes if in_degree[node_id] == 0]
+    order = []
+    while ready:
+        node_id = ready.pop(0)
+        order.append(node_id)
+        for child in children[node_id]:
+            in_degree[child] -= 1
+            if in_degree[child] == 0:
+                ready.append(child)
+    if len(order) != len(raw_nodes):
+        cyclic = sorted(node_id for node_id, deg in in_degree.items() if deg > 0)
+        raise WorkflowValidationError(
+            f"Workflow contains a cycle involving nodes: {', '.join(cyclic)}."
+        )
+
+    nodes = {}
+    for node_id, raw in raw_nodes.items():
+        data = dict(_get_data_dict(raw))
+        nodes[node_id] = PlanNode(
+            id=node_id,
+            type=_get_attr(raw, "type"),
+            data=MappingProxyType(data),
+            parents=tuple(parents[node_id]),
+            children=tuple(children[node_id]),
+            timeout=_seconds(data.get("timeout"), settings.WORKFLOW_NODE_TIMEOUT_SECONDS),
+        )
+    return ExecutionPlan(nodes, tuple(order))
+
+
+def definition_hash(workflow_definition) -> str:
+    """Stable hash of a definition, used when the caller has no stored version."""
+    if hasattr(workflow_definition, "model_dump"):
+        workflow_definition = workflow_definition.model_dump()
+    encoded = json.dumps(workflow_definition, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    """
+    In-process LRU of compiled plans keyed by (workflow_id, definition
+    version). The version is a hash of the stored definition, so a worker
+    process that missed WorkflowService's invalidation on update/delete never
+    serves a stale plan.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._plans: "OrderedDict[Tuple[int, str], ExecutionPlan]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, workflow_id: int, version: str) -> Optional[ExecutionPlan]:
+        """Returns the cached plan of this version of the workflow, if any."""
+        key = (workflow_id, version)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+            return plan
+
+    def get_plan(self, workflow_id: int, workflow_definition, version: Optional[str] = None) -> ExecutionPlan:
+        if version is None:
+            version = definition_hash(workflow_definition)
+        plan = self.get(workflow_id, version)
+        if plan is not None:
+            return plan
+
+        plan = compile_plan(workflow_definition)
+        with self._lock:
+            # A newer version supersedes older plans for the workflow
+            for stale in [k for k in self._plans if k[0] == workflow_id]:
+                del self._plans[stale]
+            self._plans[(workflow_id, version)] = plan
+            while len(self._plans) > self.max_entries:
+                self._plans.popitem(last=False)
+        return plan
+
+    def invalidate(self, workflow_id: int) -> None:
+        with self._lock:
+            for key in [k for k in self._plans if k[0] == workflow_id]:
+                del self._plans[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._plans.clear()
+
+
+plan_cache = PlanCache(max_entries=settings.WORKFLOW_PLAN_CACHE_SIZE)
@@ -0,0 +1 @@
+"""Offline benchmark suite; see `python -m benchmarks.run --help`."""
@@ -0,0 +1,77 @@
+"""
+Compares two benchmark result files scenario by scenario and exits with
+status 1 when any p50/p95/p99 latency grows, or throughput drops, by more
+than --threshold percent.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 10
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List, Optional, Tuple
+
+LATENCY_KEYS = ("p50", "p95", "p99")
+
+
+def _load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def _change(old: Optional[float], new: Optional[float]) -> Optional[float]:
+    if old is None or new is None or old == 0:
+        return None
+    return (new - old) / old * 100
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> Tuple[List[tuple], List[str]]:
+    """Returns (rows, regressions); each row is (scenario, metric, old, new, change %)."""
+    old_scenarios: Dict[str, dict] = {s["name"]: s for s in baseline["scenarios"]}
+    rows, regressions = [], []
+    for scenario in candidate["scenarios"]:
+        name = scenario["name"]
+        old = old_scenarios.get(name)
+        if old is None:
+            continue
+        metrics = [(key, old["latency_ms"].get(key), scenario["latency_ms"].get(key), True) for key in LATENCY_KEYS]
+        metrics.append(("rps", old.get("rps"), scenario.get("rps"), False))
+        for metric, old_value, new_value, lower_is_better in metrics:
+            change = _change(old_value, new_value)
+            rows.append((name, metric, old_value, new_value, change))
+            if change is None:
+                continue
+            worse = change if lower_is_better else -change
+            if worse > threshold:
+                regressions.append(f"{name} {metric}: {old_value} -> {new_value} ({change:+.1f}%)")
+        if scenario.get("errors", 0) > old.get("errors", 0):
+            regressions.append(f"{name} errors: {old.get('errors', 0)} -> {scenario['errors']}")
+    return rows, regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed regression in percent")
+    args = parser.parse_args(argv)
+
+    baseline, candidate = _load(args.baseline), _load(args.candidate)
+    print(f"baseline  {baseline['meta'].get('git_commit')}  {baseline['meta'].get('timestamp')}")
+    print(f"candidate {candidate['meta'].get('git_commit')}  {candidate['meta'].get('timestamp')}")
+    rows, regressions = compare(baseline, candidate, args.threshold)
+    print(f"{'scenario':<28} {'metric':<6} {'baseline':>10} {'candidate':>10} {'change':>8}")
+    for name, metric, old, new, change in rows:
+        change_text = f"{change:+.1f}%" if change is not None else "n/a"
+        print(f"{name:<28} {metric:<6} {old if old is not None else 'n/a':>10} "
+              f"{new if new is not None else 'n/a':>10} {change_text:>8}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:g}%:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
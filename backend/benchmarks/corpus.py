@@ -0,0 +1,59 @@
+"""
+Synthetic PDF corpora for ingestion benchmarks. Text is generated from a
+seeded RNG, so a given (pages, seed) always produces the same file, and
+every file gets a distinct seed so uploads are not deduplicated.
+"""
+import os
+import random
+from typing import Dict, List
+
+import fitz  # PyMuPDF
+
+# Named corpus sizes: pages per document
+CORPUS_SIZES: Dict[str, int] = {"small": 2, "medium": 20, "large": 200}
+
+_VOCABULARY = (
+    "pipeline ingestion retrieval embedding vector index chunk document workflow "
+    "latency throughput budget context answer query model token cache search "
+    "database transaction replica shard cluster node schema migration release"
+).split()
+
+
+def _paragraph(rng: random.Random, sentences: int = 6) -> str:
+    out = []
+    for _ in range(sentences):
+        words = [rng.choice(_VOCABULARY) for _ in range(rng.randint(8, 18))]
+        if rng.random() < 0.2:
+            # Identifier-like tokens exercise the lexical index
+            words.insert(rng.randrange(len(words)), f"ERR-{rng.randint(1000, 9999)}")
+        out.append(" ".join(words).capitalize() + ".")
+    return " ".join(out)
+
+
+def make_pdf(path: str, pages: int, seed: int) -> str:
+    """Writes a `pages`-page PDF of deterministic prose to `path`."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    try:
+        for number in range(pages):
+            page = doc.new_page()
+            text = f"Document {seed}, page {number + 1}\n\n" + "\n\n".join(_paragraph(rng) for _ in range(4))
+            page.insert_textbox(fitz.Rect(50, 50, 545, 790), text, fontsize=10)
+        doc.save(path)
+    finally:
+        doc.close()
+    return path
+
+
+def build_corpus(directory: str, size: str, count: int, seed: int = 0) -> List[str]:
+    """Creates (or reuses) `count` PDFs of the named size under `directory`."""
+    pages = CORPUS_SIZES[size]
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(count):
+        file_seed = seed * 1_000_000 + pages * 1000 + i
+        path = os.path.join(directory, f"{size}-{file_seed}.pdf")
+        if not os.path.exists(path):
+            make_pdf(path, pages, file_seed)
+        paths.append(path)
+    return paths
@@ -0,0 +1,197 @@
+"""
+Local stand-ins for the Mistral chat completions API and SerpAPI, so the
+app can be benchmarked offline with controlled upstream latency.
+
+Run standalone with `python -m benchmarks.fake_upstreams`, or start them
+in-process with FakeMistral(...).start() / FakeSearch(...).start().
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+WORDS = (
+    "the workflow retrieves context from the knowledge base and answers concisely "
+    "using only supported facts about pipelines documents embeddings and search results"
+).split()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class _Upstream:
+    """Runs a ThreadingHTTPServer on a background thread."""
+
+    handler = _Handler
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        handler = type(self.handler.__name__, (self.handler,), {"upstream": self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+    def start(self) -> "_Upstream":
+        self._thread = threading.Thread(target=self.server.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _MistralHandler(_Handler):
+    def do_POST(self):
+        upstream: "FakeMistral" = self.upstream
+        if urlparse(self.path).path != "/v1/chat/completions":
+            self._send_json(404, {"message": "Not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"message": "Invalid JSON"})
+            return
+        upstream.count()
+
+        tokens = upstream.completion(int(request.get("max_tokens") or upstream.completion_tokens))
+        time.sleep(upstream.latency)
+        if not request.get("stream"):
+            time.sleep(upstream.token_interval * len(tokens))
+            self._send_json(200, {
+                "id": "bench",
+                "object": "chat.completion",
+                "model": request.get("model"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"completion_tokens": len(tokens)},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in tokens:
+            chunk = {"choices": [{"index": 0, "delta": {"content": token}}]}
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            time.sleep(upstream.token_interval)
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+
+class FakeMistral(_Upstream):
+    """
+    Chat completions stand-in. Each call waits `latency` seconds (time to
+    first token), then `token_interval` seconds per generated token; streaming
+    requests receive the tokens as server-sent events.
+    """
+
+    handler = _MistralHandler
+
+    def __init__(self, latency: float = 0.3, token_interval: float = 0.01, completion_tokens: int = 64, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.token_interval = token_interval
+        self.completion_tokens = completion_tokens
+
+    def completion(self, max_tokens: int):
+        count = max(1, min(max_tokens, self.completion_tokens))
+        return [WORDS[i % len(WORDS)] + " " for i in range(count)]
+
+
+class _SearchHandler(_Handler):
+    def do_GET(self):
+        upstream: "FakeSearch" = self.upstream
+        url = urlparse(self.path)
+        if url.path != "/search":
+            self._send_json(404, {"error": "Not found"})
+            return
+        upstream.count()
+        query = parse_qs(url.query).get("q", [""])[0]
+        time.sleep(upstream.latency)
+        rng = random.Random(query)
+        results = [
+            {
+                "position": i + 1,
+                "title": f"{query.title()} - result {i + 1}",
+                "link": f"https://example.com/{rng.randrange(10**6)}",
+                "snippet": " ".join(rng.choice(WORDS) for _ in range(30)),
+            }
+            for i in range(upstream.results)
+        ]
+        self._send_json(200, {"organic_results": results})
+
+
+class FakeSearch(_Upstream):
+    """SerpAPI stand-in returning `results` deterministic organic results after `latency` seconds."""
+
+    handler = _SearchHandler
+
+    def __init__(self, latency: float = 0.2, results: int = 10, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.results = results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--mistral-port", type=int, default=8081)
+    parser.add_argument("--search-port", type=int, default=8082)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--token-interval", type=float, default=0.01, help="seconds between tokens")
+    parser.add_argument("--completion-tokens", type=int, default=64)
+    parser.add_argument("--search-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    mistral = FakeMistral(args.llm_latency, args.token_interval, args.completion_tokens,
+                          host=args.host, port=args.mistral_port).start()
+    search = FakeSearch(args.search_latency, host=args.host, port=args.search_port).start()
+    print(f"MISTRAL_BASE_URL={mistral.url}")
+    print(f"SERPAPI_BASE_URL={search.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mistral.stop()
+        search.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Closed-loop load generator and latency statistics."""
+import asyncio
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+
+@dataclass
+class Sample:
+    latency: float
+    ok: bool
+    extra: Dict[str, float] = field(default_factory=dict)  # e.g. time to first token
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Linear-interpolated percentile (q in 0..100) of an already sorted list."""
+    if not sorted_values:
+        return math.nan
+    position = (len(sorted_values) - 1) * q / 100
+    low = math.floor(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+def _distribution(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    if not values:
+        return {}
+    return {
+        "p50": round(percentile(values, 50) * 1000, 3),
+        "p95": round(percentile(values, 95) * 1000, 3),
+        "p99": round(percentile(values, 99) * 1000, 3),
+        "mean": round(sum(values) / len(values) * 1000, 3),
+        "min": round(values[0] * 1000, 3),
+        "max": round(values[-1] * 1000, 3),
+    }
+
+
+def summarize(name: str, samples: List[Sample], elapsed: float, concurrency: int) -> dict:
+    """Latency distribution (ms) of successful requests plus throughput."""
+    ok = [s for s in samples if s.ok]
+    result = {
+        "name": name,
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(ok) / elapsed, 3) if elapsed > 0 else 0.0,
+        "latency_ms": _distribution([s.latency for s in ok]),
+    }
+    for key in sorted({key for s in ok for key in s.extra}):
+        result[f"{key}_ms"] = _distribution([s.extra[key] for s in ok if key in s.extra])
+    return result
+
+
+async def run_load(
+    request: Callable[[int], Awaitable[Optional[Dict[str, float]]]],
+    requests: int,
+    concurrency: int,
+    warmup: int = 0,
+) -> tuple:
+    """
+    Calls request(i) `requests` times from `concurrency` workers, each
+    starting its next request as soon as the previous one returns. A request
+    fails by raising; it may return extra timings (seconds) to record.
+    The first `warmup` calls run before timing starts. Returns (samples, elapsed).
+    """
+    for i in range(warmup):
+        try:
+            await request(-1 - i)
+        except Exception:
+            pass
+
+    samples: List[Sample] = []
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                extra = await request(i)
+                samples.append(Sample(time.perf_counter() - started, True, extra or {}))
+            except Exception:
+                samples.append(Sample(time.perf_counter() - started, False))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, requests)))))
+    return samples, time.perf_counter() - started
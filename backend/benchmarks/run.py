@@ -0,0 +1,377 @@
+"""
+Benchmarks the API end to end against local stand-ins for Mistral and
+SerpAPI: boots the app with uvicorn in a scratch directory, drives the
+execute, upload, knowledge base query and chat history endpoints with a
+closed-loop load generator and writes p50/p95/p99 latency and requests/sec
+as JSON (compare two runs with `python -m benchmarks.compare`).
+
+The app still needs PostgreSQL: use a dedicated database via the usual
+POSTGRES_* variables (or backend/.env). Documents uploaded by the run are
+deleted afterwards; the benchmark workflow and its chat logs are kept.
+
+    cd backend
+    python -m benchmarks.run --requests 100 --concurrency 8 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+from .corpus import CORPUS_SIZES, build_corpus
+from .fake_upstreams import FakeMistral, FakeSearch
+from .loadgen import run_load, summarize
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ("upload", "kb_query", "execute", "execute_stream", "chat_history")
+
+QUESTIONS = [
+    "How does the ingestion pipeline handle large documents?",
+    "What is the latency budget for retrieval?",
+    "Which cache sits in front of the embedding model?",
+    "How are database transactions batched during bulk uploads?",
+    "What happens when a workflow node times out?",
+    "Explain error ERR-4821 in the replica cluster.",
+    "How is context packed into the token budget?",
+    "Which schema migration changed the chunk index?",
+]
+
+WORKFLOW = {
+    "nodes": [
+        {"id": "query", "type": "userQuery", "data": {}},
+        {"id": "kb", "type": "knowledgeBase", "data": {"top_k": 3}},
+        {"id": "search", "type": "webSearch", "data": {"top_k": 3}},
+        {"id": "llm", "type": "llmEngine", "data": {"llm_provider": "mistral"}},
+    ],
+    "edges": [
+        {"id": "e1", "source": "query", "target": "kb"},
+        {"id": "e2", "source": "query", "target": "search"},
+        {"id": "e3", "source": "kb", "target": "llm"},
+        {"id": "e4", "source": "search", "target": "llm"},
+    ],
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git(*args) -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class AppProcess:
+    """The API under test, run by uvicorn in its own process and working directory."""
+
+    def __init__(self, workdir: str, env: Dict[str, str], workers: int = 1):
+        self.workdir = workdir
+        self.env = env
+        self.workers = workers
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.boot_seconds: Optional[float] = None
+        self._process: Optional[subprocess.Popen] = None
+        self._log = None
+
+    def start(self, timeout: float = 120.0):
+        # Settings read .env from the working directory
+        env_file = os.path.join(BACKEND_DIR, ".env")
+        if os.path.exists(env_file):
+            shutil.copy(env_file, os.path.join(self.workdir, ".env"))
+        self._log = open(os.path.join(self.workdir, "app.log"), "w")
+        started = time.perf_counter()
+        self._process = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "app.main:app",
+                "--app-dir", BACKEND_DIR,
+                "--host", "127.0.0.1", "--port", str(self.port),
+                "--workers", str(self.workers),
+                "--log-level", "warning",
+            ],
+            cwd=self.workdir,
+            env=self.env,
+            stdout=self._log,
+            stderr=subprocess.STDOUT,
+        )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._process.poll() is not None:
+                raise RuntimeError(f"App exited during startup; see {self._log.name}")
+            try:
+                if httpx.get(f"{self.url}/health", timeout=1.0).status_code == 200:
+                    self.boot_seconds = time.perf_counter() - started
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.1)
+        raise RuntimeError(f"App did not become healthy within {timeout:.0f}s; see {self._log.name}")
+
+    def stop(self):
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+        if self._log is not None:
+            self._log.close()
+
+
+class Benchmark:
+    def __init__(self, client: httpx.AsyncClient, args):
+        self.client = client
+        self.args = args
+        self.workflow_id: Optional[int] = None
+        self.document_ids: List[int] = []
+        self.results: List[dict] = []
+
+    def query(self, i: int) -> str:
+        question = QUESTIONS[i % len(QUESTIONS)]
+        # Unique queries defeat the search and response caches unless asked not to
+        return question if self.args.warm_cache else f"{question} (request {i})"
+
+    async def run(self, name: str, request, requests: Optional[int] = None, concurrency: Optional[int] = None):
+        requests = requests or self.args.requests
+        concurrency = concurrency or self.args.concurrency
+        samples, elapsed = await run_load(request, requests, concurrency, self.args.warmup)
+        result = summarize(name, samples, elapsed, concurrency)
+        self.results.append(result)
+        latency = result["latency_ms"]
+        print(
+            f"{name:<28} {result['requests']:>6} {result['errors']:>5} {result['rps']:>9.2f} "
+            f"{latency.get('p50', float('nan')):>9.1f} {latency.get('p95', float('nan')):>9.1f} "
+            f"{latency.get('p99', float('nan')):>9.1f}",
+            flush=True,
+        )
+
+    async def ensure_workflow(self):
+        if self.workflow_id is None:
+            response = await self.client.post(
+                "/api/v1/workflow/", json={"name": "benchmark", "definition": WORKFLOW}
+            )
+            response.raise_for_status()
+            self.workflow_id = response.json()["id"]
+
+    async def upload(self, corpus_dir: str):
+        for size in self.args.corpus:
+            paths = build_corpus(os.path.join(corpus_dir, size), size, self.args.uploads, seed=self.args.seed)
+
+            async def request(i: int, paths=paths):
+                if i < 0:
+                    return None  # no warm-up: every file may be uploaded once
+                with open(paths[i], "rb") as f:
+                    started = time.perf_counter()
+                    response = await self.client.post(
+                        "/api/v1/documents/upload",
+                        files={"file": (os.path.basename(paths[i]), f, "application/pdf")},
+                    )
+                accepted = time.perf_counter() - started
+                response.raise_for_status()
+                job = response.json()
+                while job["status"] in ("queued", "running"):
+                    await asyncio.sleep(0.02)
+                    job = (await self.client.get(f"/api/v1/documents/jobs/{job['id']}")).json()
+                if job["status"] != "completed":
+                    raise RuntimeError(job.get("error") or job["status"])
+                self.document_ids.append(job["document_id"])
+                return {"accepted": accepted}
+
+            await self.run(f"ingest[{size}]", request, requests=len(paths))
+
+    async def kb_query(self):
+        for mode in self.args.kb_modes:
+            async def request(i: int, mode=mode):
+                response = await self.client.post(
+                    "/api/v1/knowledge/query", json={"query": self.query(i), "top_k": 3, "mode": mode}
+                )
+                response.raise_for_status()
+
+            await self.run(f"kb_query[{mode}]", request)
+
+    async def execute(self):
+        await self.ensure_workflow()
+
+        async def request(i: int):
+            response = await self.client.post(
+                f"/api/v1/workflow/{self.workflow_id}/execute", json={"query": self.query(i)}
+            )
+            response.raise_for_status()
+            if "response" not in response.json():
+                raise RuntimeError(response.json().get("error"))
+
+        await self.run("execute", request)
+
+    async def execute_stream(self):
+        await self.ensure_workflow()
+
+        async def request(i: int):
+            started = time.perf_counter()
+            first_token = None
+            event = None
+            async with self.client.stream(
+                "POST", f"/api/v1/workflow/{self.workflow_id}/execute/stream", json={"query": self.query(i)}
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line.startswith("event:"):
+                        event = line[len("event:"):].strip()
+                        if event == "token" and first_token is None:
+                            first_token = time.perf_counter() - started
+                        elif event == "error":
+                            raise RuntimeError("stream reported an error")
+            if event != "final":
+                raise RuntimeError("stream ended without a final event")
+            return {"first_token": first_token} if first_token is not None else None
+
+        await self.run("execute_stream", request)
+
+    async def chat_history(self):
+        await self.ensure_workflow()
+
+        async def full(i: int):
+            (await self.client.get(f"/api/v1/chat/history/{self.workflow_id}")).raise_for_status()
+
+        async def page(i: int):
+            response = await self.client.get(
+                f"/api/v1/chat/history/{self.workflow_id}/page", params={"limit": 20}
+            )
+            response.raise_for_status()
+
+        await self.run("chat_history", full)
+        await self.run("chat_history_page", page)
+
+    async def cleanup(self):
+        for document_id in self.document_ids:
+            try:
+                await self.client.delete(f"/api/v1/documents/{document_id}")
+            except httpx.HTTPError:
+                pass
+
+
+async def _main(args, base_url: str, corpus_dir: str) -> List[dict]:
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        bench = Benchmark(client, args)
+        print(f"{'scenario':<28} {'reqs':>6} {'errs':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        try:
+            for scenario in args.scenarios:
+                if scenario == "upload":
+                    await bench.upload(corpus_dir)
+                else:
+                    await getattr(bench, scenario)()
+        finally:
+            if not args.keep_documents:
+                await bench.cleanup()
+        return bench.results
+
+
+def _csv(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", type=_csv, default=list(SCENARIOS),
+                        help=f"comma separated subset of {','.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=50, help="timed requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=3, help="untimed requests before each scenario")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout (s)")
+    parser.add_argument("--corpus", type=_csv, default=["small", "medium"],
+                        help=f"corpus sizes to ingest ({','.join(f'{k}={v}p' for k, v in CORPUS_SIZES.items())})")
+    parser.add_argument("--uploads", type=int, default=10, help="documents uploaded per corpus size")
+    parser.add_argument("--seed", type=int, default=0, help="corpus seed")
+    parser.add_argument("--kb-modes", type=_csv, default=["hybrid"], help="retrieval modes for kb_query")
+    parser.add_argument("--warm-cache", action="store_true",
+                        help="repeat a small pool of queries so search and LLM caches hit")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="fake Mistral time to first token (s)")
+    parser.add_argument("--token-interval", type=float, default=0.01, help="fake Mistral seconds per token")
+    parser.add_argument("--completion-tokens", type=int, default=64)
+    parser.add_argument("--search-latency", type=float, default=0.2, help="fake SerpAPI latency (s)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--base-url", help="benchmark an already running app instead of booting one "
+                        "(it must be configured with MISTRAL_BASE_URL / SERPAPI_BASE_URL itself)")
+    parser.add_argument("--keep-documents", action="store_true", help="don't delete uploaded documents")
+    parser.add_argument("--workdir", help="scratch directory for the app and corpus (default: a temp dir)")
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    unknown = set(args.corpus) - set(CORPUS_SIZES)
+    if unknown:
+        parser.error(f"unknown corpus sizes: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="genai-bench-")
+    os.makedirs(workdir, exist_ok=True)
+
+    mistral = FakeMistral(args.llm_latency, args.token_interval, args.completion_tokens).start()
+    search = FakeSearch(args.search_latency).start()
+    app = None
+    try:
+        base_url = args.base_url
+        if base_url is None:
+            env = dict(os.environ)
+            env.update(MISTRAL_BASE_URL=mistral.url, SERPAPI_BASE_URL=search.url)
+            for key in ("MISTRAL_API_KEY", "SERPAPI_API_KEY", "OPENAI_API_KEY", "GEMINI_API_KEY"):
+                env.setdefault(key, "benchmark")
+            env.setdefault("FRONTEND_URL", "http://localhost:3000")
+            if not args.warm_cache:
+                env.setdefault("LLM_CACHE_ENABLED", "false")
+            app = AppProcess(workdir, env, workers=args.workers)
+            app.start()
+            base_url = app.url
+            print(f"App booted in {app.boot_seconds:.2f}s at {base_url} (workdir {workdir})")
+
+        results = asyncio.run(_main(args, base_url, os.path.join(workdir, "corpus")))
+    finally:
+        if app is not None:
+            app.stop()
+        mistral.stop()
+        search.stop()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git("rev-parse", "HEAD"),
+            "git_dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "boot_seconds": round(app.boot_seconds, 3) if app and app.boot_seconds else None,
+            "upstream_calls": {"mistral": mistral.requests, "search": search.requests},
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "workdir")},
+        },
+        "scenarios": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()